@@ -2,31 +2,93 @@
 """
 Auê Natural - Complete Data Pipeline (SIMPLIFIED)
 Extract → Clean → Match → Load to Warehouse
+
+Stages run in this process through their main(argv) entry points
+(src/pipeline_orchestrator.py). A stage is skipped when its inputs, code
+and arguments are unchanged since its last successful run (manifest:
+data/processed/pipeline_manifest.json), so a rerun on the same raw file
+only re-checks hashes. Extraction scrapes live data and always runs unless
+--skip-extract is given.
+
+    python run_full_pipeline.py                  # scrape, then only the stages with new inputs
+    python run_full_pipeline.py --skip-extract   # reuse the latest raw file
+    python run_full_pipeline.py --force match    # rerun matching (and whatever it changes)
+    python run_full_pipeline.py --dry-run        # show what would run
+    python run_full_pipeline.py --stream         # scrape, clean and match overlapping, then load
 """
 
-import subprocess
 import sys
+import logging
+import argparse
 from datetime import datetime
 from pathlib import Path
 
-VENV_PYTHON = "./venv/bin/python"
-
-def run_step(step_name, script_path):
-    """Run a pipeline step and show output"""
-    print(f"\n{'='*70}")
-    print(f"🚀 {step_name}")
-    print(f"{'='*70}\n")
-    
-    result = subprocess.run([VENV_PYTHON, script_path], capture_output=False, text=True)
-    
-    if result.returncode != 0:
-        print(f"\n❌ FAILED: {step_name}")
-        return False
-    
-    print(f"\n✅ {step_name} COMPLETED")
-    return True
+ROOT = Path(__file__).resolve().parent
+SRC_DIR = ROOT / "src"
+SCRIPTS_DIR = ROOT / "scripts"
+sys.path.insert(0, str(SRC_DIR))
+
+from pipeline_orchestrator import DEFAULT_MANIFEST, PipelineOrchestrator, Stage, add_to_path  # noqa: E402
+from table_io import latest_existing  # noqa: E402
+
+RAW_DIR = Path("data/raw")
+PROCESSED_DIR = Path("data/processed")
+
+
+def latest_raw_file():
+    raw_files = list(RAW_DIR.glob("all_search_results_*.csv")) + list(RAW_DIR.glob("all_search_results_*.parquet"))
+    return max(raw_files, key=lambda p: p.stat().st_mtime) if raw_files else None
+
+
+def build_stages(stream=False):
+    """The four pipeline stages with the files each one reads and writes.
+
+    With stream, extraction, cleaning and matching run as one overlapping
+    stage (src/streaming_pipeline.py) that always runs, like extraction.
+    """
+    matches = lambda: latest_existing(PROCESSED_DIR / "processed_matches.csv")  # noqa: E731
+    unmatched = lambda: latest_existing(PROCESSED_DIR / "unmatched_products.csv")  # noqa: E731
+    load = Stage("4. LOAD TO WAREHOUSE", "load_pipeline_to_warehouse",
+                 inputs=lambda: [matches(), unmatched(), ROOT / "sql" / "materialized_views.sql"])
+    if stream:
+        return [
+            Stage("1-3. EXTRACT → CLEAN → MATCH (streaming)", "streaming_pipeline",
+                  inputs=lambda: [Path("config/oxylabs_queries.json")],
+                  outputs=lambda: [matches(), unmatched()], volatile=True),
+            load,
+        ]
+    return [
+        Stage("1. EXTRACT DATA (Oxylabs)", "oxylabs_googleshopping_script",
+              inputs=lambda: [Path("config/oxylabs_queries.json")],
+              outputs=lambda: [latest_raw_file()], volatile=True),
+        Stage("2. CLEAN DATA", "cleandata_script",
+              inputs=lambda: [latest_raw_file()],
+              outputs=lambda: [latest_existing(PROCESSED_DIR / "cleaned_data.csv")]),
+        Stage("3. MATCH PRODUCTS", "file_based_enhanced_matcher",
+              inputs=lambda: [latest_existing(PROCESSED_DIR / "cleaned_data.csv")],
+              outputs=lambda: [matches(), unmatched()]),
+        load,
+    ]
+
+
+STAGE_ALIASES = {'extract': 0, 'clean': 1, 'match': 2, 'load': 3}
+
 
 def main():
+    parser = argparse.ArgumentParser(description='Run the full pipeline, skipping unchanged stages')
+    parser.add_argument('--skip-extract', action='store_true',
+                        help='Do not scrape; start from the latest raw file in data/raw')
+    parser.add_argument('--force', nargs='*', choices=list(STAGE_ALIASES), default=None, metavar='STAGE',
+                        help='Rerun these stages (extract, clean, match, load) or, without names, all of them')
+    parser.add_argument('--dry-run', action='store_true', help='Show which stages would run')
+    parser.add_argument('--stream', action='store_true',
+                        help='Clean and match each category while extraction is still running')
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help='Stage manifest file')
+    args = parser.parse_args()
+    if args.stream and args.skip_extract:
+        parser.error('--stream always extracts; use it without --skip-extract')
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
     print(f"""
 ╔═══════════════════════════════════════════════════════════════╗
 ║          AUÊ NATURAL - COMPLETE DATA PIPELINE                 ║
@@ -35,21 +97,31 @@ def main():
 
 Started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """)
-    
-    # Define pipeline steps
-    steps = [
-        ("1. EXTRACT DATA (Oxylabs)", "src/oxylabs_googleshopping_script.py"),
-        ("2. CLEAN DATA", "src/cleandata_script.py"),
-        ("3. MATCH PRODUCTS", "src/file_based_enhanced_matcher.py"),
-        ("4. LOAD TO WAREHOUSE", "scripts/load_pipeline_to_warehouse.py"),
-    ]
-    
-    # Run each step
-    for step_name, script in steps:
-        if not run_step(step_name, script):
-            print(f"\n❌ PIPELINE FAILED AT: {step_name}")
-            return 1
-    
+
+    add_to_path(SRC_DIR, SCRIPTS_DIR)
+    stages = build_stages()
+    if args.force is None:
+        force = ()
+    elif args.force:
+        force = {stages[STAGE_ALIASES[name]].name for name in args.force}
+    else:
+        force = True
+    if args.stream:
+        stages = build_stages(stream=True)
+    elif args.skip_extract:
+        stages = stages[1:]
+
+    orchestrator = PipelineOrchestrator(stages, args.manifest, search_dirs=[SRC_DIR, SCRIPTS_DIR], force=force)
+    ok = orchestrator.run(dry_run=args.dry_run)
+    print(f"\n{orchestrator.summary()}")
+
+    if not ok:
+        failed = orchestrator.results[-1][0]
+        print(f"\n❌ PIPELINE FAILED AT: {failed}")
+        return 1
+    if args.dry_run:
+        return 0
+
     # Success!
     print(f"""
 ╔═══════════════════════════════════════════════════════════════╗
@@ -70,7 +142,7 @@ Next steps:
   • Connect to PowerBI/Tableau for visualization
   • Schedule this pipeline to run daily/weekly
 """)
-    
+
     return 0
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark Brand Detection
+Compares the old linear substring scan over a brand list with the compiled
+BrandDictionary trie at a large brand count (known brands plus synthetic
+supplier-catalog names), reporting build time and titles/sec.
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from brand_dictionary import BrandDictionary, load_brands  # noqa: E402
+
+DEFAULT_INPUT = "data/raw/archive/cleaned_beauty_data.csv"
+DEFAULT_BRANDS = "data/reference/brands.txt"
+
+SYLLABLES = ['ka', 'lo', 'mi', 'ra', 'ven', 'sol', 'tri', 'na', 'el', 'zu', 'bio', 'pur', 'eco', 'vel']
+SUFFIXES = ['', '', ' Naturals', ' Botanics', ' & Co', ' Labs', ' Skin', ' Beauty']
+
+
+def synthetic_brands(n, seed=0):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < n:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.add(word.capitalize() + rng.choice(SUFFIXES))
+    return sorted(names)
+
+
+def linear_scan(brands, titles):
+    """The previous approach: first brand (list order) that is a substring of the title."""
+    lowered = [b.lower() for b in brands]
+    found = []
+    for title in titles:
+        title_l = title.lower()
+        found.append(next((b for b, bl in zip(brands, lowered) if bl in title_l), None))
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark brand detection at a large brand count')
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT, help='CSV with a title column')
+    parser.add_argument('--brands', type=int, default=10_000, help='Total brand count (default: 10,000)')
+    parser.add_argument('--linear-sample', type=int, default=500,
+                        help='Titles timed with the linear scan (it is slow at 10k brands)')
+    args = parser.parse_args()
+
+    frame = pd.read_csv(args.input)
+    column = 'title' if 'title' in frame.columns else 'product_name'
+    titles = [t for t in frame[column] if isinstance(t, str)]
+
+    known = load_brands(DEFAULT_BRANDS)
+    brands = known + synthetic_brands(max(0, args.brands - len(known)))
+    print(f"📂 {args.input}: {len(titles):,} titles, {len(brands):,} brands")
+
+    start = time.perf_counter()
+    dictionary = BrandDictionary(brands)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    found = [dictionary.find(t) for t in titles]
+    trie_time = time.perf_counter() - start
+
+    sample = titles[:args.linear_sample]
+    start = time.perf_counter()
+    linear_scan(brands, sample)
+    linear_time = time.perf_counter() - start
+
+    trie_rate = len(titles) / trie_time
+    linear_rate = len(sample) / linear_time
+    print(f"  trie build:  {build_time:.3f}s")
+    print(f"  trie scan:   {trie_rate:,.0f} titles/sec ({sum(f is not None for f in found):,} with a brand)")
+    print(f"  linear scan: {linear_rate:,.0f} titles/sec (on {len(sample):,} titles)")
+    print(f"  speedup:     {trie_rate / linear_rate:.0f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
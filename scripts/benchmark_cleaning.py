@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Benchmark Title Cleaning
+Runs the row-by-row and vectorized cleaning paths of cleandata_script on the
+same file, checks that the cleaned frames (and their CSV output) are
+identical, and reports rows/sec for each.
+"""
+
+import sys
+import time
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from cleandata_script import clean_products  # noqa: E402
+
+DEFAULT_INPUT = "data/raw/archive/cleaned_beauty_data.csv"
+
+
+def load_raw(input_file):
+    df = pd.read_csv(input_file)
+    # Amazon exports name the query column search_keyword
+    if 'search_query' not in df.columns and 'search_keyword' in df.columns:
+        df['search_query'] = df['search_keyword']
+    return df
+
+
+def best_time(raw, vectorized, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        df = raw.copy()
+        start = time.perf_counter()
+        result = clean_products(df, vectorized=vectorized)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark row-wise vs vectorized title cleaning')
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT, help='Raw results CSV')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing runs per path (best is reported)')
+    parser.add_argument('--scale', type=int, default=1, help='Replicate the input N times')
+    args = parser.parse_args()
+
+    raw = load_raw(args.input)
+    if args.scale > 1:
+        raw = pd.concat([raw] * args.scale, ignore_index=True)
+    print(f"📂 {args.input}: {len(raw):,} rows")
+
+    rowwise, rowwise_time = best_time(raw, False, args.repeat)
+    vectorized, vectorized_time = best_time(raw, True, args.repeat)
+
+    try:
+        pd.testing.assert_frame_equal(rowwise, vectorized)
+        identical = rowwise.to_csv(index=False) == vectorized.to_csv(index=False)
+    except AssertionError as e:
+        print(e)
+        identical = False
+
+    print(f"  row-wise:   {len(raw) / rowwise_time:,.0f} rows/sec ({rowwise_time:.3f}s)")
+    print(f"  vectorized: {len(raw) / vectorized_time:,.0f} rows/sec ({vectorized_time:.3f}s, "
+          f"{rowwise_time / vectorized_time:.1f}x)")
+    print(f"  {'✅ identical' if identical else '❌ outputs differ'}")
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Benchmark Warehouse Loading
+Loads the same synthetic match rows into a temporary copy of
+aue.matched_products with row-by-row executemany, execute_values pages and
+COPY FROM STDIN, checks every method stored identical rows (md5 digest of
+the table), and reports rows/sec for each. Exits non-zero when the digests
+differ.
+
+By default it uses the PostgreSQL from the DB_* environment variables.
+--temp-cluster instead starts a throwaway local server (initdb + pg_ctl in a
+temporary directory, unix socket only) and removes it afterwards; the server
+binaries are taken from PG_BIN, `pg_config --bindir` or PATH. Without them,
+or as root (PostgreSQL refuses to run as root), the check is skipped with a
+message and exit code 0.
+
+    python scripts/benchmark_warehouse_load.py --temp-cluster --rows 20000
+    DB_PORT=5433 DB_USER=$USER python scripts/benchmark_warehouse_load.py --rows 100000
+"""
+
+import os
+import sys
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from warehouse_io import bulk_insert, connect, db_config  # noqa: E402
+
+log = logging.getLogger(__name__)
+
+COLUMNS = {
+    'product_1_id': 'TEXT', 'product_1_name': 'TEXT', 'brand_1': 'TEXT',
+    'size_value_1': 'NUMERIC', 'size_unit_1': 'TEXT', 'price_1': 'NUMERIC(12,2)',
+    'currency_1': 'TEXT', 'retailer_1': 'TEXT',
+    'product_2_id': 'TEXT', 'product_2_name': 'TEXT', 'brand_2': 'TEXT',
+    'size_value_2': 'NUMERIC', 'size_unit_2': 'TEXT', 'price_2': 'NUMERIC(12,2)',
+    'currency_2': 'TEXT', 'retailer_2': 'TEXT',
+    'category': 'TEXT', 'similarity': 'NUMERIC(5,2)',
+    'match_source': 'TEXT', 'processing_date': 'TIMESTAMP', 'confidence_tier': 'TEXT',
+    'match_rank': 'INTEGER',
+}
+TABLE = 'bench_matched_products'
+
+
+def synthetic_matches(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(rows)
+    frame = pd.DataFrame({
+        'product_1_id': 'PRD' + pd.Series(ids).astype(str).str.zfill(8),
+        'product_1_name': [f"Natural Shampoo Bar, \"Lavender\" {i % 250}g" for i in ids],
+        'brand_1': rng.choice(['Ethique', 'Faith In Nature', 'Friendly Soap', None], rows),
+        'size_value_1': rng.choice([50, 85, 100, 250, np.nan], rows),
+        'size_unit_1': 'g',
+        'price_1': rng.uniform(3, 30, rows).round(2),
+        'currency_1': 'GBP',
+        'retailer_1': rng.choice(['Boots', 'Superdrug', 'Amazon.co.uk'], rows),
+        'product_2_id': 'PRD' + pd.Series(ids + rows).astype(str).str.zfill(8),
+        'product_2_name': [f"Shampoo Bar {i % 97}\nmultiline" for i in ids],
+        'brand_2': rng.choice(['Ethique', 'Faith In Nature', None], rows),
+        'size_value_2': rng.choice([50, 85, 100, 250, np.nan], rows),
+        'size_unit_2': 'g',
+        'price_2': np.where(rng.random(rows) < 0.1, np.nan, rng.uniform(3, 30, rows).round(2)),
+        'currency_2': 'GBP',
+        'retailer_2': rng.choice(['Boots', 'LOOKFANTASTIC', 'Holland & Barrett'], rows),
+        'category': rng.choice(['shampoo bar', 'conditioner bar', 'face serum', 'body butter'], rows),
+        'similarity': rng.uniform(65, 100, rows).round(2),
+        'match_source': 'hybrid',
+        'processing_date': '2025-12-12 13:06:20',
+        'confidence_tier': rng.choice(['high', 'medium', 'low'], rows),
+        'match_rank': rng.choice([1.0, 2.0, 3.0, np.nan], rows),
+    })
+    return frame
+
+
+def executemany(conn, frame):
+    """The loader's old path: one INSERT round-trip per row."""
+    columns = list(COLUMNS)
+    records = frame.astype(object).where(pd.notna(frame), None).values.tolist()
+    records = [[int(v) if c == 'match_rank' and v is not None else v for c, v in zip(columns, r)]
+               for r in records]
+    insert_sql = f"INSERT INTO {TABLE} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    start = time.perf_counter()
+    with conn.cursor() as cursor:
+        cursor.executemany(insert_sql, records)
+    return time.perf_counter() - start
+
+
+def load(conn, method, frame):
+    """Load `frame` into an empty bench table; returns seconds."""
+    with conn.cursor() as cursor:
+        cursor.execute(f"TRUNCATE {TABLE}")
+    if method == 'executemany':
+        seconds = executemany(conn, frame)
+    else:
+        start = time.perf_counter()
+        bulk_insert(conn, frame, TABLE, list(COLUMNS), method=method)
+        seconds = time.perf_counter() - start
+    conn.commit()
+    return seconds
+
+
+def table_digest(conn, rows=None):
+    """(row count, md5) of the bench table, or of its first `rows` rows by product_1_id.
+
+    Unconstrained NUMERIC columns keep the input's scale (executemany sends
+    250.0 where COPY sends 250), so they are compared by value (trim_scale).
+    """
+    limit = f"LIMIT {int(rows)}" if rows is not None else ""
+    select = ', '.join(f"trim_scale({name}) AS {name}" if kind == 'NUMERIC' else name
+                       for name, kind in COLUMNS.items())
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT COUNT(*), md5(string_agg(t::text, '|' ORDER BY product_1_id)) "
+                       f"FROM (SELECT {select} FROM {TABLE} ORDER BY product_1_id {limit}) t")
+        return cursor.fetchone()
+
+
+def server_binaries():
+    """Directory holding initdb and pg_ctl, or None."""
+    candidates = [os.getenv('PG_BIN')]
+    if shutil.which('pg_config'):
+        result = subprocess.run(['pg_config', '--bindir'], capture_output=True, text=True)
+        candidates.append(result.stdout.strip())
+    if shutil.which('initdb'):
+        candidates.append(str(Path(shutil.which('initdb')).parent))
+    for directory in filter(None, candidates):
+        if (Path(directory) / 'initdb').exists() and (Path(directory) / 'pg_ctl').exists():
+            return Path(directory)
+    return None
+
+
+@contextmanager
+def temporary_cluster(bin_dir, port=54329):
+    """Start a throwaway PostgreSQL in a temp directory; yields psycopg2 connection kwargs."""
+    base = Path(tempfile.mkdtemp(prefix='aue_pg_'))
+    data_dir, log_file = base / 'data', base / 'server.log'
+    user = 'aue_bench'
+    try:
+        subprocess.run([str(bin_dir / 'initdb'), '-D', str(data_dir), '-U', user, '-A', 'trust',
+                        '--no-sync', '-E', 'UTF8'], check=True, capture_output=True)
+        options = f"-p {port} -k {base} -c listen_addresses='' -c fsync=off"
+        subprocess.run([str(bin_dir / 'pg_ctl'), '-D', str(data_dir), '-o', options, '-l', str(log_file),
+                        '-w', 'start'], check=True, capture_output=True)
+        log.info(f"🐘 Temporary PostgreSQL running in {base} (port {port})")
+        try:
+            yield {'dbname': 'postgres', 'user': user, 'host': str(base), 'port': port}
+        finally:
+            subprocess.run([str(bin_dir / 'pg_ctl'), '-D', str(data_dir), '-m', 'fast', '-w', 'stop'],
+                           capture_output=True)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+def benchmark(config, rows, executemany_rows):
+    """Load with every method; returns (rows/sec per method, digests identical)."""
+    frame = synthetic_matches(rows)
+    conn = connect(config)
+    try:
+        with conn.cursor() as cursor:
+            ddl = ', '.join(f"{name} {kind}" for name, kind in COLUMNS.items())
+            cursor.execute(f"CREATE TEMP TABLE {TABLE} ({ddl})")
+
+        # executemany only loads a prefix (it is slow), so every method is also
+        # compared on that prefix; values and copy are compared on all rows too
+        check_rows = min(rows, executemany_rows) if executemany_rows else None
+        results, digests, prefix = {}, {}, {}
+        for method in ('values', 'copy'):
+            results[method] = rows / load(conn, method, frame)
+            digests[method] = table_digest(conn)
+            prefix[method] = table_digest(conn, check_rows) if check_rows else digests[method]
+        if check_rows:
+            results['executemany'] = check_rows / load(conn, 'executemany', frame.head(check_rows))
+            prefix['executemany'] = table_digest(conn)
+    finally:
+        conn.close()
+
+    identical = digests['values'] == digests['copy'] and len(set(prefix.values())) == 1
+    print(f"\n{'method':<12} {'rows/sec':>12} {'rows':>10}  md5")
+    for method, rate in results.items():
+        count, md5 = prefix[method]
+        print(f"{method:<12} {rate:>12,.0f} {count:>10,}  {md5}")
+    if 'executemany' in results:
+        print(f"\nCOPY speedup over executemany: {results['copy'] / results['executemany']:.1f}x")
+    print(f"values vs copy on all {digests['copy'][0]:,} rows: {digests['values'] == digests['copy']}")
+    print(f"All methods stored identical rows: {identical}")
+    return results, identical
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare warehouse load methods')
+    parser.add_argument('--rows', type=int, default=50_000, help='Synthetic match rows to load')
+    parser.add_argument('--executemany-rows', type=int, default=5_000,
+                        help='Rows for the (slow) executemany baseline; 0 skips it')
+    parser.add_argument('--temp-cluster', action='store_true',
+                        help='Run against a throwaway local PostgreSQL instead of DB_*')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if not args.temp_cluster:
+        _, identical = benchmark(db_config(), args.rows, args.executemany_rows)
+        return 0 if identical else 1
+
+    bin_dir = server_binaries()
+    if bin_dir is None:
+        log.warning("⏭️  Skipped: no PostgreSQL server binaries (initdb, pg_ctl) - set PG_BIN or add them to PATH")
+        return 0
+    if hasattr(os, 'geteuid') and os.geteuid() == 0:
+        log.warning("⏭️  Skipped: PostgreSQL refuses to run as root - run the check as a regular user")
+        return 0
+    with temporary_cluster(bin_dir) as config:
+        _, identical = benchmark(config, args.rows, args.executemany_rows)
+    return 0 if identical else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
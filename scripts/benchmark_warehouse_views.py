@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Benchmark Dashboard Queries: Views vs Materialized Views
+Runs the BI dashboard access patterns against the plain analytics views and
+their materialized counterparts (sql/materialized_views.sql) in the loaded
+warehouse, and reports median latency for each. Connection settings come
+from the DB_* environment variables.
+
+    python scripts/benchmark_warehouse_views.py --repeat 20
+"""
+
+import sys
+import time
+import argparse
+import statistics
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from warehouse_io import connect  # noqa: E402
+
+# name -> (plain view query, materialized view query); %(category)s / %(retailer)s are
+# filled with the most common values in the warehouse
+QUERIES = {
+    'top matches in category': (
+        "SELECT product_1_name, retailer_1, price_1, retailer_2, price_2 FROM aue.price_comparison "
+        "WHERE category = %(category)s ORDER BY similarity DESC LIMIT 50",
+        "SELECT product_1_name, retailer_1, price_1, retailer_2, price_2 FROM aue.mv_price_comparison "
+        "WHERE category = %(category)s ORDER BY similarity DESC LIMIT 50",
+    ),
+    'cheapest at retailer': (
+        "SELECT product_name, brand, category, price FROM aue.all_products "
+        "WHERE retailer = %(retailer)s ORDER BY price LIMIT 50",
+        "SELECT product_name, brand, category, price FROM aue.mv_all_products "
+        "WHERE retailer = %(retailer)s ORDER BY price LIMIT 50",
+    ),
+    'biggest price gaps': (
+        "SELECT * FROM aue.price_comparison LIMIT 20",
+        "SELECT * FROM aue.mv_price_comparison ORDER BY ABS(price_diff_pct) DESC LIMIT 20",
+    ),
+    'category quality': (
+        "SELECT * FROM aue.best_matches_by_category",
+        "SELECT * FROM aue.mv_best_matches_by_category ORDER BY match_count DESC",
+    ),
+    'retailer coverage': (
+        "SELECT * FROM aue.retailer_coverage",
+        "SELECT * FROM aue.mv_retailer_coverage ORDER BY product_count DESC",
+    ),
+}
+
+
+def median_ms(cursor, query, params, repeat):
+    cursor.execute(query, params)  # warm-up
+    cursor.fetchall()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(query, params)
+        cursor.fetchall()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dashboard query latency: views vs materialized views')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per query')
+    args = parser.parse_args()
+    load_dotenv()
+
+    conn = connect()
+    cursor = conn.cursor()
+    cursor.execute("SELECT category FROM aue.matched_products GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1")
+    row = cursor.fetchone()
+    cursor.execute("SELECT retailer_1 FROM aue.matched_products GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1")
+    retailer = cursor.fetchone()
+    params = {'category': row[0] if row else None, 'retailer': retailer[0] if retailer else None}
+
+    print(f"{'query':<26} {'view ms':>10} {'matview ms':>12} {'speedup':>9}")
+    for name, (view_query, mv_query) in QUERIES.items():
+        before = median_ms(cursor, view_query, params, args.repeat)
+        after = median_ms(cursor, mv_query, params, args.repeat)
+        print(f"{name:<26} {before:>10.2f} {after:>12.2f} {before / after:>8.1f}x")
+    cursor.close()
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
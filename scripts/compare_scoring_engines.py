@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Compare Matcher Scoring Engines
+Runs the pairwise and vectorized scoring engines on the same input files and
+checks that they produce identical match records, reporting wall-clock time.
+Amazon exports carry no retailer column; their marketplace (amazon_domain)
+is used as the retailer so cross-marketplace pairs get scored. An input on
+which both engines find no matches fails the check.
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from file_based_enhanced_matcher import FileBasedMatcher  # noqa: E402
+from table_io import read_table  # noqa: E402
+from url_canonical import amazon_host  # noqa: E402
+
+DEFAULT_INPUTS = [
+    "data/raw/archive/cleaned_shopping_data_20251017_000841.csv",
+    "data/raw/archive/cleaned_beauty_data.csv",
+]
+
+# Wall-clock dependent, not part of the match itself
+IGNORED_COLUMNS = ['processing_date']
+
+
+def load_input(input_file):
+    """Read an input file, taking retailer / category from Amazon export columns when missing."""
+    df = read_table(input_file)
+    if 'retailer_name' not in df.columns and 'merchant' not in df.columns and 'amazon_domain' in df.columns:
+        df['retailer_name'] = df['amazon_domain'].map(amazon_host).fillna('Unknown')
+    if 'category_name' not in df.columns and 'search_query' not in df.columns and 'search_keyword' in df.columns:
+        df['category_name'] = df['search_keyword']
+    return df
+
+
+def run_engine(frame, engine, output_dir):
+    matcher = FileBasedMatcher(output_dir, scoring_engine=engine)
+    start = time.perf_counter()
+    matches, unmatched = matcher.match_products(matcher.prepare_products(frame.copy()))
+    elapsed = time.perf_counter() - start
+    return pd.DataFrame(matches), pd.DataFrame(unmatched), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare pairwise and vectorized scoring engines')
+    parser.add_argument('inputs', nargs='*', default=DEFAULT_INPUTS, help='Input CSV files')
+    args = parser.parse_args()
+
+    all_identical = True
+    with tempfile.TemporaryDirectory() as tmp:
+        for input_file in args.inputs:
+            print(f"\n📂 {input_file}")
+            frame = load_input(input_file)
+            base_matches, base_unmatched, base_time = run_engine(frame, 'pairwise', tmp)
+            vec_matches, vec_unmatched, vec_time = run_engine(frame, 'vectorized', tmp)
+
+            base_matches = base_matches.drop(columns=IGNORED_COLUMNS, errors='ignore')
+            vec_matches = vec_matches.drop(columns=IGNORED_COLUMNS, errors='ignore')
+            identical = base_matches.equals(vec_matches) and base_unmatched.equals(vec_unmatched)
+            all_identical &= identical
+
+            speedup = base_time / vec_time if vec_time else float('inf')
+            print(f"  pairwise:   {len(base_matches):,} matches in {base_time:.2f}s")
+            print(f"  vectorized: {len(vec_matches):,} matches in {vec_time:.2f}s ({speedup:.1f}x)")
+            if base_matches.empty and vec_matches.empty:
+                # Nothing was compared - e.g. every pair dropped by the same-retailer rule
+                print("  ❌ no matches from either engine - nothing to compare")
+                all_identical = False
+                continue
+            print(f"  {'✅ identical' if identical else '❌ outputs differ'}")
+
+    return 0 if all_identical else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,27 +5,38 @@ Loads only the columns we decided to keep based on analytics needs
 Handles date_key conversion from timestamp
 """
 
+import sys
+import time
+import argparse
 import psycopg2
 import pandas as pd
 from pathlib import Path
 import logging
 from datetime import datetime
 
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from table_io import latest_existing, read_table  # noqa: E402
+from table_io import read_columns  # noqa: E402
+from warehouse_io import METHODS, bulk_insert, db_config, natural_keys, upsert_frame, upsert_versions  # noqa: E402
+from warehouse_io import ensure_month_partitions, is_partitioned  # noqa: E402
+
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
 log = logging.getLogger(__name__)
 
-DB_CONFIG = {
-    'dbname': 'aue_warehouse',
-    'user': 'mahnoorbhatti',
-    'host': 'localhost',
-    'port': 5432
-}
+# From DB_HOST / DB_PORT / DB_NAME / DB_USER / DB_PASSWORD (.env)
+load_dotenv()
+DB_CONFIG = db_config()
 
 SCHEMA = 'aue'
 PROCESSED_DIR = Path("data/processed")
+MATERIALIZED_VIEWS_SQL = Path(__file__).resolve().parent.parent / "sql" / "materialized_views.sql"
+MATERIALIZED_VIEWS = ['mv_all_products', 'mv_price_comparison',
+                      'mv_best_matches_by_category', 'mv_retailer_coverage']
 
 # Columns to load - MATCHES create_clean_warehouse.sql EXACTLY
-# These are ALL the columns from the CSV that exist in the warehouse schema
+# These are ALL the columns from the CSV/Parquet files that exist in the warehouse schema
 MATCHED_COLUMNS = [
     # Product 1
     'product_1_id', 'product_1_name', 'brand_1',
@@ -57,6 +68,25 @@ UNMATCHED_COLUMNS = [
     'reason_unmatched'
 ]
 
+# Natural keys for incremental loads: per part, the first non-blank of the alternatives -
+# stable product keys when the matcher wrote them (--incremental), else product IDs,
+# else names - plus the retailer(s)
+MATCH_KEY_COLUMNS = [('product_1_key', 'product_1_id', 'product_1_name'),
+                     ('product_2_key', 'product_2_id', 'product_2_name'),
+                     ('retailer_1',), ('retailer_2',)]
+UNMATCHED_KEY_COLUMNS = [('product_key', 'product_id', 'product_name'), ('retailer_name',)]
+
+# Run metadata stamped on every match record - not a change of the match itself
+MATCHED_RUN_COLUMNS = ['processing_date']
+
+# matched_products is range-partitioned by month on this column; its unique keys include it.
+# It also dates each version of a match: the table keeps change-only history and flags
+# the latest version of every match with this column
+MATCHED_PARTITION_COLUMN = 'processing_date'
+MATCHED_CURRENT_COLUMN = 'is_current'
+# Monthly partitions created ahead of the current month on every load
+PARTITIONS_AHEAD = 1
+
 def get_db_connection():
     """Create PostgreSQL database connection."""
     try:
@@ -67,84 +97,148 @@ def get_db_connection():
         log.error(f"❌ Connection failed: {e}")
         raise
 
-def load_matched_products(conn):
-    """Load matched products from processed_matches.csv"""
-    log.info("\n📥 Loading matched_products...")
-    
-    csv_file = PROCESSED_DIR / "processed_matches.csv"
-    if not csv_file.exists():
-        log.warning(f"  ⚠️  File not found: {csv_file}")
-        return 0
-    
-    df = pd.read_csv(csv_file)
-    log.info(f"  📊 Read {len(df)} records")
-    
-    # Select only the essential columns we decided to keep
-    df = df[MATCHED_COLUMNS].copy()
-    
+def ensure_natural_keys(conn):
+    """Add the natural-key columns + unique indexes incremental loads upsert on (idempotent)."""
     cursor = conn.cursor()
-    
-    # Truncate table
-    cursor.execute(f"TRUNCATE TABLE {SCHEMA}.matched_products RESTART IDENTITY CASCADE")
-    log.info("  🗑️  Truncated table")
-    
-    # Insert records (only essential columns)
-    columns = MATCHED_COLUMNS
-    placeholders = ', '.join(['%s'] * len(columns))
-    columns_str = ', '.join(columns)
-    insert_sql = f'INSERT INTO {SCHEMA}.matched_products ({columns_str}) VALUES ({placeholders})'
-    
-    records = df.values.tolist()
-    cursor.executemany(insert_sql, records)
+    for table, key in (('matched_products', 'match_key'), ('unmatched_products', 'unmatched_key')):
+        cursor.execute(f"ALTER TABLE {SCHEMA}.{table} ADD COLUMN IF NOT EXISTS {key} TEXT")
+    # Unique keys of a partitioned table must contain the partition key
+    cursor.execute("SELECT indexdef FROM pg_indexes WHERE schemaname = %s AND indexname = %s",
+                   (SCHEMA, 'idx_matched_products_match_key'))
+    row = cursor.fetchone()
+    if row and MATCHED_PARTITION_COLUMN not in row[0]:
+        cursor.execute(f"DROP INDEX {SCHEMA}.idx_matched_products_match_key")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_matched_products_match_key "
+                   f"ON {SCHEMA}.matched_products (match_key, {MATCHED_PARTITION_COLUMN})")
+    # Versioned history: only the latest version of each match is current
+    cursor.execute(f"ALTER TABLE {SCHEMA}.matched_products "
+                   f"ADD COLUMN IF NOT EXISTS {MATCHED_CURRENT_COLUMN} BOOLEAN NOT NULL DEFAULT TRUE")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_matched_products_current "
+                   f"ON {SCHEMA}.matched_products (match_key) WHERE {MATCHED_CURRENT_COLUMN}")
+    cursor.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_unmatched_products_unmatched_key "
+                   f"ON {SCHEMA}.unmatched_products (unmatched_key)")
     conn.commit()
-    
-    # Verify
-    cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.matched_products")
-    count = cursor.fetchone()[0]
-    log.info(f"  ✅ Loaded {count:,} matched products")
-    
     cursor.close()
-    return count
 
-def load_unmatched_products(conn):
-    """Load unmatched products from unmatched_products.csv"""
-    log.info("\n📥 Loading unmatched_products...")
+def _read_with_key(source_file, columns, key_columns, key):
+    """Read the load columns plus a natural-key column.
+
+    Repeated keys get an occurrence suffix so every row keeps a unique key.
+    """
+    available = read_columns(source_file)
+    extra = [c for options in key_columns for c in options if c in available and c not in columns]
+    df = read_table(source_file, columns=columns + extra)
+
+    parts = pd.DataFrame(index=df.index)
+    for i, options in enumerate(key_columns):
+        part = pd.Series(pd.NA, index=df.index, dtype=object)
+        for column in options:
+            if column in df.columns:
+                values = df[column].astype(object).where(df[column].notna())
+                values = values.where(values.astype(str).str.strip() != '')
+                part = part.fillna(values)
+        parts[i] = part
+    base = pd.Series(natural_keys(parts, list(parts.columns)), index=df.index)
+    occurrence = base.groupby(base).cumcount()
+    df[key] = [f"{b}-{n}" if n else b for b, n in zip(base, occurrence)]
+    return df.drop(columns=extra)
+
+def ensure_partitions(conn, df, table, column):
+    """Fill missing partition dates and create the monthly partitions the load needs.
+
+    Covers every month present in the file plus PARTITIONS_AHEAD months past
+    the current one, so the next load never lands in the DEFAULT partition.
+    """
+    now = pd.Timestamp.now().floor('s')
+    df[column] = pd.to_datetime(df[column], errors='coerce', format='mixed').fillna(now)
+    if not is_partitioned(conn, f"{SCHEMA}.{table}"):
+        log.info(f"  ℹ️  {SCHEMA}.{table} is not partitioned (recreate it with sql/create_clean_warehouse.sql)")
+        return []
+    months = list(df[column]) + [now + pd.DateOffset(months=n) for n in range(PARTITIONS_AHEAD + 1)]
+    return ensure_month_partitions(conn, f"{SCHEMA}.{table}", column, months)
+
+def _load_table(conn, file_name, table, columns, key_columns, key, method, incremental,
+                partition_column=None, ignore=(), current_column=None):
+    """Load one table inside the caller's transaction (main() commits both tables at once)."""
+    log.info(f"\n📥 Loading {table}...")
     
-    csv_file = PROCESSED_DIR / "unmatched_products.csv"
-    if not csv_file.exists():
-        log.warning(f"  ⚠️  File not found: {csv_file}")
+    source_file = latest_existing(PROCESSED_DIR / file_name)
+    if source_file is None:
+        log.warning(f"  ⚠️  File not found: {PROCESSED_DIR / file_name} (or .parquet)")
         return 0
     
-    df = pd.read_csv(csv_file)
-    log.info(f"  📊 Read {len(df)} records")
-    
-    # Select only the essential columns we decided to keep
-    df = df[UNMATCHED_COLUMNS].copy()
+    # Read only the essential columns we decided to keep
+    df = _read_with_key(source_file, columns, key_columns, key)
+    log.info(f"  📊 Read {len(df)} records from {source_file.name}")
+    if partition_column:
+        ensure_partitions(conn, df, table, partition_column)
     
     cursor = conn.cursor()
     
-    # Truncate table
-    cursor.execute(f"TRUNCATE TABLE {SCHEMA}.unmatched_products RESTART IDENTITY CASCADE")
-    log.info("  🗑️  Truncated table")
-    
-    # Insert records (only essential columns)
-    columns = UNMATCHED_COLUMNS
-    placeholders = ', '.join(['%s'] * len(columns))
-    columns_str = ', '.join(columns)
-    insert_sql = f'INSERT INTO {SCHEMA}.unmatched_products ({columns_str}) VALUES ({placeholders})'
-    
-    records = df.values.tolist()
-    cursor.executemany(insert_sql, records)
-    conn.commit()
+    if incremental and current_column:
+        # Versioned history: new or changed rows get a new version, the old one is retired
+        written, retired = upsert_versions(conn, df, f"{SCHEMA}.{table}", columns, key, partition_column,
+                                           current_column=current_column, method=method, ignore=ignore)
+        log.info(f"  🔁 {written:,} new or changed, {retired:,} retired "
+                 f"({len(df) - written:,} unchanged)")
+    elif incremental:
+        # Stage + merge by natural key in one transaction - readers are never blocked
+        inserted, updated, deleted = upsert_frame(conn, df, f"{SCHEMA}.{table}", columns, key,
+                                                  method=method, ignore=ignore)
+        log.info(f"  🔁 {inserted:,} inserted, {updated:,} updated, {deleted:,} deleted "
+                 f"({len(df) - inserted - updated:,} unchanged)")
+    else:
+        # Truncate table
+        cursor.execute(f"TRUNCATE TABLE {SCHEMA}.{table} RESTART IDENTITY CASCADE")
+        log.info("  🗑️  Truncated table")
+        
+        # Bulk insert records (only essential columns)
+        bulk_insert(conn, df, f"{SCHEMA}.{table}", [key] + columns, method=method)
     
     # Verify
-    cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.unmatched_products")
+    current = f" WHERE {current_column}" if current_column else ""
+    cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.{table}{current}")
     count = cursor.fetchone()[0]
-    log.info(f"  ✅ Loaded {count:,} unmatched products")
+    log.info(f"  ✅ Loaded {count:,} {table.replace('_', ' ')}")
     
     cursor.close()
     return count
 
+def load_matched_products(conn, method='copy', incremental=False):
+    """Load matched products from processed_matches.csv/.parquet"""
+    return _load_table(conn, "processed_matches.csv", 'matched_products', MATCHED_COLUMNS,
+                       MATCH_KEY_COLUMNS, 'match_key', method, incremental,
+                       partition_column=MATCHED_PARTITION_COLUMN, ignore=MATCHED_RUN_COLUMNS,
+                       current_column=MATCHED_CURRENT_COLUMN)
+
+def load_unmatched_products(conn, method='copy', incremental=False):
+    """Load unmatched products from unmatched_products.csv/.parquet"""
+    return _load_table(conn, "unmatched_products.csv", 'unmatched_products', UNMATCHED_COLUMNS,
+                       UNMATCHED_KEY_COLUMNS, 'unmatched_key', method, incremental)
+
+def ensure_materialized_views(conn):
+    """Create the materialized views and their indexes if missing (idempotent)."""
+    cursor = conn.cursor()
+    cursor.execute(MATERIALIZED_VIEWS_SQL.read_text())
+    conn.commit()
+    cursor.close()
+
+def refresh_materialized_views(conn):
+    """Refresh every materialized view without blocking readers."""
+    log.info("\n🔄 Refreshing materialized views...")
+    # CONCURRENTLY diffs against the old contents under a lighter lock; run each in its own commit
+    old_autocommit = conn.autocommit
+    conn.autocommit = True
+    cursor = conn.cursor()
+    try:
+        for view in MATERIALIZED_VIEWS:
+            start = time.perf_counter()
+            cursor.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {SCHEMA}.{view}")
+            log.info(f"  ✅ {view} ({time.perf_counter() - start:.2f}s)")
+    finally:
+        cursor.close()
+        conn.autocommit = old_autocommit
+
 def verify_load(conn):
     """Verify data was loaded correctly"""
     log.info("\n" + "=" * 70)
@@ -153,24 +247,39 @@ def verify_load(conn):
     
     cursor = conn.cursor()
     
-    # Table counts
-    cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.matched_products")
-    matched_count = cursor.fetchone()[0]
+    # Table counts (current matches; retired versions are history)
+    cursor.execute(f"SELECT COUNT(*) FILTER (WHERE {MATCHED_CURRENT_COLUMN}), COUNT(*) "
+                   f"FROM {SCHEMA}.matched_products")
+    matched_count, matched_versions = cursor.fetchone()
     
     cursor.execute(f"SELECT COUNT(*) FROM {SCHEMA}.unmatched_products")
     unmatched_count = cursor.fetchone()[0]
     
     total = matched_count + unmatched_count
     
-    log.info(f"✅ Matched products:   {matched_count:,}")
+    log.info(f"✅ Matched products:   {matched_count:,} ({matched_versions - matched_count:,} older versions)")
     log.info(f"✅ Unmatched products: {unmatched_count:,}")
     log.info(f"📦 Total products:     {total:,}")
     
+    # Rows per partition (time-partitioned schema only)
+    cursor.execute(f"""
+        SELECT tableoid::regclass::text, COUNT(*)
+        FROM {SCHEMA}.matched_products
+        GROUP BY 1
+        ORDER BY 1
+    """)
+    partitions = cursor.fetchall()
+    if len(partitions) > 1 or (partitions and partitions[0][0] != f"{SCHEMA}.matched_products"):
+        log.info("\n🗓️  Matched product partitions:")
+        for partition, count in partitions:
+            log.info(f"  • {partition}: {count:,}")
+    
     # Category breakdown
     log.info("\n📋 Categories:")
     cursor.execute(f"""
         SELECT category, COUNT(*) 
         FROM {SCHEMA}.matched_products 
+        WHERE {MATCHED_CURRENT_COLUMN}
         GROUP BY category 
         ORDER BY COUNT(*) DESC 
         LIMIT 10
@@ -183,7 +292,7 @@ def verify_load(conn):
     cursor.execute(f"""
         SELECT product_1_name, retailer_1, price_1, retailer_2, price_2, similarity
         FROM {SCHEMA}.matched_products
-        WHERE price_1 IS NOT NULL AND price_2 IS NOT NULL
+        WHERE {MATCHED_CURRENT_COLUMN} AND price_1 IS NOT NULL AND price_2 IS NOT NULL
         LIMIT 5
     """)
     for row in cursor.fetchall():
@@ -191,7 +300,16 @@ def verify_load(conn):
     
     cursor.close()
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load pipeline output files into the warehouse')
+    parser.add_argument('--method', choices=METHODS, default='copy',
+                        help='copy: COPY FROM STDIN (default); values: multi-row INSERT pages')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Upsert changed rows by natural key instead of TRUNCATE-and-reload')
+    parser.add_argument('--no-refresh', action='store_true',
+                        help='Skip refreshing the materialized views after the load')
+    args = parser.parse_args(argv)
+
     print("=" * 70)
     print("🏭 AUÊ NATURAL - LOAD PIPELINE OUTPUT TO WAREHOUSE")
     print("=" * 70)
@@ -203,9 +321,22 @@ def main():
     try:
         conn = get_db_connection()
         
-        # Load both tables
-        matched = load_matched_products(conn)
-        unmatched = load_unmatched_products(conn)
+        # Natural-key columns for the upserts (older schemas lack them)
+        ensure_natural_keys(conn)
+        
+        # Load both tables in one transaction - readers see the old or the new data, never a mix
+        try:
+            matched = load_matched_products(conn, args.method, args.incremental)
+            unmatched = load_unmatched_products(conn, args.method, args.incremental)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        # Materialized views for the dashboards
+        ensure_materialized_views(conn)
+        if not args.no_refresh:
+            refresh_materialized_views(conn)
         
         # Verify
         verify_load(conn)
@@ -218,9 +349,9 @@ def main():
         print(f"\n📊 Loaded {matched + unmatched:,} total products")
         print("\n🎯 Your warehouse is ready for queries!")
         print("\n💡 Try these queries:")
-        print(f"   SELECT * FROM {SCHEMA}.price_comparison LIMIT 10;")
-        print(f"   SELECT * FROM {SCHEMA}.best_matches_by_category;")
-        print(f"   SELECT * FROM {SCHEMA}.retailer_coverage;")
+        print(f"   SELECT * FROM {SCHEMA}.mv_price_comparison LIMIT 10;")
+        print(f"   SELECT * FROM {SCHEMA}.mv_best_matches_by_category;")
+        print(f"   SELECT * FROM {SCHEMA}.mv_retailer_coverage;")
         
         return 0
         
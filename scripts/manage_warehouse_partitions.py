@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Manage Warehouse Partitions
+Lists, creates and retires the monthly partitions of aue.matched_products
+(range-partitioned on processing_date, see sql/create_clean_warehouse.sql).
+Retention detaches partitions older than N months: by default they are moved
+to an archive schema as standalone tables (still queryable, no longer scanned
+by the dashboards); --drop deletes them. Matches still current in those
+months (unchanged since) are first carried forward into the oldest kept
+month, so only superseded versions leave. Materialized views are refreshed
+after a detach. Connection settings come from the DB_* environment variables.
+
+    python scripts/manage_warehouse_partitions.py list
+    python scripts/manage_warehouse_partitions.py create --months-ahead 2
+    python scripts/manage_warehouse_partitions.py retain --keep-months 12 --dry-run
+    python scripts/manage_warehouse_partitions.py retain --keep-months 12 --archive-schema aue_archive
+"""
+
+import sys
+import logging
+import argparse
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from load_pipeline_to_warehouse import (  # noqa: E402
+    MATCHED_CURRENT_COLUMN, MATCHED_PARTITION_COLUMN, SCHEMA, get_db_connection, refresh_materialized_views)
+from warehouse_io import (  # noqa: E402
+    detach_partitions_before, ensure_month_partitions, is_partitioned, list_partitions, month_start)
+
+log = logging.getLogger(__name__)
+
+TABLE = f"{SCHEMA}.matched_products"
+
+
+def show_partitions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(f"SELECT tableoid::regclass::text, COUNT(*) FROM {TABLE} GROUP BY 1")
+        counts = dict(cursor.fetchall())
+    print(f"{'partition':<40} {'from':>12} {'to':>12} {'rows':>10}")
+    for partition, lower, upper in list_partitions(conn, TABLE):
+        start = f"{lower:%Y-%m-%d}" if lower is not None else 'DEFAULT'
+        end = f"{upper:%Y-%m-%d}" if upper is not None else ''
+        print(f"{partition:<40} {start:>12} {end:>12} {counts.get(partition, 0):>10,}")
+
+
+def carry_forward(conn, cutoff, dry_run=False):
+    """Move current rows dated before `cutoff` to `cutoff` (the oldest kept month); returns their count.
+
+    Their partitions are about to be detached, and they are still the latest
+    version of their match. Runs in the caller's transaction.
+    """
+    with conn.cursor() as cursor:
+        if dry_run:
+            cursor.execute(f"SELECT COUNT(*) FROM {TABLE} WHERE {MATCHED_CURRENT_COLUMN} "
+                           f"AND {MATCHED_PARTITION_COLUMN} < %s", (cutoff.to_pydatetime(),))
+            return cursor.fetchone()[0]
+        ensure_month_partitions(conn, TABLE, MATCHED_PARTITION_COLUMN, [cutoff])
+        cursor.execute(f"UPDATE {TABLE} SET {MATCHED_PARTITION_COLUMN} = %s "
+                       f"WHERE {MATCHED_CURRENT_COLUMN} AND {MATCHED_PARTITION_COLUMN} < %s",
+                       (cutoff.to_pydatetime(), cutoff.to_pydatetime()))
+        return cursor.rowcount
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the monthly partitions of aue.matched_products')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='Partitions with their ranges and row counts')
+    create = sub.add_parser('create', help='Create the partitions up to N months past the current one')
+    create.add_argument('--months-ahead', type=int, default=1)
+    retain = sub.add_parser('retain', help='Detach partitions older than --keep-months')
+    retain.add_argument('--keep-months', type=int, required=True,
+                        help='Months to keep attached, counting the current one')
+    retain.add_argument('--archive-schema', default=f"{SCHEMA}_archive",
+                        help='Schema detached partitions are moved to (default: %(default)s)')
+    retain.add_argument('--drop', action='store_true', help='Drop detached partitions instead of archiving')
+    retain.add_argument('--dry-run', action='store_true', help='Only show what would be detached')
+    retain.add_argument('--no-refresh', action='store_true',
+                        help='Skip refreshing the materialized views after detaching')
+    args = parser.parse_args()
+    if args.command == 'retain' and args.keep_months < 1:
+        parser.error('--keep-months must be at least 1')
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    conn = get_db_connection()
+    try:
+        if not is_partitioned(conn, TABLE):
+            log.error(f"❌ {TABLE} is not partitioned (recreate it with sql/create_clean_warehouse.sql)")
+            return 1
+
+        if args.command == 'list':
+            show_partitions(conn)
+        elif args.command == 'create':
+            now = pd.Timestamp.now()
+            months = [now + pd.DateOffset(months=n) for n in range(args.months_ahead + 1)]
+            created = ensure_month_partitions(conn, TABLE, MATCHED_PARTITION_COLUMN, months)
+            conn.commit()
+            log.info(f"✅ {len(created)} partition(s) created")
+        else:
+            cutoff = month_start(pd.Timestamp.now()) - pd.DateOffset(months=args.keep_months - 1)
+            if args.dry_run:
+                old = [p for p, _, upper in list_partitions(conn, TABLE) if upper is not None and upper <= cutoff]
+                log.info(f"🔍 Would detach {len(old)} partition(s) ending on or before {cutoff:%Y-%m-%d}: "
+                         f"{', '.join(old) or '-'}")
+                log.info(f"🔍 Would carry {carry_forward(conn, cutoff, dry_run=True):,} current match(es) "
+                         f"forward to {cutoff:%Y-%m-%d}")
+                return 0
+            carried = carry_forward(conn, cutoff)
+            log.info(f"⏩ Carried {carried:,} current match(es) forward to {cutoff:%Y-%m-%d}")
+            detached = detach_partitions_before(conn, TABLE, cutoff, archive_schema=args.archive_schema,
+                                                drop=args.drop)
+            conn.commit()
+            where = 'dropped' if args.drop else f"moved to {args.archive_schema}"
+            log.info(f"🗄️  Detached {len(detached)} partition(s) before {cutoff:%Y-%m-%d} ({where})")
+            for partition in detached:
+                log.info(f"  • {partition}")
+            if detached and not args.no_refresh:
+                refresh_materialized_views(conn)
+        return 0
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
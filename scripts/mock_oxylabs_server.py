@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Mock Oxylabs Realtime API
+Local HTTP server for testing the scraper without credentials or credits.
+Replays responses recorded with `oxylabs_googleshopping_script.py --record-dir`
+and synthesizes deterministic result pages for anything not recorded.
+
+    python scripts/mock_oxylabs_server.py --recordings data/raw/recordings --latency 0.5
+    python src/oxylabs_googleshopping_script.py --base-url http://127.0.0.1:8099/v1/queries
+"""
+
+import sys
+import json
+import random
+import asyncio
+import argparse
+from pathlib import Path
+
+from aiohttp import web
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+from oxylabs_client import recording_name  # noqa: E402
+
+MERCHANTS = ['Amazon.co.uk', 'Boots', 'LOOKFANTASTIC', 'Holland & Barrett', 'Superdrug', 'Ethique']
+
+
+def synthetic_page(query, page, items):
+    """A parsed Google Shopping response with `items` deterministic organic results."""
+    rng = random.Random(f"{query}:{page}")
+    organic = []
+    for i in range(items):
+        pos = (page - 1) * items + i + 1
+        merchant = rng.choice(MERCHANTS)
+        organic.append({
+            'pos': pos,
+            'url': f"https://shop.example/{query.replace(' ', '-')}/{pos}",
+            'title': f"{query.title()} {rng.choice(['Natural', 'Vegan', 'Organic'])} {rng.randint(50, 250)}g",
+            'price': round(rng.uniform(3, 30), 2),
+            'currency': 'GBP',
+            'merchant': {'name': merchant},
+            'product_id': str(rng.getrandbits(48)),
+            'thumbnail': '',
+        })
+    return {'results': [{'content': {'results': {'organic': organic}}, 'status_code': 200}]}
+
+
+class MockOxylabs:
+    def __init__(self, recordings=None, latency=0.0, items=10, max_pages=10,
+                 fail_rate=0.0, retry_after=None, seed=0, repeat_from=None):
+        self.recordings = Path(recordings) if recordings else None
+        self.latency = latency
+        self.items = items
+        self.max_pages = max_pages
+        self.fail_rate = fail_rate
+        self.retry_after = retry_after
+        self.repeat_from = repeat_from
+        self.rng = random.Random(seed)
+        self.failures = 0
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    async def handle(self, request):
+        payload = await request.json()
+        query, page = payload['query'], int(payload.get('start_page', 1))
+        self.requests += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.rng.random() < self.fail_rate:
+                self.failures += 1
+                headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else None
+                return web.Response(status=503, text='Service Unavailable', headers=headers)
+            recorded = self.recordings / recording_name(query, page) if self.recordings else None
+            if recorded is not None and recorded.exists():
+                return web.Response(text=recorded.read_text(), content_type='application/json')
+            items = self.items if page <= self.max_pages else 0
+            if self.repeat_from and page >= self.repeat_from:
+                page = 1  # like Google Shopping cycling back over the same products
+            return web.json_response(synthetic_page(query, page, items))
+        finally:
+            self.in_flight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock Oxylabs realtime API for scraper tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--recordings', default=None, help='Directory of recorded responses to replay')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds to wait before each response')
+    parser.add_argument('--items', type=int, default=10, help='Synthetic results per page')
+    parser.add_argument('--max-pages', type=int, default=10,
+                        help='Synthetic pages with results; later pages come back empty')
+    parser.add_argument('--fail-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with HTTP 503')
+    parser.add_argument('--retry-after', type=float, default=None,
+                        help='Retry-After seconds sent with the 503s')
+    parser.add_argument('--repeat-from', type=int, default=None,
+                        help='Pages from this one on repeat the products of page 1')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the injected failures')
+    args = parser.parse_args()
+
+    mock = MockOxylabs(args.recordings, args.latency, args.items, args.max_pages,
+                       args.fail_rate, args.retry_after, args.seed, args.repeat_from)
+    app = web.Application()
+    app.router.add_post('/v1/queries', mock.handle)
+
+    async def report(app):
+        print(f"Served {mock.requests} requests (peak {mock.peak_in_flight} in flight, "
+              f"{mock.failures} injected failures)")
+    app.on_shutdown.append(report)
+
+    web.run_app(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -10,11 +10,20 @@ CREATE SCHEMA aue;
 -- ============================================================================
 -- TABLE 1: MATCHED_PRODUCTS
 -- Source: data/processed/processed_matches.csv
+-- Range-partitioned by month on processing_date: aue.matched_products_YYYY_MM
+-- partitions are created by the loader, old ones detached by
+-- scripts/manage_warehouse_partitions.py. Unique keys include processing_date.
+-- Change-only history: incremental loads add a row per new or changed match
+-- and retire the one it replaces (is_current = FALSE); the views below show
+-- current rows only.
 -- ============================================================================
 
 CREATE TABLE aue.matched_products (
     -- Primary Key
-    match_id BIGSERIAL PRIMARY KEY,
+    match_id BIGSERIAL,
+    
+    -- Natural Key (product pair + retailer pair, set by the loader)
+    match_key TEXT,
     
     -- Product 1 (Auê Natural Product)
     product_1_id TEXT,
@@ -49,20 +58,29 @@ CREATE TABLE aue.matched_products (
     
     -- Match Metadata (from CSV)
     match_source TEXT,
-    processing_date TIMESTAMP,
+    processing_date TIMESTAMP NOT NULL,
     engine_version TEXT,
     confidence_tier TEXT,
     match_rank INTEGER,
     
     -- Warehouse Metadata
-    import_ts TIMESTAMP WITH TIME ZONE DEFAULT NOW()
-);
+    is_current BOOLEAN NOT NULL DEFAULT TRUE,
+    import_ts TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    
+    PRIMARY KEY (match_id, processing_date)
+) PARTITION BY RANGE (processing_date);
 
--- Indexes
+-- Catches rows outside every monthly partition until the loader creates theirs
+CREATE TABLE aue.matched_products_default PARTITION OF aue.matched_products DEFAULT;
+
+-- Indexes (created on every partition)
+CREATE UNIQUE INDEX idx_matched_products_match_key ON aue.matched_products(match_key, processing_date);
+CREATE INDEX idx_matched_products_current ON aue.matched_products(match_key) WHERE is_current;
 CREATE INDEX idx_matched_product_1_id ON aue.matched_products(product_1_id);
 CREATE INDEX idx_matched_product_2_id ON aue.matched_products(product_2_id);
 CREATE INDEX idx_matched_category ON aue.matched_products(category);
-CREATE INDEX idx_matched_processing_date ON aue.matched_products(processing_date);
+CREATE INDEX idx_matched_processing_date ON aue.matched_products USING brin (processing_date);
+CREATE INDEX idx_matched_import_ts ON aue.matched_products USING brin (import_ts);
 CREATE INDEX idx_matched_similarity ON aue.matched_products(similarity);
 
 COMMENT ON TABLE aue.matched_products IS 'Products successfully matched between Auê Natural catalog and retailer listings';
@@ -76,6 +94,9 @@ CREATE TABLE aue.unmatched_products (
     -- Primary Key
     unmatched_id BIGSERIAL PRIMARY KEY,
     
+    -- Natural Key (product + retailer, set by the loader)
+    unmatched_key TEXT,
+    
     -- Product Identification
     product_id TEXT,
     product_name TEXT,
@@ -110,6 +131,7 @@ CREATE TABLE aue.unmatched_products (
 );
 
 -- Indexes
+CREATE UNIQUE INDEX idx_unmatched_products_unmatched_key ON aue.unmatched_products(unmatched_key);
 CREATE INDEX idx_unmatched_product_id ON aue.unmatched_products(product_id);
 CREATE INDEX idx_unmatched_category ON aue.unmatched_products(category_name);
 CREATE INDEX idx_unmatched_brand ON aue.unmatched_products(brand_name);
@@ -134,11 +156,11 @@ SELECT
     size_unit_1 AS size_unit,
     price_1 AS price,
     currency_1 AS currency,
-    date_key_1 AS date_key,
     retailer_1 AS retailer,
     similarity,
     import_ts
 FROM aue.matched_products
+WHERE is_current
 UNION ALL
 SELECT 
     'unmatched' AS record_type,
@@ -172,7 +194,7 @@ SELECT
     similarity,
     processing_date
 FROM aue.matched_products
-WHERE price_1 IS NOT NULL AND price_2 IS NOT NULL
+WHERE is_current AND price_1 IS NOT NULL AND price_2 IS NOT NULL
 ORDER BY ABS((price_2 - price_1) / NULLIF(price_1, 0) * 100) DESC;
 
 COMMENT ON VIEW aue.price_comparison IS 'Price differences between matched products';
@@ -186,6 +208,7 @@ SELECT
     ROUND(MIN(similarity), 2) AS min_similarity,
     ROUND(MAX(similarity), 2) AS max_similarity
 FROM aue.matched_products
+WHERE is_current
 GROUP BY category
 ORDER BY match_count DESC;
 
@@ -199,9 +222,9 @@ SELECT
     COUNT(DISTINCT category) AS category_count,
     ROUND(AVG(price), 2) AS avg_price
 FROM (
-    SELECT retailer_1 AS retailer_name, category, price_1 AS price FROM aue.matched_products
+    SELECT retailer_1 AS retailer_name, category, price_1 AS price FROM aue.matched_products WHERE is_current
     UNION ALL
-    SELECT retailer_2 AS retailer_name, category, price_2 AS price FROM aue.matched_products
+    SELECT retailer_2 AS retailer_name, category, price_2 AS price FROM aue.matched_products WHERE is_current
 ) AS combined
 WHERE price IS NOT NULL
 GROUP BY retailer_name
@@ -209,6 +232,12 @@ ORDER BY product_count DESC;
 
 COMMENT ON VIEW aue.retailer_coverage IS 'Retailer product catalog size and pricing';
 
+-- ============================================================================
+-- MATERIALIZED VIEWS (precomputed copies of the views above for dashboards)
+-- Defined in sql/materialized_views.sql - run it after this file (plain SQL,
+-- any client); scripts/load_pipeline_to_warehouse.py also applies it on every load.
+-- ============================================================================
+
 -- ============================================================================
 -- PERMISSIONS
 -- ============================================================================
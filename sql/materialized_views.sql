@@ -0,0 +1,149 @@
+-- ============================================================================
+-- AUÊ NATURAL - MATERIALIZED ANALYTICS VIEWS
+-- Precomputed versions of the analytics views for BI dashboards.
+-- Idempotent: run after create_clean_warehouse.sql, and by
+-- scripts/load_pipeline_to_warehouse.py, which refreshes them after each load
+-- with REFRESH MATERIALIZED VIEW CONCURRENTLY (needs the unique indexes below).
+-- Like the plain views they cover current match rows only (is_current).
+-- ============================================================================
+
+-- Upgrade: drop views created before matched_products kept history, so they
+-- are recreated below with the is_current filter
+DO $$
+DECLARE
+    view_name TEXT;
+BEGIN
+    FOR view_name IN
+        SELECT matviewname FROM pg_matviews
+        WHERE schemaname = 'aue' AND definition LIKE '%matched_products%'
+          AND definition NOT LIKE '%is_current%'
+    LOOP
+        EXECUTE format('DROP MATERIALIZED VIEW aue.%I', view_name);
+    END LOOP;
+END
+$$;
+
+-- Covering indexes on the base table for the dashboard access patterns
+CREATE INDEX IF NOT EXISTS idx_matched_category_similarity
+    ON aue.matched_products (category, similarity DESC)
+    INCLUDE (product_1_name, retailer_1, price_1, retailer_2, price_2);
+
+CREATE INDEX IF NOT EXISTS idx_matched_retailer_1_price
+    ON aue.matched_products (retailer_1, price_1)
+    INCLUDE (product_1_name, category);
+
+-- ----------------------------------------------------------------------------
+-- MV 1: All Products
+-- ----------------------------------------------------------------------------
+CREATE MATERIALIZED VIEW IF NOT EXISTS aue.mv_all_products AS
+SELECT
+    'matched' AS record_type,
+    match_id AS source_id,
+    product_1_id AS product_id,
+    product_1_name AS product_name,
+    brand_1 AS brand,
+    category,
+    size_value_1 AS size_value,
+    size_unit_1 AS size_unit,
+    price_1 AS price,
+    currency_1 AS currency,
+    retailer_1 AS retailer,
+    similarity,
+    import_ts
+FROM aue.matched_products
+WHERE is_current
+UNION ALL
+SELECT
+    'unmatched' AS record_type,
+    unmatched_id AS source_id,
+    product_id,
+    product_name,
+    brand_name AS brand,
+    category_name AS category,
+    size_value,
+    size_unit,
+    price,
+    currency,
+    retailer_name AS retailer,
+    NULL AS similarity,
+    import_ts
+FROM aue.unmatched_products;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_all_products_key
+    ON aue.mv_all_products (record_type, source_id);
+CREATE INDEX IF NOT EXISTS idx_mv_all_products_retailer_price
+    ON aue.mv_all_products (retailer, price)
+    INCLUDE (product_name, brand, category);
+
+-- ----------------------------------------------------------------------------
+-- MV 2: Price Comparison
+-- ----------------------------------------------------------------------------
+CREATE MATERIALIZED VIEW IF NOT EXISTS aue.mv_price_comparison AS
+SELECT
+    match_id,
+    product_1_name,
+    brand_1,
+    category,
+    retailer_1,
+    price_1,
+    retailer_2,
+    price_2,
+    (price_2 - price_1) AS price_diff,
+    ROUND(((price_2 - price_1) / NULLIF(price_1, 0) * 100)::NUMERIC, 2) AS price_diff_pct,
+    similarity,
+    processing_date
+FROM aue.matched_products
+WHERE is_current AND price_1 IS NOT NULL AND price_2 IS NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_price_comparison_key
+    ON aue.mv_price_comparison (match_id);
+CREATE INDEX IF NOT EXISTS idx_mv_price_comparison_category_similarity
+    ON aue.mv_price_comparison (category, similarity DESC)
+    INCLUDE (product_1_name, retailer_1, price_1, retailer_2, price_2, price_diff_pct);
+CREATE INDEX IF NOT EXISTS idx_mv_price_comparison_retailer_price
+    ON aue.mv_price_comparison (retailer_2, price_2)
+    INCLUDE (product_1_name, category, price_diff_pct);
+CREATE INDEX IF NOT EXISTS idx_mv_price_comparison_abs_diff
+    ON aue.mv_price_comparison (ABS(price_diff_pct) DESC);
+
+-- ----------------------------------------------------------------------------
+-- MV 3: Best Matches by Category
+-- ----------------------------------------------------------------------------
+CREATE MATERIALIZED VIEW IF NOT EXISTS aue.mv_best_matches_by_category AS
+SELECT
+    category,
+    COUNT(*) AS match_count,
+    ROUND(AVG(similarity), 2) AS avg_similarity,
+    ROUND(MIN(similarity), 2) AS min_similarity,
+    ROUND(MAX(similarity), 2) AS max_similarity
+FROM aue.matched_products
+WHERE is_current
+GROUP BY category;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_best_matches_by_category_key
+    ON aue.mv_best_matches_by_category (category);
+
+-- ----------------------------------------------------------------------------
+-- MV 4: Retailer Coverage
+-- ----------------------------------------------------------------------------
+CREATE MATERIALIZED VIEW IF NOT EXISTS aue.mv_retailer_coverage AS
+SELECT
+    retailer_name,
+    COUNT(*) AS product_count,
+    COUNT(DISTINCT category) AS category_count,
+    ROUND(AVG(price), 2) AS avg_price
+FROM (
+    SELECT retailer_1 AS retailer_name, category, price_1 AS price FROM aue.matched_products WHERE is_current
+    UNION ALL
+    SELECT retailer_2 AS retailer_name, category, price_2 AS price FROM aue.matched_products WHERE is_current
+) AS combined
+WHERE price IS NOT NULL
+GROUP BY retailer_name;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_retailer_coverage_key
+    ON aue.mv_retailer_coverage (retailer_name);
+
+COMMENT ON MATERIALIZED VIEW aue.mv_all_products IS 'Materialized aue.all_products (refreshed by the loader)';
+COMMENT ON MATERIALIZED VIEW aue.mv_price_comparison IS 'Materialized aue.price_comparison (refreshed by the loader)';
+COMMENT ON MATERIALIZED VIEW aue.mv_best_matches_by_category IS 'Materialized aue.best_matches_by_category (refreshed by the loader)';
+COMMENT ON MATERIALIZED VIEW aue.mv_retailer_coverage IS 'Materialized aue.retailer_coverage (refreshed by the loader)';
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Nearest-Neighbour Index over Sentence Embeddings
+------------------------------------------------
+Top-k semantic neighbour retrieval for a category's embedding matrix.
+Uses an HNSW graph (hnswlib) when it is installed and the group is large,
+otherwise an exact NumPy search over the normalized float32 matrix.
+"""
+
+import logging
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # optional dependency
+    hnswlib = None
+
+log = logging.getLogger("file_based_matcher")
+
+
+def normalize_rows(matrix):
+    """Return an L2-normalized float32 copy of a 2-D embedding matrix."""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NeighbourIndex:
+    """Cosine top-k index over the rows of a normalized embedding matrix."""
+
+    def __init__(self, matrix, exact_threshold=2000, m=16, ef_construction=200,
+                 ef_search=64, chunk_size=1024):
+        self.matrix = normalize_rows(matrix)
+        self.exact_threshold = exact_threshold
+        self.chunk_size = chunk_size
+        self.index = None
+
+        n, dim = self.matrix.shape
+        if hnswlib is not None and n > exact_threshold:
+            self.index = hnswlib.Index(space='cosine', dim=dim)
+            self.index.init_index(max_elements=n, ef_construction=ef_construction, M=m)
+            self.index.add_items(self.matrix, np.arange(n))
+            self.index.set_ef(max(ef_search, 1))
+            self.backend = 'hnsw'
+        else:
+            if n > exact_threshold:
+                log.debug("hnswlib not installed - using exact NumPy search")
+            self.backend = 'exact'
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def query(self, k):
+        """Return (neighbours, similarities) arrays of shape (n, k) excluding self.
+
+        Rows with fewer than k other items are padded with -1 / -inf.
+        """
+        n = len(self)
+        k_eff = min(k, n - 1)
+        neighbours = np.full((n, k), -1, dtype=np.int64)
+        sims = np.full((n, k), -np.inf, dtype=np.float32)
+        if k_eff <= 0:
+            return neighbours, sims
+
+        if self.backend == 'hnsw':
+            # Ask for one extra neighbour because the query point finds itself
+            self.index.set_ef(max(self.index.ef, k_eff + 1))
+            labels, distances = self.index.knn_query(self.matrix, k=k_eff + 1)
+            for row in range(n):
+                found = [(int(l), 1.0 - float(d)) for l, d in zip(labels[row], distances[row])
+                         if int(l) != row][:k_eff]
+                for col, (label, sim) in enumerate(found):
+                    neighbours[row, col] = label
+                    sims[row, col] = sim
+            return neighbours, sims
+
+        for start in range(0, n, self.chunk_size):
+            stop = min(start + self.chunk_size, n)
+            block = self.matrix[start:stop] @ self.matrix.T
+            block[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+            top = np.argpartition(-block, k_eff - 1, axis=1)[:, :k_eff]
+            top_sims = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_sims, axis=1, kind='stable')
+            neighbours[start:stop, :k_eff] = np.take_along_axis(top, order, axis=1)
+            sims[start:stop, :k_eff] = np.take_along_axis(top_sims, order, axis=1)
+
+        return neighbours, sims
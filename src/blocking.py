@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Candidate Pair Blocking
+-----------------------
+Candidate-generation stage for the file-based matcher. Instead of scoring
+every pair inside a category, each blocker emits only the pairs that share
+a blocking key (brand token, size bucket, rare title token, a sorted
+neighbourhood window, or top-k semantic neighbours). The union of all
+configured blockers is scored.
+"""
+
+import math
+import logging
+from collections import defaultdict
+
+import pandas as pd
+
+from ann_index import NeighbourIndex
+
+log = logging.getLogger("file_based_matcher")
+
+
+class Blocker:
+    """Base class: subclasses return a set of (i, j) row pairs with i < j."""
+
+    name = "base"
+
+    def candidate_pairs(self, group):
+        raise NotImplementedError
+
+    @staticmethod
+    def _pairs_from_blocks(blocks):
+        """Expand {key: [row indices]} into all within-block pairs."""
+        pairs = set()
+        for rows in blocks.values():
+            rows = sorted(set(rows))
+            for a in range(len(rows)):
+                for b in range(a + 1, len(rows)):
+                    pairs.add((rows[a], rows[b]))
+        return pairs
+
+
+class BrandBlocker(Blocker):
+    """Products sharing at least one brand token land in the same block."""
+
+    name = "brand"
+
+    def candidate_pairs(self, group):
+        blocks = defaultdict(list)
+        for i, brand in enumerate(group['brand_clean']):
+            if not isinstance(brand, str):
+                continue
+            for token in brand.split():
+                blocks[token].append(i)
+        return self._pairs_from_blocks(blocks)
+
+
+class SizeBucketBlocker(Blocker):
+    """Products with the same unit and a similar size (log-scale bucket, ±1)."""
+
+    name = "size"
+
+    def __init__(self, bucket_ratio=1.25):
+        self.log_base = math.log(bucket_ratio)
+
+    def candidate_pairs(self, group):
+        if 'size_value' not in group.columns or 'size_unit' not in group.columns:
+            return set()
+
+        blocks = defaultdict(list)
+        for i, (value, unit) in enumerate(zip(group['size_value'], group['size_unit'])):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                continue
+            if pd.isna(value) or value <= 0 or pd.isna(unit):
+                continue
+            bucket = int(math.floor(math.log(value) / self.log_base))
+            # Register in neighbouring buckets too so boundary sizes still meet
+            for b in (bucket - 1, bucket, bucket + 1):
+                blocks[(str(unit), b)].append(i)
+        return self._pairs_from_blocks(blocks)
+
+
+class RareTokenBlocker(Blocker):
+    """Inverted index over title tokens; only rare tokens open a block."""
+
+    name = "rare_token"
+
+    def __init__(self, max_df=0.1, min_block_size=50, min_token_len=3):
+        self.max_df = max_df
+        self.min_block_size = min_block_size
+        self.min_token_len = min_token_len
+
+    def candidate_pairs(self, group):
+        index = defaultdict(set)
+        for i, text in enumerate(group['product_clean']):
+            if not isinstance(text, str):
+                continue
+            for token in set(text.split()):
+                if len(token) >= self.min_token_len:
+                    index[token].add(i)
+
+        # Tokens shared by a large share of the category (e.g. "shampoo", "bar")
+        # carry no signal and would reintroduce the all-pairs blow-up
+        max_rows = max(self.min_block_size, int(self.max_df * len(group)))
+        blocks = {t: rows for t, rows in index.items() if 1 < len(rows) <= max_rows}
+        return self._pairs_from_blocks(blocks)
+
+
+class SortedNeighbourhoodBlocker(Blocker):
+    """Sort by normalized title and pair each row with the next `window - 1` rows."""
+
+    name = "sorted_neighbourhood"
+
+    def __init__(self, window=10):
+        self.window = window
+
+    def candidate_pairs(self, group):
+        titles = group['product_clean'].fillna('').astype(str).tolist()
+        order = sorted(range(len(titles)), key=lambda k: (titles[k], k))
+
+        pairs = set()
+        for pos, i in enumerate(order):
+            for j in order[pos + 1:pos + self.window]:
+                pairs.add((min(i, j), max(i, j)))
+        return pairs
+
+
+class SemanticNeighbourBlocker(Blocker):
+    """Top-k Sentence-BERT neighbours per product from a category-level index."""
+
+    name = "semantic"
+
+    def __init__(self, embed_fn=None, top_k=20):
+        self.embed_fn = embed_fn
+        self.top_k = top_k
+
+    def candidate_pairs(self, group):
+        if self.embed_fn is None:
+            raise ValueError("semantic blocker needs an embedding function")
+        if len(group) < 2:
+            return set()
+
+        texts = group['product_clean'].fillna('').astype(str).tolist()
+        index = NeighbourIndex(self.embed_fn(texts))
+        neighbours, _ = index.query(self.top_k)
+
+        pairs = set()
+        for i, row in enumerate(neighbours):
+            for j in row:
+                if j >= 0:
+                    pairs.add((min(i, int(j)), max(i, int(j))))
+        return pairs
+
+
+BLOCKERS = {
+    BrandBlocker.name: BrandBlocker,
+    SizeBucketBlocker.name: SizeBucketBlocker,
+    RareTokenBlocker.name: RareTokenBlocker,
+    SortedNeighbourhoodBlocker.name: SortedNeighbourhoodBlocker,
+    SemanticNeighbourBlocker.name: SemanticNeighbourBlocker,
+}
+
+
+def build_blockers(names, embed_fn=None, ann_top_k=20):
+    """Build blocker instances from a list (or comma-separated string) of names."""
+    if isinstance(names, str):
+        names = [n.strip() for n in names.split(',') if n.strip()]
+    names = [n for n in (names or []) if n != 'none']
+
+    unknown = [n for n in names if n not in BLOCKERS]
+    if unknown:
+        raise ValueError(f"Unknown blocker(s): {', '.join(unknown)} "
+                         f"(available: {', '.join(BLOCKERS)})")
+    blockers = []
+    for n in names:
+        if n == SemanticNeighbourBlocker.name:
+            blockers.append(SemanticNeighbourBlocker(embed_fn=embed_fn, top_k=ann_top_k))
+        else:
+            blockers.append(BLOCKERS[n]())
+    return blockers
+
+
+def pairs_in_rows(n_rows, row_start, row_stop):
+    """Number of pairs (i, j), i < j < n_rows, whose first row lies in [row_start, row_stop)."""
+    row_stop = min(row_stop, n_rows)
+    if row_stop <= row_start:
+        return 0
+    # sum of (n_rows - 1 - i) for i in [row_start, row_stop)
+    count = row_stop - row_start
+    return count * (n_rows - 1) - (row_start + row_stop - 1) * count // 2
+
+
+def generate_candidate_pairs(group, blockers):
+    """Return the sorted union of candidate pairs emitted by all blockers."""
+    pairs = set()
+    for blocker in blockers:
+        pairs |= blocker.candidate_pairs(group)
+    return sorted(pairs)
+
+
+class BlockingStats:
+    """Accumulates reduction ratio and pair completeness across categories."""
+
+    def __init__(self):
+        self.total_pairs = 0
+        self.candidate_pairs = 0
+        self.exhaustive_matches = 0
+        self.candidate_matches = 0
+        self.evaluated = False
+
+    def add_category(self, n_rows, n_candidates):
+        self.add_rows(n_rows, 0, n_rows, n_candidates)
+
+    def add_rows(self, n_rows, row_start, row_stop, n_candidates):
+        """Record a row tile [row_start, row_stop) of an n_rows category."""
+        self.total_pairs += pairs_in_rows(n_rows, row_start, row_stop)
+        self.candidate_pairs += n_candidates
+
+    def add_evaluation(self, exhaustive_matches, candidate_matches):
+        self.evaluated = True
+        self.exhaustive_matches += exhaustive_matches
+        self.candidate_matches += candidate_matches
+
+    def merge(self, other):
+        """Fold in the counts of another BlockingStats (e.g. from a worker)."""
+        self.total_pairs += other.total_pairs
+        self.candidate_pairs += other.candidate_pairs
+        self.exhaustive_matches += other.exhaustive_matches
+        self.candidate_matches += other.candidate_matches
+        self.evaluated = self.evaluated or other.evaluated
+
+    @property
+    def reduction_ratio(self):
+        if self.total_pairs == 0:
+            return 0.0
+        return 1 - self.candidate_pairs / self.total_pairs
+
+    @property
+    def pair_completeness(self):
+        if not self.evaluated:
+            return None
+        if self.exhaustive_matches == 0:
+            return 1.0
+        return self.candidate_matches / self.exhaustive_matches
+
+    def to_dict(self):
+        completeness = self.pair_completeness
+        return {
+            "total_pairs": self.total_pairs,
+            "candidate_pairs": self.candidate_pairs,
+            "reduction_ratio": round(self.reduction_ratio, 4),
+            "exhaustive_matches": self.exhaustive_matches if self.evaluated else None,
+            "candidate_matches": self.candidate_matches if self.evaluated else None,
+            "pair_completeness": round(completeness, 4) if completeness is not None else None,
+        }
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Brand Dictionary
+----------------
+Loads the known-brand list from a file and compiles it into one token trie,
+so each title is scanned once regardless of how many brands there are.
+
+Matching is case-insensitive and on whole words only ("weDo" does not fire
+inside "wedding"). The leftmost brand in the title wins, and at that position
+the longest brand wins ("Faith in Nature" over "Faith").
+"""
+
+import re
+import logging
+from pathlib import Path
+
+import pandas as pd
+
+log = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+(?:'\w+)*")
+_END = None  # trie key holding the canonical brand name of a terminal node
+
+
+def tokenize(text):
+    """Lowercased word tokens (apostrophes kept inside words)."""
+    return TOKEN_PATTERN.findall(text.lower().replace('’', "'"))
+
+
+def load_brands(path):
+    """Brand names from a text file (one per line, # comments) or a CSV with a `brand` column."""
+    path = Path(path)
+    if path.suffix.lower() == '.csv':
+        frame = pd.read_csv(path)
+        column = 'brand' if 'brand' in frame.columns else frame.columns[0]
+        return [str(b).strip() for b in frame[column].dropna() if str(b).strip()]
+
+    brands = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                brands.append(line)
+    return brands
+
+
+class BrandDictionary:
+    """Token trie over brand names with leftmost-longest whole-word matching."""
+
+    def __init__(self, brands=()):
+        self.root = {}
+        self.size = 0
+        for brand in brands:
+            self.add(brand)
+
+    @classmethod
+    def from_file(cls, path):
+        dictionary = cls(load_brands(path))
+        log.info(f"Loaded {len(dictionary):,} brands from {path}")
+        return dictionary
+
+    def __len__(self):
+        return self.size
+
+    def add(self, brand):
+        """Add a brand; the first spelling of a duplicate is kept as canonical."""
+        tokens = tokenize(brand)
+        if not tokens:
+            return
+        node = self.root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        if _END not in node:
+            node[_END] = brand
+            self.size += 1
+
+    def find_tokens(self, tokens):
+        """Canonical brand for a token list, or None."""
+        root = self.root
+        for start in range(len(tokens)):
+            node = root.get(tokens[start])
+            match = None
+            i = start + 1
+            while node is not None:
+                match = node.get(_END, match)
+                if i == len(tokens):
+                    break
+                node = node.get(tokens[i])
+                i += 1
+            if match is not None:
+                return match
+        return None
+
+    def find(self, title):
+        """Canonical brand mentioned in a title, or None."""
+        if not isinstance(title, str) or not self.size:
+            return None
+        return self.find_tokens(tokenize(title))
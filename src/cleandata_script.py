@@ -13,6 +13,13 @@ import pandas as pd
 import numpy as np
 import logging
 from datetime import datetime
+from functools import lru_cache
+
+from brand_dictionary import BrandDictionary
+from price_history import DEFAULT_DIR as PRICE_HISTORY_DIR, PriceHistory
+from result_sink import chunk_writer, publish_file
+from sketches import HyperLogLog
+from table_io import default_format, iter_table, read_table, write_table
 
 # === LOGGING SETUP ===
 logging.basicConfig(
@@ -22,12 +29,8 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # === CONFIGURATION ===
-KNOWN_BRANDS = [
-    'Garnier', 'Friendly Soap', 'Kitsch', 'Faith in Nature', 
-    'Davines', 'Soaphoria', 'weDo', 'Biovene', 'Little Soap Company',
-    'Eco Warrior', 'LOOKFANTASTIC', 'Justmylook', 'Anihana', 'Tree Hut',
-    'The Earthling Co.', 'Ethique', 'Abhati Suisse'
-]
+# Known brands, one per line (or a CSV with a `brand` column)
+BRANDS_FILE = os.getenv("BRANDS_FILE", "data/reference/brands.txt")
 
 UNIT_MAP = {
     "ml": "ml", "milliliter": "ml", "milliliters": "ml",
@@ -37,6 +40,39 @@ UNIT_MAP = {
     "pcs": "pcs", "bars": "pcs", "tabs": "pcs", "pack": "pcs", "packs": "pcs"
 }
 
+# Title patterns, compiled once (tried in order; the first one that matches wins)
+PACK_PATTERNS = [re.compile(p) for p in [
+    r'(\d+)\s*[-]?\s*pack',
+    r'pack\s*of\s*(\d+)',
+    r'bulk\s*x\s*(\d+)',
+    r'\((?:x)?(\d+)[- ]?pack\)',
+    r'(\d+)[xX]\s*(?:pcs|pieces|bars|items)?',
+    r'(\d+)\s*pcs'
+]]
+# A literal each pack pattern needs in the lowercased title (cheap prefilter)
+PACK_LITERALS = ['pack', 'pack', 'bulk', 'pack', 'x', 'pcs']
+SIZE_PATTERNS = [
+    re.compile(r'(\d+(?:\.\d+)?)\s*(ml|g|gram|grams|kg|oz|ounce|ounces|l|litre|litres)')
+]
+TITLE_SIZE_PATTERN = re.compile(
+    r'\b\d+(?:\.\d+)?\s*(x\s*\d+)?\s*(ml|g|kg|oz|l|litre|pack|packs|pcs|bars|tabs)\b',
+    flags=re.IGNORECASE)
+NON_ALNUM_PATTERN = re.compile(r'[^a-zA-Z0-9\s]+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# Punctuation -> space followed by whitespace collapsing, in one pass (ASCII-only
+# class, so it is also safe for the Arrow/RE2 string engine)
+SEPARATOR_RUN_PATTERN = r'[^a-zA-Z0-9]+'
+
+
+@lru_cache(maxsize=None)
+def get_brand_dictionary(path=None):
+    """Brand dictionary compiled from BRANDS_FILE (empty if the file is missing)."""
+    path = path or BRANDS_FILE
+    if not os.path.exists(path):
+        logger.warning(f"⚠️  Brand file not found: {path} - using capitalization fallback only")
+        return BrandDictionary()
+    return BrandDictionary.from_file(path)
+
 # === CORE CLEANING FUNCTIONS ===
 
 def extract_pack_and_size(title: str):
@@ -48,26 +84,15 @@ def extract_pack_and_size(title: str):
     pack_qty, size_val, size_unit = None, None, None
 
     # --- Pack quantity patterns ---
-    pack_patterns = [
-        r'(\d+)\s*[-]?\s*pack',
-        r'pack\s*of\s*(\d+)',
-        r'bulk\s*x\s*(\d+)',
-        r'\((?:x)?(\d+)[- ]?pack\)',
-        r'(\d+)[xX]\s*(?:pcs|pieces|bars|items)?',
-        r'(\d+)\s*pcs'
-    ]
-    for p in pack_patterns:
-        m = re.search(p, title_l)
+    for p in PACK_PATTERNS:
+        m = p.search(title_l)
         if m:
             pack_qty = int(m.group(1))
             break
 
     # --- Size patterns ---
-    size_patterns = [
-        r'(\d+(?:\.\d+)?)\s*(ml|g|gram|grams|kg|oz|ounce|ounces|l|litre|litres)'
-    ]
-    for p in size_patterns:
-        m = re.search(p, title_l)
+    for p in SIZE_PATTERNS:
+        m = p.search(title_l)
         if m:
             size_val = float(m.group(1))
             size_unit = UNIT_MAP.get(m.group(2), m.group(2))
@@ -86,14 +111,13 @@ def normalize_total_size(row):
 
 
 def extract_brand(title: str):
-    """Extract brand using known brand list + capitalization logic."""
+    """Extract brand using the brand dictionary + capitalization logic."""
     if not isinstance(title, str):
         return None
 
-    title_l = title.lower()
-    for brand in KNOWN_BRANDS:
-        if brand.lower() in title_l:
-            return brand
+    brand = get_brand_dictionary().find(title)
+    if brand:
+        return brand
 
     # fallback: take first capitalized tokens
     tokens = title.split()
@@ -106,78 +130,233 @@ def clean_title_text(title: str):
     if not isinstance(title, str):
         return None
 
-    title = re.sub(
-        r'\b\d+(?:\.\d+)?\s*(x\s*\d+)?\s*(ml|g|kg|oz|l|litre|pack|packs|pcs|bars|tabs)\b',
-        '', title, flags=re.IGNORECASE)
-    title = re.sub(r'[^a-zA-Z0-9\s]+', ' ', title)
-    title = re.sub(r'\s+', ' ', title).strip().lower()
+    title = TITLE_SIZE_PATTERN.sub('', title)
+    title = NON_ALNUM_PATTERN.sub(' ', title)
+    title = WHITESPACE_PATTERN.sub(' ', title).strip().lower()
     return title
 
 
+# === VECTORIZED CLEANING FUNCTIONS ===
+# Column-at-a-time equivalents of the row functions above; same results.
+
+def _text_only(titles: pd.Series):
+    """Titles as strings, with non-string values masked to NaN."""
+    if pd.api.types.is_string_dtype(titles) and titles.dtype != object:
+        return titles
+    return titles.where(titles.map(lambda t: isinstance(t, str)))
+
+
+def extract_pack_and_size_vectorized(titles: pd.Series):
+    """Pack quantity, size value and size unit for a whole title column."""
+    lower = _text_only(titles).str.lower()
+
+    # Each pattern only runs on the titles no earlier pattern matched that
+    # contain its required literal
+    pack_qty = pd.Series(np.nan, index=titles.index)
+    remaining = lower.dropna()
+    for p, literal in zip(PACK_PATTERNS, PACK_LITERALS):
+        candidates = remaining[remaining.str.contains(literal, regex=False)]
+        found = candidates.str.extract(p, expand=False).dropna()
+        pack_qty[found.index] = np.array(found.map(float), dtype=float)
+        remaining = remaining.drop(found.index)
+
+    size_value = pd.Series(np.nan, index=titles.index)
+    size_unit = pd.Series(np.nan, index=titles.index, dtype=object)
+    for p in SIZE_PATTERNS:
+        found = lower.str.extract(p)
+        todo = size_value.isna() & found[0].notna()
+        size_value[todo] = np.array(found.loc[todo, 0].map(float), dtype=float)
+        size_unit[todo] = found.loc[todo, 1].map(lambda u: UNIT_MAP.get(u, u))
+
+    return pack_qty.astype(float), size_value, size_unit.infer_objects()
+
+
+def total_size_vectorized(pack_qty, size_value):
+    """Pack quantity x size value (pack defaults to 1); NaN where size is unknown."""
+    pack = np.where(np.isnan(pack_qty), 1.0, pack_qty)
+    return np.where(np.isnan(size_value), np.nan, pack * size_value)
+
+
+def extract_brand_vectorized(titles: pd.Series):
+    """Brand dictionary match, falling back to the leading capitalized tokens."""
+    text = _text_only(titles)
+    dictionary = get_brand_dictionary()
+
+    # One trie scan per distinct title
+    codes, uniques = pd.factorize(text)
+    found = np.array([dictionary.find(t) for t in uniques] + [None], dtype=object)
+    brand = pd.Series(found[codes], index=titles.index, dtype=object)
+
+    todo = brand.isna() & text.notna()
+    brand[todo] = [" ".join(t for t in title.split()[:3] if t and t[0].isupper()) or None
+                   for title in text[todo]]
+    return brand.infer_objects()
+
+
+def clean_title_text_vectorized(titles: pd.Series):
+    """Normalized matching text for a whole title column."""
+    text = _text_only(titles)
+    text = text.str.replace(TITLE_SIZE_PATTERN, '', regex=True)
+    return text.str.replace(SEPARATOR_RUN_PATTERN, ' ', regex=True).str.strip().str.lower().infer_objects()
+
+
 # === MAIN CLEANING FUNCTION ===
 
-def clean_raw_data(input_file, output_file="cleaned_products.csv"):
-    """Main cleaning pipeline."""
-    logger.info(f"🔹 Cleaning file: {input_file}")
-    df = pd.read_csv(input_file)
-    logger.info(f"Loaded {len(df)} rows")
+def clean_products(df, vectorized=True):
+    """Add the cleaned brand/size/pack/text columns to a raw results frame.
 
-    # --- Extract brand, size, pack ---
-    df["brand_clean"] = df["title"].apply(extract_brand)
-    df["pack_qty"], df["size_value"], df["size_unit"] = zip(*df["title"].apply(extract_pack_and_size))
-    df["total_size"] = df.apply(normalize_total_size, axis=1)
+    vectorized=False runs the original row-by-row functions (kept for comparison).
+    """
+    # --- Extract brand, size, pack and clean product text ---
+    if vectorized:
+        df["brand_clean"] = extract_brand_vectorized(df["title"])
+        df["pack_qty"], df["size_value"], df["size_unit"] = extract_pack_and_size_vectorized(df["title"])
+        df["total_size"] = total_size_vectorized(df["pack_qty"].to_numpy(), df["size_value"].to_numpy())
+        df["product_clean"] = clean_title_text_vectorized(df["title"])
+    else:
+        df["brand_clean"] = df["title"].apply(extract_brand)
+        df["pack_qty"], df["size_value"], df["size_unit"] = zip(*df["title"].apply(extract_pack_and_size))
+        df["total_size"] = df.apply(normalize_total_size, axis=1)
+        df["product_clean"] = df["title"].apply(clean_title_text)
 
-    # --- Clean product text ---
-    df["product_clean"] = df["title"].apply(clean_title_text)
     df["category_clean"] = df["search_query"].fillna("Unknown").str.lower()
 
-    # --- Fill NaNs and strip whitespace ---
-    df = df.fillna({"brand_clean": "none", "category_clean": "unknown"})
+    # --- Fill NaNs (column-wise, without copying the frame) and strip whitespace ---
+    df["brand_clean"] = df["brand_clean"].fillna("none")
+    df["category_clean"] = df["category_clean"].fillna("unknown")
     df["product_clean"] = df["product_clean"].str.strip()
+    return df
 
-    # --- Export ---
+
+class CleaningStats:
+    """Summary statistics accumulated chunk by chunk in bounded memory.
+
+    Distinct brands are counted exactly for a single frame; across chunks
+    (chunked=True) they are estimated with a HyperLogLog sketch.
+    """
+
+    def __init__(self, chunked=False):
+        self.rows = 0
+        self.size_detected = 0
+        self.pack_detected = 0
+        self.brands = HyperLogLog() if chunked else None
+        self.brand_count = 0
+
+    def add(self, df):
+        self.rows += len(df)
+        self.size_detected += int(df["size_value"].notna().sum())
+        self.pack_detected += int(df["pack_qty"].notna().sum())
+        if self.brands is not None:
+            self.brands.add_many(df["brand_clean"])
+        else:
+            self.brand_count = df["brand_clean"].nunique()
+
+    def rate(self, count):
+        return count / self.rows * 100 if self.rows else 0.0
+
+    def log_summary(self):
+        logger.info("📊 Cleaning Summary:")
+        logger.info(f"Rows cleaned: {self.rows:,}")
+        if self.brands is not None:
+            logger.info(f"Brands extracted: ~{self.brands.estimate()}")
+        else:
+            logger.info(f"Brands extracted: {self.brand_count}")
+        logger.info(f"Size detected in: {self.rate(self.size_detected):.1f}% rows")
+        logger.info(f"Pack detected in: {self.rate(self.pack_detected):.1f}% rows")
+
+
+def cleaned_output_paths(output_format=None):
+    """(timestamped archive path, master path) for a cleaning run's output."""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    
-    # Save timestamped archive copy
+    suffix = output_format or default_format()
     os.makedirs("data/processed/archive", exist_ok=True)
-    archive_path = f"data/processed/archive/cleaned_{timestamp}.csv"
-    df.to_csv(archive_path, index=False)
+    return f"data/processed/archive/cleaned_{timestamp}.{suffix}", f"data/processed/cleaned_data.{suffix}"
+
+
+def clean_raw_data(input_file, output_file="cleaned_products.csv", output_format=None, chunksize=None,
+                   price_history=None):
+    """Main cleaning pipeline (output_format: 'csv' or 'parquet', default PIPELINE_FORMAT).
+
+    With chunksize, the raw file is streamed in chunks of that many rows and each
+    cleaned chunk is appended to the output, so memory stays bounded; the
+    cleaned frame is then not returned (None). With a PriceHistory, changed
+    prices of the cleaned rows are recorded as snapshots.
+    """
+    logger.info(f"🔹 Cleaning file: {input_file}")
+    archive_path, master_path = cleaned_output_paths(output_format)
+    stats = CleaningStats(chunked=bool(chunksize))
+
+    if chunksize:
+        # --- Stream: clean each chunk and append it to the archive ---
+        df = None
+        writer = chunk_writer(archive_path, 'cleaned')
+        for chunk in iter_table(input_file, chunksize):
+            chunk = clean_products(chunk)
+            writer.write(chunk)
+            stats.add(chunk)
+            if price_history is not None:
+                price_history.record(chunk)
+            logger.info(f"  🔄 Cleaned {stats.rows:,} rows")
+        writer.close()
+    else:
+        df = read_table(input_file)
+        logger.info(f"Loaded {len(df)} rows")
+        df = clean_products(df)
+        write_table(df, archive_path, kind='cleaned')
+        stats.add(df)
+        if price_history is not None:
+            price_history.record(df)
+
+    # --- Export ---
     logger.info(f"📦 Archived to: {archive_path}")
     
-    # Save master file for matcher to use (NO timestamp)
-    os.makedirs("data/processed", exist_ok=True)
-    master_path = "data/processed/cleaned_data.csv"
-    df.to_csv(master_path, index=False)
+    # Master file for matcher to use (NO timestamp), linked from the archive
+    publish_file(archive_path, master_path)
     logger.info(f"✅ Cleaned data saved to: {master_path}")
-
-    # --- Summary stats ---
-    logger.info("📊 Cleaning Summary:")
-    logger.info(f"Brands extracted: {df['brand_clean'].nunique()}")
-    logger.info(f"Size detected in: {df['size_value'].notna().mean()*100:.1f}% rows")
-    logger.info(f"Pack detected in: {df['pack_qty'].notna().mean()*100:.1f}% rows")
+    stats.log_summary()
 
     return df
 
 
 # === EXECUTION ===
-if __name__ == "__main__":
-    import sys
+def main(argv=None):
+    """Command-line entry point (also called in-process by run_full_pipeline.py)."""
+    import argparse
     from pathlib import Path
     
-    if len(sys.argv) > 1:
+    parser = argparse.ArgumentParser(description='Clean & normalize raw product data')
+    parser.add_argument('input', nargs='?', default=None,
+                        help='Raw results file (default: latest data/raw/all_search_results_*)')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='Stream the input in chunks of this many rows (bounded memory)')
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help='Output format (default: PIPELINE_FORMAT or csv)')
+    parser.add_argument('--price-history', nargs='?', const=PRICE_HISTORY_DIR, default=None,
+                        metavar='DIR', help='Record changed prices as snapshots (needs pyarrow)')
+    args = parser.parse_args(argv)
+    
+    if args.input:
         # Use provided file
-        input_file = sys.argv[1]
+        input_file = args.input
     else:
         # Auto-find latest raw file
         raw_dir = Path("data/raw")
-        raw_files = list(raw_dir.glob("all_search_results_*.csv"))
+        raw_files = list(raw_dir.glob("all_search_results_*.csv")) + \
+            list(raw_dir.glob("all_search_results_*.parquet"))
         if not raw_files:
             logger.error("❌ No raw data files found in data/raw/")
             logger.info("💡 Run: python src/oxylabs_googleshopping_script.py first")
-            sys.exit(1)
+            return 1
         
         # Get the latest file
         input_file = str(max(raw_files, key=lambda p: p.stat().st_mtime))
         logger.info(f"📂 Auto-detected latest raw file: {input_file}")
     
-    clean_raw_data(input_file)
+    history = PriceHistory(args.price_history) if args.price_history else None
+    clean_raw_data(input_file, output_format=args.format, chunksize=args.chunksize, price_history=history)
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
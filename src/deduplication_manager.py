@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Deduplication Manager
+---------------------
+Persistent record of every URL, thumbnail and product ID the scraper has
+seen, in one SQLite database (WAL mode) instead of the flat seen_*.json
+lists in data/processed/ and data/logs/. Keys are 64-bit hashes of the
+normalized value, stored as the table's integer primary key, so membership
+checks are single index lookups and nothing has to be loaded into memory. Each key keeps its first-seen and
+last-seen timestamps and how many runs saw it.
+
+A Bloom filter over the same hashes sits in front of the database and is
+saved next to it (dedup.bloom.npz): keys the filter rejects are new without
+a query, and only probable duplicates are confirmed against SQLite.
+
+    python src/deduplication_manager.py --migrate   # one-time import of the seen_*.json lists
+    python src/deduplication_manager.py --stats
+"""
+
+import json
+import sqlite3
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from sketches import BloomFilter
+from url_canonical import amazon_host, canonicalize_url
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DB = 'data/processed/dedup.sqlite'
+KINDS = ('url', 'thumbnail', 'product_id')
+
+# Item field holding each kind of key in scraped results
+ITEM_FIELDS = {'url': 'url', 'thumbnail': 'thumbnail', 'product_id': 'product_id'}
+
+# Legacy JSON files (path, list key, kind)
+LEGACY_FILES = [
+    ('data/processed/seen_urls.json', 'seen_urls', 'url'),
+    ('data/processed/seen_thumbnails.json', 'seen_thumbnails', 'thumbnail'),
+    ('data/processed/seen_product_ids.json', 'seen_products', 'product_id'),
+    ('data/logs/seen_urls.json', 'seen_urls', 'url'),
+    ('data/logs/seen_thumbnails.json', 'seen_thumbnails', 'thumbnail'),
+    ('data/logs/seen_product_ids.json', 'seen_products', 'product_id'),
+]
+
+DEFAULT_BLOOM_CAPACITY = 1_000_000
+DEFAULT_BLOOM_FP_RATE = 0.01
+
+# SQLite's default limit on bound parameters per statement is 999
+_BATCH = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen_items (
+    key_hash   INTEGER PRIMARY KEY,
+    kind       TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen  TEXT NOT NULL,
+    seen_count INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS migrations (
+    source      TEXT PRIMARY KEY,
+    rows        INTEGER NOT NULL,
+    migrated_at TEXT NOT NULL
+);
+"""
+
+
+def normalize_value(kind, value):
+    """Canonical string form of a key, or None for missing values.
+
+    URLs are canonicalized (tracking parameters, www., retailer-specific
+    paths) so one listing reached through different links is one key.
+    """
+    if value is None or value == '':
+        return None
+    if kind == 'url':
+        return canonicalize_url(value) if isinstance(value, str) else None
+    if kind == 'product_id' and isinstance(value, str) and 'e+' in value:
+        try:
+            value = float(value)  # IDs the legacy lists stored in float notation
+        except ValueError:
+            pass
+    if isinstance(value, float):
+        if value != value:  # NaN
+            return None
+        if kind == 'product_id' and value.is_integer():
+            value = int(value)
+    return str(value).strip() or None
+
+
+def item_values(items, kind, field):
+    """One key field of each item; relative Amazon export URLs get their amazon_domain host."""
+    if kind != 'url':
+        return [item.get(field) for item in items]
+    return [canonicalize_url(item.get(field), amazon_host(item.get('amazon_domain')))
+            if isinstance(item.get(field), str) else None for item in items]
+
+
+def key_hash(kind, value):
+    """Signed 64-bit hash of (kind, normalized value) - fits SQLite's INTEGER."""
+    digest = hashlib.blake2b(f"{kind}\x00{value}".encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def _hashes(kind, values):
+    normalized = (normalize_value(kind, v) for v in values)
+    return [None if v is None else key_hash(kind, v) for v in normalized]
+
+
+class FilterStats:
+    """Counts of membership checks answered by the Bloom filter vs the database."""
+
+    def __init__(self):
+        self.checks = 0
+        self.rejected = 0          # filter said definitely new - no query
+        self.confirmed = 0         # filter said maybe, database said seen
+        self.false_positives = 0   # filter said maybe, database said new
+
+    @property
+    def observed_fp_rate(self):
+        negatives = self.rejected + self.false_positives
+        return self.false_positives / negatives if negatives else 0.0
+
+    def as_dict(self):
+        return {'checks': self.checks, 'rejected_by_filter': self.rejected,
+                'confirmed_duplicates': self.confirmed, 'false_positives': self.false_positives,
+                'observed_fp_rate': round(self.observed_fp_rate, 5)}
+
+
+class DeduplicationManager:
+    """SQLite-backed set of seen URLs, thumbnails and product IDs with timestamps."""
+
+    def __init__(self, db_path=DEFAULT_DB, bloom_capacity=DEFAULT_BLOOM_CAPACITY,
+                 bloom_fp_rate=DEFAULT_BLOOM_FP_RATE):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+        self.bloom_path = self.db_path.with_suffix('.bloom.npz')
+        self.bloom_fp_rate = bloom_fp_rate
+        self.stats = FilterStats()
+        self.rows = self.conn.execute("SELECT COUNT(*) FROM seen_items").fetchone()[0]
+        self.bloom = self._load_bloom(bloom_capacity)
+
+    def _load_bloom(self, capacity):
+        """Saved filter if it covers exactly the stored keys, otherwise rebuilt from the database."""
+        rows = self.rows
+        if self.bloom_path.exists():
+            try:
+                bloom, meta = BloomFilter.load(self.bloom_path)
+            except (OSError, ValueError, KeyError) as e:
+                log.warning(f"Ignoring unreadable Bloom filter {self.bloom_path}: {e}")
+            else:
+                if (meta.get('rows') == rows and bloom.fp_rate == self.bloom_fp_rate
+                        and rows <= bloom.capacity):
+                    return bloom
+        return self._rebuild_bloom(max(capacity, 2 * rows))
+
+    def _rebuild_bloom(self, capacity):
+        bloom = BloomFilter(capacity, self.bloom_fp_rate)
+        cursor = self.conn.execute("SELECT key_hash FROM seen_items")
+        while True:
+            rows = cursor.fetchmany(100_000)
+            if not rows:
+                break
+            bloom.add_many([h for (h,) in rows])
+        log.info(f"Built Bloom filter: {bloom.count:,} keys, capacity {capacity:,}, "
+                 f"{bloom.bits.nbytes / 1e6:.1f} MB")
+        return bloom
+
+    def save_bloom(self):
+        """Persist the filter together with the row count it covers."""
+        self.bloom.save(self.bloom_path, rows=self.rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.save_bloom()
+        self.conn.close()
+
+    def _existing(self, hashes):
+        """The subset of `hashes` already in the store."""
+        hashes = list({h for h in hashes if h is not None})
+        found = set()
+        for i in range(0, len(hashes), _BATCH):
+            batch = hashes[i:i + _BATCH]
+            rows = self.conn.execute(
+                f"SELECT key_hash FROM seen_items WHERE key_hash IN ({','.join('?' * len(batch))})",
+                batch)
+            found.update(h for (h,) in rows)
+        return found
+
+    def _candidates(self, hashes):
+        """Hashes the Bloom filter can't rule out."""
+        maybe = self.bloom.contains_many(hashes)
+        return {h for h, m in zip(hashes, maybe) if m}
+
+    def contains(self, kind, value):
+        return self.seen_many(kind, [value])[0]
+
+    def seen_many(self, kind, values):
+        """Membership of each value, in order (missing values count as unseen).
+
+        Only keys the Bloom filter can't rule out are looked up in the database.
+        """
+        hashes = _hashes(kind, values)
+        present = [h for h in hashes if h is not None]
+        candidates = self._candidates(present)
+        found = self._existing(candidates)
+
+        self.stats.checks += len(present)
+        self.stats.rejected += sum(h not in candidates for h in present)
+        self.stats.confirmed += sum(h in found for h in present)
+        self.stats.false_positives += sum(h in candidates and h not in found for h in present)
+        return [h in found for h in hashes]
+
+    def add_many(self, kind, values, seen_at=None):
+        """Record values as seen (one transaction); returns how many were new."""
+        seen_at = seen_at or datetime.now().isoformat(timespec='seconds')
+        hashes = list(dict.fromkeys(h for h in _hashes(kind, values) if h is not None))
+        existing = self._existing(self._candidates(hashes))
+        new_hashes = [h for h in hashes if h not in existing]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO seen_items (key_hash, kind, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key_hash) DO UPDATE SET first_seen = MIN(first_seen, excluded.first_seen), "
+                "last_seen = MAX(last_seen, excluded.last_seen), "
+                "seen_count = seen_count + 1",
+                [(h, kind, seen_at, seen_at) for h in hashes])
+        self.rows += len(new_hashes)
+        self.bloom.add_many(new_hashes)
+        if self.rows > self.bloom.capacity:
+            # Past capacity the false-positive rate climbs - resize
+            self.bloom = self._rebuild_bloom(2 * self.bloom.capacity)
+        return len(new_hashes)
+
+    def first_seen(self, kind, value):
+        """(first_seen, last_seen, seen_count) of a value, or None if never seen."""
+        value = normalize_value(kind, value)
+        if value is None:
+            return None
+        return self.conn.execute(
+            "SELECT first_seen, last_seen, seen_count FROM seen_items WHERE key_hash = ?",
+            (key_hash(kind, value),)).fetchone()
+
+    def is_duplicate(self, items):
+        """For each scraped item (dict), whether any of its URL/thumbnail/product ID was seen."""
+        duplicate = [False] * len(items)
+        for kind, field in ITEM_FIELDS.items():
+            seen = self.seen_many(kind, item_values(items, kind, field))
+            duplicate = [d or s for d, s in zip(duplicate, seen)]
+        return duplicate
+
+    def mark_items(self, items, seen_at=None):
+        """Record the URL, thumbnail and product ID of each scraped item."""
+        for kind, field in ITEM_FIELDS.items():
+            self.add_many(kind, item_values(items, kind, field), seen_at)
+
+    def filter_info(self):
+        """Configured vs expected vs observed false-positive rates, plus hit counts."""
+        return {'capacity': self.bloom.capacity, 'configured_fp_rate': self.bloom_fp_rate,
+                'expected_fp_rate': round(self.bloom.expected_fp_rate, 6),
+                'size_mb': round(self.bloom.bits.nbytes / 1e6, 2), **self.stats.as_dict()}
+
+    def counts(self):
+        return dict(self.conn.execute("SELECT kind, COUNT(*) FROM seen_items GROUP BY kind"))
+
+    def migrate_json(self, legacy_files=LEGACY_FILES):
+        """One-time import of the old seen_*.json lists (files already imported are skipped)."""
+        done = {source for (source,) in self.conn.execute("SELECT source FROM migrations")}
+        for path, list_key, kind in legacy_files:
+            path = Path(path)
+            if str(path) in done or not path.exists():
+                continue
+            with open(path) as f:
+                data = json.load(f)
+            values = data.get(list_key, [])
+            seen_at = data.get('last_updated') or datetime.now().isoformat(timespec='seconds')
+            new = self.add_many(kind, values, seen_at=seen_at[:19])
+            with self.conn:
+                self.conn.execute("INSERT INTO migrations VALUES (?, ?, ?)",
+                                  (str(path), len(values), datetime.now().isoformat(timespec='seconds')))
+            log.info(f"Migrated {path}: {len(values):,} {kind} keys ({new:,} new)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seen-item store for scraper deduplication')
+    parser.add_argument('--db', default=DEFAULT_DB, help='SQLite database path')
+    parser.add_argument('--migrate', action='store_true', help='Import the legacy seen_*.json files')
+    parser.add_argument('--stats', action='store_true', help='Show stored key counts')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    with DeduplicationManager(args.db) as dedup:
+        if args.migrate:
+            dedup.migrate_json()
+        if args.stats or not args.migrate:
+            print(f"📦 {dedup.db_path}")
+            for kind in KINDS:
+                print(f"  {kind}: {dedup.counts().get(kind, 0):,} seen")
+            info = dedup.filter_info()
+            print(f"  Bloom filter: {info['size_mb']} MB for {info['capacity']:,} keys, "
+                  f"FP rate {info['configured_fp_rate']:.2%} configured, "
+                  f"{info['expected_fp_rate']:.4%} at current fill")
+
+
+if __name__ == "__main__":
+    main()
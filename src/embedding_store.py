@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Persistent Embedding Store
+--------------------------
+Content-addressed on-disk cache for Sentence-BERT embeddings. Vectors are
+appended to a raw float32 file that is read back through a memory map, and
+an index file maps each key (model name, model revision, normalized text
+hash) to its row. The index is bounded by an LRU policy; rows freed by
+eviction are reclaimed by compaction once they outnumber the live rows.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+from pathlib import Path
+
+import numpy as np
+
+log = logging.getLogger("file_based_matcher")
+
+INDEX_FORMAT_VERSION = 1
+
+
+def _slug(value):
+    return re.sub(r'[^A-Za-z0-9]+', '_', str(value)).strip('_') or 'model'
+
+
+class EmbeddingStore:
+    """Append-only float32 vector file plus a JSON index with LRU eviction."""
+
+    def __init__(self, directory, model_name, model_revision=None, max_entries=200_000):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.model_revision = model_revision or "default"
+        self.max_entries = max_entries
+
+        slug = _slug(model_name)
+        self.data_path = self.directory / f"embeddings_{slug}.f32"
+        self.index_path = self.directory / f"embeddings_{slug}.index.json"
+
+        self.dim = None
+        self.rows = 0            # rows physically present in the data file
+        self.tick = 0            # logical clock for LRU ordering
+        self.entries = {}        # key -> [row, last_used]
+        self.pending = {}        # key -> vector not yet appended to disk
+        self._mmap = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+        self._load_index()
+
+    # --- keys -------------------------------------------------------------
+
+    def key_for(self, text):
+        """Content-addressed key for a text under this model and revision."""
+        normalized = " ".join(str(text).split())
+        payload = f"{self.model_name}\x00{self.model_revision}\x00{normalized}"
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+    # --- persistence ------------------------------------------------------
+
+    def _load_index(self):
+        if not self.index_path.exists():
+            self._truncate_data(0)
+            return
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            log.warning(f"Ignoring unreadable embedding index {self.index_path}: {e}")
+            self._truncate_data(0)
+            return
+
+        if index.get('format_version') != INDEX_FORMAT_VERSION:
+            log.warning(f"Embedding index {self.index_path} has an unknown format - starting fresh")
+            self._truncate_data(0)
+            return
+
+        self.dim = index.get('dim')
+        self.rows = index.get('rows', 0)
+        self.tick = index.get('tick', 0)
+        self.entries = {k: list(v) for k, v in index.get('entries', {}).items()}
+
+        if self.dim and self.data_path.exists():
+            on_disk = self.data_path.stat().st_size // (4 * self.dim)
+            if on_disk < self.rows:
+                log.warning("Embedding data file is shorter than its index - dropping missing rows")
+                self.rows = on_disk
+                self.entries = {k: v for k, v in self.entries.items() if v[0] < on_disk}
+        # A run that died after appending leaves rows the index does not know about;
+        # cut them off so the next flush appends at the row numbers it records
+        self._truncate_data(self.rows * (self.dim or 0) * 4)
+        log.info(f"Loaded embedding store: {len(self.entries):,} entries ({self.data_path})")
+
+    def _truncate_data(self, size):
+        """Cut the data file down to `size` bytes (rows not covered by the index)."""
+        if self.data_path.exists() and self.data_path.stat().st_size > size:
+            log.warning(f"Truncating {self.data_path} to the {size:,} bytes its index covers")
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(size)
+
+    def _matrix(self):
+        if self._mmap is None and self.rows and self.dim:
+            self._mmap = np.memmap(self.data_path, dtype=np.float32, mode='r',
+                                   shape=(self.rows, self.dim))
+        return self._mmap
+
+    def _write_index(self):
+        index = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'model_name': self.model_name,
+            'dim': self.dim,
+            'rows': self.rows,
+            'tick': self.tick,
+            'entries': self.entries,
+        }
+        tmp_path = self.index_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.index_path)
+
+    # --- lookups ----------------------------------------------------------
+
+    def get(self, text):
+        """Return the cached vector for text, or None on a miss."""
+        key = self.key_for(text)
+        self.tick += 1
+
+        if key in self.pending:
+            self.hits += 1
+            self.entries[key][1] = self.tick
+            return self.pending[key]
+
+        entry = self.entries.get(key)
+        matrix = self._matrix()
+        if entry is None or matrix is None or entry[0] >= self.rows:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry[1] = self.tick
+        return np.array(matrix[entry[0]])
+
+    def get_many(self, texts):
+        """Return {text: vector} for every text found in the store."""
+        found = {}
+        for text in texts:
+            vector = self.get(text)
+            if vector is not None:
+                found[text] = vector
+        return found
+
+    def put(self, text, vector):
+        """Queue a vector for appending on the next flush."""
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if self.dim is None:
+            self.dim = vector.shape[0]
+        elif vector.shape[0] != self.dim:
+            raise ValueError(f"Embedding dimension {vector.shape[0]} != store dimension {self.dim}")
+
+        key = self.key_for(text)
+        if key in self.entries:
+            return
+        self.tick += 1
+        self.pending[key] = vector
+        self.entries[key] = [-1, self.tick]
+
+    # --- writes -----------------------------------------------------------
+
+    def flush(self):
+        """Append pending vectors, apply LRU eviction and persist the index."""
+        if self.pending:
+            self._mmap = None
+            with open(self.data_path, 'ab') as f:
+                for key, vector in self.pending.items():
+                    f.write(vector.tobytes())
+                    self.entries[key][0] = self.rows
+                    self.rows += 1
+            self.pending = {}
+
+        if len(self.entries) > self.max_entries:
+            by_age = sorted(self.entries.items(), key=lambda kv: kv[1][1])
+            excess = len(self.entries) - self.max_entries
+            for key, _ in by_age[:excess]:
+                del self.entries[key]
+            self.evicted += excess
+
+        if self.rows > 2 * len(self.entries) and self.rows > 1000:
+            self._compact()
+
+        if self.dim is not None:
+            self._write_index()
+
+    def _compact(self):
+        """Rewrite the data file with live rows only."""
+        matrix = self._matrix()
+        live = sorted(self.entries.items(), key=lambda kv: kv[1][0])
+        tmp_path = self.data_path.with_suffix('.f32.tmp')
+        with open(tmp_path, 'wb') as f:
+            for new_row, (key, entry) in enumerate(live):
+                f.write(np.asarray(matrix[entry[0]], dtype=np.float32).tobytes())
+                entry[0] = new_row
+        self._mmap = None
+        os.replace(tmp_path, self.data_path)
+        log.info(f"Compacted embedding store: {self.rows:,} -> {len(live):,} rows")
+        self.rows = len(live)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'entries': len(self.entries),
+            'evicted': self.evicted,
+            'store_path': str(self.data_path),
+        }
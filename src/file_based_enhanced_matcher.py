@@ -16,6 +16,9 @@ import json
 import argparse
 import re
 from pathlib import Path
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
 
 # Import the matching functions (we'll create a simplified version)
 from rapidfuzz import fuzz
@@ -23,12 +26,26 @@ from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 import pickle
 
+from ann_index import normalize_rows
+from blocking import BlockingStats, build_blockers, generate_candidate_pairs, pairs_in_rows
+from embedding_store import EmbeddingStore
+from vectorized_scorer import VectorizedScorer
+from product_index import ProductIndex, assign_product_keys
+from result_sink import MatchSink, UnmatchedSink, publish_file
+from table_io import default_format, latest_existing, read_table, with_format
+
 # Setup logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 log = logging.getLogger("file_based_matcher")
 
+# Loaded Sentence-BERT models by (name, revision)
+_MODELS = {}
+
 class FileBasedMatcher:
-    def __init__(self, output_dir="data/processed"):
+    def __init__(self, output_dir="data/processed", blockers=None, evaluate_blocking=False,
+                 ann_top_k=20, embed_batch_size=64, embedding_store_dir=None,
+                 embedding_store_max_entries=200_000, scoring_engine='pairwise',
+                 workers=1, tile_rows=256, output_format=None, csv_export=False):
         self.output_dir = Path(output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
         self.timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -39,27 +56,116 @@ class FileBasedMatcher:
         self.SEMANTIC_WEIGHT = 0.4
         
         # Initialize sentence transformer
+        self.MODEL_NAME = 'all-MiniLM-L6-v2'
+        self.MODEL_REVISION = None  # pin a Hugging Face revision to version the cache
         self.model = None
         self.embeddings_cache = {}
+        self.embed_batch_size = embed_batch_size
+        
+        # Persistent on-disk embedding cache (in-memory dict sits in front of it)
+        self.embedding_store = None
+        if embedding_store_dir:
+            self.embedding_store = EmbeddingStore(
+                embedding_store_dir, self.MODEL_NAME, self.MODEL_REVISION,
+                max_entries=embedding_store_max_entries
+            )
+        
+        # Scoring engine: 'pairwise' (per-pair Python loop) or 'vectorized' (matrix block)
+        if scoring_engine not in ('pairwise', 'vectorized'):
+            raise ValueError(f"Unknown scoring engine: {scoring_engine}")
+        self.scoring_engine = scoring_engine
+        self.vectorized_scorer = VectorizedScorer(self)
+        
+        # Candidate blocking (None/empty = exhaustive all-pairs comparison)
+        self.blockers = build_blockers(blockers, embed_fn=self.embed_texts, ann_top_k=ann_top_k)
+        self.evaluate_blocking = evaluate_blocking
+        self.blocking_stats = BlockingStats()
+        
+        # Incremental mode bookkeeping (set by process_incremental)
+        self.incremental_stats = None
+        self.product_index = None
+        
+        # Category-parallel matching (workers > 1 uses a process pool)
+        self.workers = max(1, workers)
+        self.tile_rows = tile_rows
+        self.worker_config = {
+            'blockers': blockers,
+            'evaluate_blocking': evaluate_blocking,
+            'ann_top_k': ann_top_k,
+            'scoring_engine': scoring_engine,
+        }
+        
+        # Result file format ('csv' or 'parquet'); csv_export adds CSV copies of Parquet masters
+        self.output_format = output_format or default_format()
+        self.csv_export = csv_export
         
     def load_sentence_transformer(self):
         """Load the sentence transformer model."""
         if self.model is None:
-            log.info("Loading Sentence-BERT model...")
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+            # One model per process: in-process pipeline runs reuse it across stages/runs
+            key = (self.MODEL_NAME, self.MODEL_REVISION)
+            if key not in _MODELS:
+                log.info("Loading Sentence-BERT model...")
+                if self.MODEL_REVISION:
+                    _MODELS[key] = SentenceTransformer(self.MODEL_NAME, revision=self.MODEL_REVISION)
+                else:
+                    _MODELS[key] = SentenceTransformer(self.MODEL_NAME)
+            self.model = _MODELS[key]
             
     def get_embedding(self, text):
         """Get embedding for text with caching."""
         if text in self.embeddings_cache:
             return self.embeddings_cache[text]
             
+        if self.embedding_store is not None:
+            embedding = self.embedding_store.get(text)
+            if embedding is not None:
+                self.embeddings_cache[text] = embedding
+                return embedding
+            
         if self.model is None:
             self.load_sentence_transformer()
             
         embedding = self.model.encode([text])[0]
         self.embeddings_cache[text] = embedding
+        if self.embedding_store is not None:
+            self.embedding_store.put(text, embedding)
         return embedding
         
+    def precompute_embeddings(self, texts):
+        """Encode all uncached texts in length-sorted batches and fill the cache."""
+        pending = {t for t in texts if isinstance(t, str) and t not in self.embeddings_cache}
+        
+        if pending and self.embedding_store is not None:
+            stored = self.embedding_store.get_many(sorted(pending))
+            self.embeddings_cache.update(stored)
+            pending -= stored.keys()
+            log.info(f"Embedding store: {len(stored)} cached, {len(pending)} to encode")
+            
+        if not pending:
+            return 0
+            
+        if self.model is None:
+            self.load_sentence_transformer()
+            
+        # Sorting by length keeps similar-length titles together to minimise padding
+        pending = sorted(pending, key=lambda t: (len(t), t))
+        log.info(f"Pre-computing {len(pending)} embeddings (batch size {self.embed_batch_size})...")
+        
+        for start in range(0, len(pending), self.embed_batch_size):
+            batch = pending[start:start + self.embed_batch_size]
+            embeddings = self.model.encode(batch, batch_size=len(batch), show_progress_bar=False)
+            for text, embedding in zip(batch, embeddings):
+                self.embeddings_cache[text] = embedding
+                if self.embedding_store is not None:
+                    self.embedding_store.put(text, embedding)
+                
+        return len(pending)
+        
+    def embed_texts(self, texts):
+        """Embed a list of texts into one L2-normalized float32 matrix."""
+        return normalize_rows(np.vstack([self.get_embedding(t) for t in texts]))
+        
     def normalize_text(self, text):
         """Basic text normalization."""
         if pd.isna(text):
@@ -142,12 +248,24 @@ class FileBasedMatcher:
         
     def process_input_file(self, input_file):
         """Process the input CSV file and generate matches."""
+        df = self.load_products(input_file)
+        matches, unmatched_products = self.match_products(df)
+        return matches, unmatched_products, df
+        
+    def load_products(self, input_file, with_keys=False):
+        """Load the input table (CSV or Parquet) and add the normalized columns used for matching.
+        
+        with_keys adds a stable product_key column (used by incremental mode).
+        """
         log.info(f"Processing input file: {input_file}")
         
         # Load the data
-        df = pd.read_csv(input_file)
+        df = read_table(input_file)
         log.info(f"Loaded {len(df)} products")
+        return self.prepare_products(df, with_keys)
         
+    def prepare_products(self, df, with_keys=False):
+        """Add the normalized matching columns to a cleaned products frame (see load_products)."""
         # Handle different column name conventions
         product_col = 'product_name' if 'product_name' in df.columns else 'title'
         brand_col = 'brand_name' if 'brand_name' in df.columns else None
@@ -170,6 +288,9 @@ class FileBasedMatcher:
             
         df['category_clean'] = df['category_name'].apply(self.normalize_text)
         
+        # Encode every title up front in batches instead of one model call per cache miss
+        self.precompute_embeddings(df['product_clean'].tolist())
+        
         # Handle merchant column (which might be JSON)
         if retailer_col in df.columns:
             if df[retailer_col].dtype == 'object':
@@ -180,96 +301,352 @@ class FileBasedMatcher:
         else:
             df['retailer_clean'] = 'Unknown'
         
+        if with_keys:
+            df = assign_product_keys(df)
+            
         # Generate unique product IDs if not present
         if 'product_id' not in df.columns:
-            df['product_id'] = 'PRD' + df.index.astype(str).str.zfill(8)
-            
+            if with_keys:
+                # Positional IDs would shift between runs; derive them from the key instead
+                df['product_id'] = 'PRD' + df['product_key'].str.upper()
+            else:
+                df['product_id'] = 'PRD' + df.index.astype(str).str.zfill(8)
+                
+        return df
+        
+    def match_products(self, df, dirty_keys=None, sinks=None):
+        """Match products within each category.
+        
+        With dirty_keys, only pairs involving at least one of those product
+        keys are scored. Returns the match records and an unmatched products
+        DataFrame; with sinks, results are streamed to them per category and
+        nothing is accumulated in memory.
+        """
         matches = []
-        unmatched_products = []
+        unmatched_frames = []
+        n_matches = n_unmatched = 0
         
         # Group by category for efficiency
-        for category, group in df.groupby('category_clean'):
-            group = group.reset_index(drop=True)
-            log.info(f"Processing category '{category}': {len(group)} products")
-            
-            category_matches = []
-            matched_in_category = set()
+        groups = [(category, group.reset_index(drop=True))
+                  for category, group in df.groupby('category_clean')]
+        
+        dirty = None
+        if dirty_keys is not None:
+            dirty = [set(np.flatnonzero(group['product_key'].isin(dirty_keys).to_numpy()).tolist())
+                     for _, group in groups]
+        
+        parallel_results = None
+        if self.workers > 1:
+            parallel_results = self.match_categories_parallel(groups, dirty)
+        
+        for idx, (category, group) in enumerate(groups):
+            if parallel_results is None:
+                log.info(f"Processing category '{category}': {len(group)} products")
+                category_matches, matched_in_category = self.match_category(
+                    category, group, dirty_rows=dirty[idx] if dirty is not None else None
+                )
+            else:
+                category_matches, matched_in_category = parallel_results[idx]
+                
+            # Unmatched products from this category
+            unmatched = group[~group.index.isin(matched_in_category)].assign(
+                reason_unmatched=f"No match >= {self.MIN_SIMILARITY} (enhanced)"
+            )
+            n_matches += len(category_matches)
+            n_unmatched += len(unmatched)
             
-            # Compare all pairs within category
-            for i in range(len(group)):
-                for j in range(i + 1, len(group)):
-                    prod1 = group.iloc[i]
-                    prod2 = group.iloc[j]
-                    
-                    # Skip if same retailer (likely same product)
-                    if prod1['retailer_clean'] == prod2['retailer_clean']:
-                        continue
-                        
-                    # Calculate similarity
-                    sim_scores = self.calculate_hybrid_similarity(
-                        prod1['product_clean'], 
-                        prod2['product_clean']
-                    )
+            if sinks is not None:
+                sinks['matches'].add(category_matches)
+                sinks['matches'].flush()
+                sinks['unmatched'].add(unmatched)
+            else:
+                matches.extend(category_matches)
+                unmatched_frames.append(unmatched)
                     
-                    # Brand matching bonus/penalty
-                    brand_bonus = 0
-                    if prod1['brand_clean'] == prod2['brand_clean'] and prod1['brand_clean']:
-                        brand_bonus = 15  # Brand match bonus
-                    elif prod1['brand_clean'] != prod2['brand_clean'] and prod1['brand_clean'] and prod2['brand_clean']:
-                        brand_bonus = -10  # Brand mismatch penalty
-                        
-                    final_similarity = sim_scores['hybrid_similarity'] + brand_bonus
-                    final_similarity = max(0, min(100, final_similarity))  # Clamp to 0-100
+        if self.blockers:
+            stats = self.blocking_stats.to_dict()
+            log.info(f"Blocking: {stats['candidate_pairs']:,} of {stats['total_pairs']:,} pairs scored "
+                     f"(reduction ratio {stats['reduction_ratio']:.1%})")
+            if stats['pair_completeness'] is not None:
+                log.info(f"Blocking pair completeness: {stats['pair_completeness']:.1%} "
+                         f"({stats['candidate_matches']}/{stats['exhaustive_matches']} exhaustive matches kept)")
                     
-                    if final_similarity >= self.MIN_SIMILARITY:
-                        match = {
-                            'product_1_id': prod1['product_id'],
-                            'product_2_id': prod2['product_id'],
-                            'product_1_name': prod1['product_name'],
-                            'product_2_name': prod2['product_name'],
-                            'brand_1': prod1.get('brand_name', ''),
-                            'brand_2': prod2.get('brand_name', ''),
-                            'category': category,
-                            'size_value_1': prod1.get('size_value', ''),
-                            'size_unit_1': prod1.get('size_unit', ''),
-                            'size_value_2': prod2.get('size_value', ''),
-                            'size_unit_2': prod2.get('size_unit', ''),
-                            'price_1': prod1.get('price', ''),
-                            'price_2': prod2.get('price', ''),
-                            'currency_1': prod1.get('currency', 'GBP'),
-                            'currency_2': prod2.get('currency', 'GBP'),
-                            'retailer_1': prod1['retailer_clean'],
-                            'retailer_2': prod2['retailer_clean'],
-                            'similarity': final_similarity,
-                            'hybrid_name_similarity': sim_scores['hybrid_similarity'],
-                            'lexical_similarity': sim_scores['lexical_similarity'],
-                            'semantic_similarity': sim_scores['semantic_similarity'],
-                            'brand_similarity': brand_bonus,
-                            'size_similarity': 50.0,  # Default
-                            'match_source': 'main_engine',
-                            'processing_date': datetime.now().strftime('%Y-%m-%d'),
-                            'engine_version': 'enhanced_with_embeddings_v1',
-                            'confidence_tier': self._get_confidence_tier(final_similarity),
-                            'match_rank': 1  # Will be updated later
-                        }
-                        
-                        category_matches.append(match)
-                        matched_in_category.add(i)
-                        matched_in_category.add(j)
-                        
-            matches.extend(category_matches)
+        log.info(f"Found {n_matches} matches and {n_unmatched} unmatched products")
+        
+        unmatched_products = pd.concat(unmatched_frames) if unmatched_frames else pd.DataFrame()
+        return matches, unmatched_products
+        
+    def process_incremental(self, input_file):
+        """Match only new/changed products against the current catalog.
+        
+        Matches from the master file whose two products are unchanged since the
+        previous run are kept; matches touching a changed or removed product are
+        retired. Falls back to a full match when there is no usable index.
+        """
+        df = self.load_products(input_file, with_keys=True)
+        index = ProductIndex(self.output_dir / "product_index.csv")
+        new, changed, unchanged, removed = index.classify(df)
+        
+        kept_matches = []
+        retired = 0
+        master_file = latest_existing(self.output_dir / "processed_matches.csv")
+        has_previous = bool(index.previous) and master_file is not None
+        if has_previous:
+            previous = read_table(master_file)
+            if {'product_1_key', 'product_2_key'} <= set(previous.columns):
+                keep = previous['product_1_key'].isin(unchanged) & previous['product_2_key'].isin(unchanged)
+                kept_matches = previous[keep].to_dict('records')
+                retired = int((~keep).sum())
+            else:
+                log.warning("Master matches file has no product keys - running a full match")
+                has_previous = False
+                
+        if not has_previous:
+            new, changed, unchanged = set(df['product_key']), set(), set()
             
-            # Add unmatched products from this category
-            for i, prod in group.iterrows():
-                if i not in matched_in_category:
-                    unmatched = prod.to_dict()
-                    unmatched['reason_unmatched'] = f"No match >= {self.MIN_SIMILARITY} (enhanced)"
-                    unmatched_products.append(unmatched)
-                    
-        log.info(f"Found {len(matches)} matches and {len(unmatched_products)} unmatched products")
+        dirty_keys = new | changed
+        log.info(f"Incremental: {len(new)} new, {len(changed)} changed, {len(unchanged)} unchanged, "
+                 f"{len(removed)} removed products; keeping {len(kept_matches)} matches, retiring {retired}")
+        
+        new_matches, _ = self.match_products(df, dirty_keys=dirty_keys)
+        
+        # Keep category order stable: kept matches first, then new ones, per category
+        matches = sorted(kept_matches + new_matches, key=lambda m: str(m['category']))
+        
+        matched_keys = {m['product_1_key'] for m in matches} | {m['product_2_key'] for m in matches}
+        unmatched_products = df[~df['product_key'].isin(matched_keys)].assign(
+            reason_unmatched=f"No match >= {self.MIN_SIMILARITY} (enhanced)"
+        )
+            
+        log.info(f"Merged: {len(matches)} matches ({len(new_matches)} new) and "
+                 f"{len(unmatched_products)} unmatched products")
+        self.incremental_stats = {
+            "new_products": len(new),
+            "changed_products": len(changed),
+            "unchanged_products": len(unchanged),
+            "removed_products": len(removed),
+            "kept_matches": len(kept_matches),
+            "retired_matches": retired,
+            "new_matches": len(new_matches),
+        }
+        self.product_index = (index, df)
         
         return matches, unmatched_products, df
         
+    def match_categories_parallel(self, groups, dirty=None):
+        """Match category groups on a process pool.
+        
+        Large categories are split into row tiles and tiles are dispatched
+        largest-first. The embedding matrix is placed in shared memory once
+        instead of being pickled to each worker. Results are merged in
+        category/tile order, so output is identical to the sequential run.
+        """
+        tasks = []
+        for idx, (category, group) in enumerate(groups):
+            n = len(group)
+            for start in range(0, max(n, 1), self.tile_rows):
+                tasks.append((idx, start, min(start + self.tile_rows, n)))
+        tasks.sort(key=lambda t: (-pairs_in_rows(len(groups[t[0]][1]), t[1], t[2]), t[0], t[1]))
+        
+        # Blocking runs once per category here; each tile gets the pairs of its rows
+        candidates = {}
+        if self.blockers:
+            for idx, (category, group) in enumerate(groups):
+                pairs = generate_candidate_pairs(group, self.blockers)
+                firsts = [i for i, _ in pairs]
+                for start in range(0, max(len(group), 1), self.tile_rows):
+                    stop = start + self.tile_rows
+                    candidates[(idx, start)] = pairs[bisect_left(firsts, start):bisect_left(firsts, stop)]
+        log.info(f"Matching {len(groups)} categories as {len(tasks)} tiles on {self.workers} workers")
+        
+        texts = sorted(self.embeddings_cache)
+        matrix = np.vstack([self.embeddings_cache[t] for t in texts]).astype(np.float32) if texts \
+            else np.zeros((0, 1), dtype=np.float32)
+        text_index = {t: row for row, t in enumerate(texts)}
+        shm = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            np.ndarray(matrix.shape, dtype=np.float32, buffer=shm.buf)[:] = matrix
+            del matrix
+            
+            tile_results = {}
+            initargs = (str(self.output_dir), self.worker_config, shm.name,
+                        (len(texts), self._embedding_dim(texts)), text_index)
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                     initargs=initargs) as pool:
+                futures = {
+                    pool.submit(_match_tile, groups[idx][0], groups[idx][1], start, stop,
+                                dirty[idx] if dirty is not None else None,
+                                candidates.get((idx, start))): (idx, start)
+                    for idx, start, stop in tasks
+                }
+                for future in as_completed(futures):
+                    tile_results[futures[future]] = future.result()
+        finally:
+            shm.close()
+            shm.unlink()
+            
+        results = []
+        for idx, (category, group) in enumerate(groups):
+            log.info(f"Processed category '{category}': {len(group)} products")
+            category_matches, matched_in_category = [], set()
+            for key in sorted(k for k in tile_results if k[0] == idx):
+                tile_matches, tile_matched, tile_stats = tile_results[key]
+                category_matches.extend(tile_matches)
+                matched_in_category |= tile_matched
+                self.blocking_stats.merge(tile_stats)
+            results.append((category_matches, matched_in_category))
+        return results
+        
+    def _embedding_dim(self, texts):
+        return int(np.asarray(self.embeddings_cache[texts[0]]).shape[-1]) if texts else 1
+        
+    def match_category(self, category, group, row_start=0, row_stop=None, dirty_rows=None, candidates=None):
+        """Score the candidate pairs of one category group.
+        
+        Only pairs (i, j) with row_start <= i < row_stop are scored, so a large
+        category can be split into row tiles; with dirty_rows, only pairs that
+        include one of those rows. `candidates` are blocking pairs already
+        generated for the category (or the tile), so tiles don't re-run the
+        blockers. Returns the list of match records and the set of matched
+        row positions.
+        """
+        n = len(group)
+        row_stop = n if row_stop is None else min(row_stop, n)
+        rows = {}
+        
+        def row(k):
+            if k not in rows:
+                rows[k] = group.iloc[k]
+            return rows[k]
+        
+        def wanted(i, j):
+            return row_start <= i < row_stop and (dirty_rows is None or i in dirty_rows or j in dirty_rows)
+        
+        def all_pairs():
+            if dirty_rows is None:
+                return ((i, j) for i in range(row_start, row_stop) for j in range(i + 1, n))
+            dirty_sorted = sorted(dirty_rows)
+            return ((i, j) for i in range(row_start, row_stop)
+                    for j in (range(i + 1, n) if i in dirty_rows else [d for d in dirty_sorted if d > i]))
+        
+        if self.blockers:
+            if candidates is None:
+                candidates = generate_candidate_pairs(group, self.blockers)
+            candidates = [(i, j) for i, j in candidates if wanted(i, j)]
+            n_candidates = len(candidates)
+        elif dirty_rows is not None:
+            candidates = None
+            n_candidates = sum(1 for _ in all_pairs())
+        else:
+            candidates = None
+            n_candidates = pairs_in_rows(n, row_start, row_stop)
+        self.blocking_stats.add_rows(n, row_start, row_stop, n_candidates)
+        
+        # When evaluating blocking, score every pair but only keep candidate matches
+        if self.blockers and self.evaluate_blocking:
+            candidate_set = set(candidates)
+            pairs = all_pairs()
+        else:
+            candidate_set = None
+            pairs = candidates if candidates is not None else all_pairs()
+            
+        # The vectorized engine scores the whole block as matrices and only hands
+        # cells near/above the threshold to score_pair for the exact record
+        if self.scoring_engine == 'vectorized':
+            passing = self.vectorized_scorer.passing_pairs(group, row_start, row_stop)
+            if dirty_rows is not None:
+                passing = [p for p in passing if wanted(*p)]
+            if self.blockers and candidate_set is None:
+                allowed = set(candidates)
+                passing = [p for p in passing if p in allowed]
+            pairs = passing
+        
+        category_matches = []
+        matched_in_category = set()
+        exhaustive_matches = 0
+        
+        for i, j in pairs:
+            match = self.score_pair(row(i), row(j), category)
+            if match is None:
+                continue
+            
+            if candidate_set is not None:
+                exhaustive_matches += 1
+                if (i, j) not in candidate_set:
+                    continue
+            
+            category_matches.append(match)
+            matched_in_category.add(i)
+            matched_in_category.add(j)
+            
+        if candidate_set is not None:
+            self.blocking_stats.add_evaluation(exhaustive_matches, len(category_matches))
+            
+        return category_matches, matched_in_category
+        
+    def score_pair(self, prod1, prod2, category):
+        """Score one product pair; returns a match record or None below threshold."""
+        # Skip if same retailer (likely same product)
+        if prod1['retailer_clean'] == prod2['retailer_clean']:
+            return None
+            
+        # Calculate similarity
+        sim_scores = self.calculate_hybrid_similarity(
+            prod1['product_clean'], 
+            prod2['product_clean']
+        )
+        
+        # Brand matching bonus/penalty
+        brand_bonus = 0
+        if prod1['brand_clean'] == prod2['brand_clean'] and prod1['brand_clean']:
+            brand_bonus = 15  # Brand match bonus
+        elif prod1['brand_clean'] != prod2['brand_clean'] and prod1['brand_clean'] and prod2['brand_clean']:
+            brand_bonus = -10  # Brand mismatch penalty
+            
+        final_similarity = sim_scores['hybrid_similarity'] + brand_bonus
+        final_similarity = max(0, min(100, final_similarity))  # Clamp to 0-100
+        
+        if final_similarity < self.MIN_SIMILARITY:
+            return None
+            
+        match = {
+            'product_1_id': prod1['product_id'],
+            'product_2_id': prod2['product_id'],
+            'product_1_name': prod1['product_name'],
+            'product_2_name': prod2['product_name'],
+            'brand_1': prod1.get('brand_name', ''),
+            'brand_2': prod2.get('brand_name', ''),
+            'category': category,
+            'size_value_1': prod1.get('size_value', ''),
+            'size_unit_1': prod1.get('size_unit', ''),
+            'size_value_2': prod2.get('size_value', ''),
+            'size_unit_2': prod2.get('size_unit', ''),
+            'price_1': prod1.get('price', ''),
+            'price_2': prod2.get('price', ''),
+            'currency_1': prod1.get('currency', 'GBP'),
+            'currency_2': prod2.get('currency', 'GBP'),
+            'retailer_1': prod1['retailer_clean'],
+            'retailer_2': prod2['retailer_clean'],
+            'similarity': final_similarity,
+            'hybrid_name_similarity': sim_scores['hybrid_similarity'],
+            'lexical_similarity': sim_scores['lexical_similarity'],
+            'semantic_similarity': sim_scores['semantic_similarity'],
+            'brand_similarity': brand_bonus,
+            'size_similarity': 50.0,  # Default
+            'match_source': 'main_engine',
+            'processing_date': datetime.now().strftime('%Y-%m-%d'),
+            'engine_version': 'enhanced_with_embeddings_v1',
+            'confidence_tier': self._get_confidence_tier(final_similarity),
+            'match_rank': 1  # Will be updated later
+        }
+        
+        # Stable product keys (incremental mode) let the next run retire stale pairs
+        if 'product_key' in prod1:
+            match['product_1_key'] = prod1['product_key']
+            match['product_2_key'] = prod2['product_key']
+            
+        return match
+        
     def _get_confidence_tier(self, similarity):
         """Determine confidence tier based on similarity."""
         if similarity >= 90:
@@ -281,39 +658,60 @@ class FileBasedMatcher:
         else:
             return "VERY_LOW"
             
-    def save_results(self, matches, unmatched_products, original_df, input_file=None):
-        """Save the matching results to CSV files."""
+    def open_result_sinks(self):
+        """Open the timestamped archive files that results are streamed into."""
+        suffix = 'parquet' if self.output_format == 'parquet' else 'csv'
+        return {
+            'matches': MatchSink(self.output_dir / f"processed_matches_{self.timestamp}.{suffix}"),
+            'unmatched': UnmatchedSink(self.output_dir / f"unmatched_products_{self.timestamp}.{suffix}"),
+        }
         
-        # Save matches (both timestamped archive and master file)
-        matches_df = pd.DataFrame(matches)
+    def save_results(self, matches, unmatched_products, original_df, input_file=None):
+        """Save in-memory matching results to the archive and master files."""
+        sinks = self.open_result_sinks()
+        sinks['matches'].add(matches)
+        sinks['unmatched'].add(pd.DataFrame(unmatched_products))
+        return self.finalize_results(sinks, original_df, input_file)
+        
+    def export_csv(self, master_file):
+        """Write a CSV copy of a Parquet master file when --csv-export is on."""
+        if not self.csv_export or master_file.suffix != '.parquet':
+            return
+        csv_file = with_format(master_file, 'csv')
+        read_table(master_file).to_csv(csv_file, index=False)
+        log.info(f"Exported CSV copy: {csv_file}")
+        
+    def finalize_results(self, sinks, original_df, input_file=None):
+        """Close the archive files, publish the master files and write the summary."""
+        match_sink, unmatched_sink = sinks['matches'], sinks['unmatched']
+        match_sink.close()
+        unmatched_sink.close()
+        stats = match_sink.stats
         
         # Timestamped archive
-        matches_file = self.output_dir / f"processed_matches_{self.timestamp}.csv"
-        matches_df.to_csv(matches_file, index=False)
-        log.info(f"Saved {len(matches)} matches to {matches_file}")
+        matches_file = match_sink.path
+        log.info(f"Saved {stats.count} matches to {matches_file}")
         
-        # Master file (no timestamp - for warehouse loading)
-        master_matches_file = self.output_dir / "processed_matches.csv"
-        matches_df.to_csv(master_matches_file, index=False)
+        # Master file (no timestamp - for warehouse loading), linked from the archive
+        master_matches_file = with_format(self.output_dir / "processed_matches.csv", self.output_format)
+        publish_file(matches_file, master_matches_file)
         log.info(f"Updated master matches file: {master_matches_file}")
-        
-        # Save unmatched products (both timestamped archive and master file)
-        unmatched_df = pd.DataFrame(unmatched_products)
+        self.export_csv(master_matches_file)
         
         # Timestamped archive
-        unmatched_file = self.output_dir / f"unmatched_products_{self.timestamp}.csv"
-        unmatched_df.to_csv(unmatched_file, index=False)
-        log.info(f"Saved {len(unmatched_products)} unmatched products to {unmatched_file}")
+        unmatched_file = unmatched_sink.path
+        log.info(f"Saved {unmatched_sink.rows} unmatched products to {unmatched_file}")
         
-        # Master file (no timestamp - for warehouse loading)
-        master_unmatched_file = self.output_dir / "unmatched_products.csv"
-        unmatched_df.to_csv(master_unmatched_file, index=False)
+        # Master file (no timestamp - for warehouse loading), linked from the archive
+        master_unmatched_file = with_format(self.output_dir / "unmatched_products.csv", self.output_format)
+        publish_file(unmatched_file, master_unmatched_file)
         log.info(f"Updated master unmatched file: {master_unmatched_file}")
+        self.export_csv(master_unmatched_file)
         
         # Generate summary
         total_products = len(original_df)
-        matched_products = total_products - len(unmatched_products)
-        coverage = (matched_products / total_products) * 100
+        matched_products = total_products - unmatched_sink.rows
+        coverage = (matched_products / total_products) * 100 if total_products else 0
         
         summary = {
             "processing_metadata": {
@@ -324,22 +722,35 @@ class FileBasedMatcher:
             "dataset_overview": {
                 "total_products": total_products,
                 "matched_products": matched_products,
-                "unmatched_products": len(unmatched_products),
+                "unmatched_products": unmatched_sink.rows,
                 "coverage_percentage": round(coverage, 1)
             },
             "matching_results": {
-                "total_match_pairs": len(matches),
-                "main_engine_pairs": len(matches),
+                "total_match_pairs": stats.count,
+                "main_engine_pairs": stats.count,
                 "post_processing_pairs": 0
             },
             "quality_metrics": {
-                "avg_similarity": np.mean([m['similarity'] for m in matches]) if matches else 0,
-                "median_similarity": np.median([m['similarity'] for m in matches]) if matches else 0,
-                "perfect_matches": len([m for m in matches if m['similarity'] >= 95]),
-                "high_quality_matches": len([m for m in matches if m['similarity'] >= 85])
+                "avg_similarity": stats.mean,
+                "median_similarity": stats.median,
+                "perfect_matches": stats.perfect,
+                "high_quality_matches": stats.high_quality,
+                "confidence_tiers": dict(sorted(stats.tiers.items()))
             }
         }
         
+        if self.embedding_store is not None:
+            summary["embedding_cache"] = self.embedding_store.stats()
+            
+        if self.incremental_stats is not None:
+            summary["incremental"] = self.incremental_stats
+            
+        if self.blockers:
+            summary["blocking"] = {
+                "blockers": [b.name for b in self.blockers],
+                **self.blocking_stats.to_dict()
+            }
+        
         summary_file = self.output_dir / f"processing_summary_{self.timestamp}.json"
         with open(summary_file, 'w') as f:
             json.dump(summary, f, indent=2)
@@ -351,45 +762,139 @@ class FileBasedMatcher:
             'summary_file': summary_file
         }
         
-    def run(self, input_file):
+    def run(self, input_file, incremental=False):
         """Run the complete matching process."""
         log.info("Starting enhanced matching engine...")
         
-        matches, unmatched_products, original_df = self.process_input_file(input_file)
-        results = self.save_results(matches, unmatched_products, original_df, input_file)
+        if incremental:
+            # Kept and new matches are merged in memory before writing
+            matches, unmatched_products, original_df = self.process_incremental(input_file)
+            sinks = self.open_result_sinks()
+            sinks['matches'].add(matches)
+            sinks['unmatched'].add(unmatched_products)
+        else:
+            # Stream each category's results to disk as soon as it is matched
+            original_df = self.load_products(input_file)
+            sinks = self.open_result_sinks()
+            self.match_products(original_df, sinks=sinks)
+            
+        if self.embedding_store is not None:
+            self.embedding_store.flush()
+        results = self.finalize_results(sinks, original_df, input_file)
+        
+        # Only advance the index once the merged results are on disk
+        if self.product_index is not None:
+            index, df = self.product_index
+            index.save(df)
         
         log.info("Enhanced matching engine completed successfully!")
         return results
 
-def main():
+# Per-process state for match_categories_parallel workers
+_worker_matcher = None
+_worker_shm = None
+
+
+def _init_worker(output_dir, config, shm_name, shape, text_index):
+    """Build a worker-local matcher whose embedding cache views the shared matrix."""
+    global _worker_matcher, _worker_shm
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    matrix = np.ndarray(shape, dtype=np.float32, buffer=_worker_shm.buf)
+    
+    _worker_matcher = FileBasedMatcher(output_dir, **config)
+    _worker_matcher.embeddings_cache = {text: matrix[row] for text, row in text_index.items()}
+
+
+def _match_tile(category, group, row_start, row_stop, dirty_rows=None, candidates=None):
+    """Match one row tile of a category; returns matches, matched rows and blocking counts."""
+    _worker_matcher.blocking_stats = BlockingStats()
+    category_matches, matched_in_category = _worker_matcher.match_category(
+        category, group, row_start, row_stop, dirty_rows, candidates
+    )
+    return category_matches, matched_in_category, _worker_matcher.blocking_stats
+
+
+def add_matching_arguments(parser):
+    """Matcher tuning options (shared with src/streaming_pipeline.py)."""
+    parser.add_argument('--format', choices=['csv', 'parquet'], default=None,
+                        help='Result file format (default: PIPELINE_FORMAT or csv)')
+    parser.add_argument('--csv-export', action='store_true',
+                        help='Also write CSV copies of Parquet master files (for Excel)')
+    parser.add_argument('--blocking', type=str, default='none',
+                        help='Comma-separated candidate blockers: brand, size, rare_token, '
+                             'sorted_neighbourhood, semantic (default: none = all pairs)')
+    parser.add_argument('--embed-batch-size', type=int, default=64,
+                        help='Number of titles per Sentence-BERT encode batch')
+    parser.add_argument('--scoring-engine', choices=['pairwise', 'vectorized'], default='pairwise',
+                        help='Pair scoring engine (vectorized = matrix scoring per category)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Worker processes for category-parallel matching (default: 1)')
+    parser.add_argument('--tile-rows', type=int, default=256,
+                        help='Rows per tile when splitting large categories across workers')
+    parser.add_argument('--embedding-store', type=str, default=None,
+                        help='Persistent embedding cache directory (default: <output-dir>/embedding_store)')
+    parser.add_argument('--no-embedding-store', action='store_true',
+                        help='Disable the persistent embedding cache')
+    parser.add_argument('--embedding-store-max-entries', type=int, default=200_000,
+                        help='Maximum cached embeddings before LRU eviction')
+    parser.add_argument('--ann-top-k', type=int, default=20,
+                        help='Semantic neighbours per product for the semantic blocker')
+    parser.add_argument('--evaluate-blocking', action='store_true',
+                        help='Also score all pairs to report blocking pair completeness')
+    return parser
+
+
+def matcher_from_args(args, output_dir):
+    """FileBasedMatcher configured from add_matching_arguments() options."""
+    embedding_store_dir = None
+    if not args.no_embedding_store:
+        embedding_store_dir = args.embedding_store or os.path.join(output_dir, 'embedding_store')
+        
+    return FileBasedMatcher(output_dir, blockers=args.blocking,
+                            evaluate_blocking=args.evaluate_blocking,
+                            ann_top_k=args.ann_top_k,
+                            embed_batch_size=args.embed_batch_size,
+                            embedding_store_dir=embedding_store_dir,
+                            embedding_store_max_entries=args.embedding_store_max_entries,
+                            scoring_engine=args.scoring_engine,
+                            workers=args.workers, tile_rows=args.tile_rows,
+                            output_format=args.format, csv_export=args.csv_export)
+
+
+def main(argv=None):
     parser = argparse.ArgumentParser(description='File-Based Enhanced Product Matching Engine')
-    parser.add_argument('--input', type=str, default=None, help='Input CSV file path (optional - auto-detects if not provided)')
+    parser.add_argument('--input', type=str, default=None, help='Input CSV/Parquet file path (optional - auto-detects if not provided)')
     parser.add_argument('--output-dir', type=str, default='data/processed', help='Output directory')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Only score new/changed products and merge into the master matches file')
+    add_matching_arguments(parser)
     
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
     
     # Auto-detect input file if not provided
     if args.input is None:
         default_input = "data/processed/cleaned_data.csv"
-        if os.path.exists(default_input):
-            args.input = default_input
+        detected = latest_existing(default_input)
+        if detected is not None:
+            args.input = str(detected)
             log.info(f"📂 Auto-detected input file: {args.input}")
         else:
             log.error(f"❌ No input file found: {default_input}")
             log.info("💡 Run: python src/cleandata_script.py first")
-            sys.exit(1)
+            return 1
     
     if not os.path.exists(args.input):
         print(f"Error: Input file not found: {args.input}")
-        sys.exit(1)
+        return 1
         
-    matcher = FileBasedMatcher(args.output_dir)
-    results = matcher.run(args.input)
+    matcher = matcher_from_args(args, args.output_dir)
+    results = matcher.run(args.input, incremental=args.incremental)
     
     print(f"\n✅ Results saved:")
     print(f"  📊 Matches: {results['matches_file']}")
     print(f"  ⚠️  Unmatched: {results['unmatched_file']}")
     print(f"  📋 Summary: {results['summary_file']}")
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Async Oxylabs Google Shopping Client
+------------------------------------
+Fetches search result pages concurrently over one shared aiohttp connection
+pool. Concurrency is bounded by a semaphore and the request rate by a token
+bucket (requests/sec), so the API is used as fast as the account allows
+instead of with fixed sleeps between pages.
+
+Transient failures (timeouts, connection errors, HTTP 429/5xx, empty or
+invalid bodies) are retried with capped exponential backoff and full jitter,
+waiting at least as long as a Retry-After header asks.
+
+Pagination is adaptive: a query stops after a run of empty pages or once a
+page is mostly products already seen on its earlier pages (QueryPager).
+
+Each page comes back as a PageResult (query, page, organic items or the
+reason it failed). Raw responses can be recorded to a directory and replayed
+by scripts/mock_oxylabs_server.py.
+"""
+
+import re
+import json
+import time
+import random
+import asyncio
+import logging
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import aiohttp
+
+from url_canonical import amazon_host, canonicalize_url
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://realtime.oxylabs.io/v1/queries"
+
+
+def load_scrape_config(path):
+    """Query list and scrape settings from a JSON config file."""
+    with open(path) as f:
+        config = json.load(f)
+    if not config.get('queries'):
+        raise ValueError(f"No queries in scrape config: {path}")
+    config.setdefault('pages', 10)
+    config.setdefault('geo_location', 'United Kingdom')
+    config.setdefault('max_empty_pages', 2)
+    config.setdefault('max_seen_fraction', 0.8)
+    return config
+
+
+def item_key(item):
+    """Identity of a result item for repeat detection (product ID, else canonical URL)."""
+    return item.get('product_id') or canonicalize_url(item.get('url'), amazon_host(item.get('amazon_domain')))
+
+
+def recording_name(query, page):
+    """File name a raw response is recorded under (and replayed from)."""
+    slug = re.sub(r'[^a-z0-9]+', '_', query.lower()).strip('_')
+    return f"{slug}_p{page}.json"
+
+
+def parse_retry_after(value):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def is_retryable_status(status):
+    return status == 429 or status >= 500
+
+
+def extract_organic(data):
+    """Organic items of a parsed response, or raise ValueError with the reason."""
+    if 'results' not in data:
+        raise ValueError("No 'results' key in response")
+    if not data['results']:
+        raise ValueError("Empty results array")
+    result = data['results'][0]
+    if 'content' not in result:
+        raise ValueError("No 'content' in result")
+    if 'results' not in result['content']:
+        raise ValueError("No 'results' in content")
+    if 'organic' not in result['content']['results']:
+        raise ValueError("No 'organic' results")
+    organic = result['content']['results']['organic']
+    if not organic:
+        raise ValueError("Empty organic results")
+    return organic
+
+
+class PageResult:
+    """Outcome of fetching one result page."""
+
+    def __init__(self, query, page, items=None, error=None, status=None, elapsed=0.0,
+                 retryable=False, retry_after=None):
+        self.query = query
+        self.page = page
+        self.items = items or []
+        self.error = error
+        self.status = status
+        self.elapsed = elapsed
+        self.retryable = retryable  # transient failure worth another attempt
+        self.retry_after = retry_after
+        self.attempts = 1
+
+    @property
+    def completed(self):
+        """Fetched for good: results, or a definitive answer with none (no point retrying)."""
+        return self.ok or not self.retryable
+
+    @property
+    def ok(self):
+        return self.error is None
+
+    def __repr__(self):
+        outcome = f"{len(self.items)} items" if self.ok else self.error
+        return f"PageResult({self.query!r}, page={self.page}, {outcome})"
+
+
+class QueryPager:
+    """Tracks one query's pages in order and decides when paging should stop.
+
+    Stops after `max_empty_pages` consecutive completed pages without results
+    (past the last page Google Shopping answers with no organic results),
+    or when more than `max_seen_fraction` of a page's items were already seen
+    on earlier pages of the query. 0 / None disable the respective rule.
+    """
+
+    def __init__(self, query, max_pages, max_empty_pages=2, max_seen_fraction=0.8):
+        self.query = query
+        self.max_pages = max_pages
+        self.max_empty_pages = max_empty_pages
+        self.max_seen_fraction = max_seen_fraction
+        self.seen = set()
+        self.empty_run = 0
+        self.pages_used = 0  # pages fetched (or resumed) for this query
+        self.api_calls = 0   # requests made in this run, retries included
+        self.stop_reason = None
+        self.stopped_at = None
+
+    @property
+    def stopped(self):
+        return self.stop_reason is not None
+
+    @property
+    def pages_saved(self):
+        return self.max_pages - self.pages_used
+
+    def observe(self, page, keys):
+        """Feed the item keys of a completed page (in page order)."""
+        keys = [k for k in keys if k]
+        if keys:
+            seen_fraction = sum(k in self.seen for k in keys) / len(keys)
+            self.seen.update(keys)
+            self.empty_run = 0
+        else:
+            seen_fraction = 0.0
+            self.empty_run += 1
+
+        if self.max_empty_pages and self.empty_run >= self.max_empty_pages:
+            self.stop_reason = f"{self.empty_run} empty pages"
+        elif self.max_seen_fraction is not None and keys and seen_fraction > self.max_seen_fraction:
+            self.stop_reason = f"{seen_fraction:.0%} already-seen products"
+        if self.stopped:
+            self.stopped_at = page
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter: `rate` tokens/sec, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class OxylabsClient:
+    """Concurrent, rate-limited Google Shopping search client (use as `async with`)."""
+
+    def __init__(self, username, password, base_url=DEFAULT_BASE_URL, concurrency=4,
+                 rate=2.0, timeout=60, geo_location='United Kingdom', record_dir=None,
+                 max_retries=4, backoff_base=1.0, backoff_max=60.0):
+        self.auth = aiohttp.BasicAuth(username or '', password or '')
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.geo_location = geo_location
+        self.record_dir = Path(record_dir) if record_dir else None
+        self.rate_limiter = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.semaphore = None
+        self.session = None
+
+    async def __aenter__(self):
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        self.session = aiohttp.ClientSession(connector=connector, auth=self.auth, timeout=self.timeout)
+        if self.record_dir:
+            self.record_dir.mkdir(parents=True, exist_ok=True)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def payload(self, query, page):
+        return {
+            'source': 'google_shopping_search',
+            'query': query,
+            'geo_location': self.geo_location,
+            'parse': True,
+            'start_page': page,
+            'pages': 1
+        }
+
+    def backoff_delay(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, never shorter than Retry-After (capped at backoff_max)."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def fetch_page(self, query, page):
+        """Fetch one page, retrying transient failures; failures end up in PageResult.error."""
+        attempt = 0
+        while True:
+            result = await self._fetch_once(query, page)
+            result.attempts = attempt + 1
+            if result.completed or attempt >= self.max_retries:
+                return result
+            delay = self.backoff_delay(attempt, result.retry_after)
+            log.info(f"{query!r} page {page}: {result.error} - retry {attempt + 1}/{self.max_retries} "
+                     f"in {delay:.1f}s")
+            # Sleep outside the semaphore so other pages keep the pool busy
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def _fetch_once(self, query, page):
+        """One request for a page."""
+        async with self.semaphore:
+            await self.rate_limiter.acquire()
+            start = time.monotonic()
+            status = None
+            try:
+                async with self.session.post(self.base_url, json=self.payload(query, page)) as response:
+                    status = response.status
+                    response.raise_for_status()
+                    text = await response.text()
+            except asyncio.TimeoutError:
+                return PageResult(query, page, error="Request timeout", status=status,
+                                  elapsed=time.monotonic() - start, retryable=True)
+            except aiohttp.ClientResponseError as e:
+                retry_after = parse_retry_after(e.headers.get('Retry-After')) if e.headers else None
+                return PageResult(query, page, error=f"HTTP error: {e.status}", status=e.status,
+                                  elapsed=time.monotonic() - start,
+                                  retryable=is_retryable_status(e.status), retry_after=retry_after)
+            except aiohttp.ClientError as e:
+                return PageResult(query, page, error=f"Connection error: {str(e)[:50]}",
+                                  elapsed=time.monotonic() - start, retryable=True)
+            elapsed = time.monotonic() - start
+
+        if self.record_dir:
+            (self.record_dir / recording_name(query, page)).write_text(text)
+
+        if not text or not text.strip():
+            return PageResult(query, page, error="Empty response", status=status, elapsed=elapsed,
+                              retryable=True)
+        try:
+            organic = extract_organic(json.loads(text))
+        except json.JSONDecodeError as e:
+            return PageResult(query, page, error=f"Invalid JSON: {str(e)[:50]}", status=status,
+                              elapsed=elapsed, retryable=True)
+        except ValueError as e:
+            return PageResult(query, page, error=str(e), status=status, elapsed=elapsed)
+
+        # Add metadata to each result
+        fetched_at = datetime.now().strftime("%Y%m%d_%H%M%S")
+        for item in organic:
+            item['search_query'] = query
+            item['page_number'] = page
+            item['timestamp'] = fetched_at
+        return PageResult(query, page, items=organic, status=status, elapsed=elapsed)
+
+    async def scrape(self, queries, pages):
+        """Fetch pages 1..pages of every query concurrently; results in (query, page) order."""
+        tasks = [self.fetch_page(query, page) for query in queries for page in range(1, pages + 1)]
+        return await asyncio.gather(*tasks)
+
+    async def _page_query(self, pager, known, window, queue, announce_done=False):
+        """Page through one query in order, `window` pages at a time, until the pager stops it."""
+        query = pager.query
+        page = 1
+        while page <= pager.max_pages and not pager.stopped:
+            batch = range(page, min(page + window, pager.max_pages + 1))
+            to_fetch = [p for p in batch if (query, p) not in known]
+            fetched = await asyncio.gather(*(self.fetch_page(query, p) for p in to_fetch))
+            results = dict(zip(to_fetch, fetched))
+            for p in batch:
+                if p in results:
+                    result = results[p]
+                    pager.api_calls += result.attempts
+                    await queue.put(result)
+                    keys = [item_key(item) for item in result.items] if result.completed else None
+                else:
+                    keys = known[(query, p)]
+                pager.pages_used += 1
+                # Pages past the stop point in the same window were already paid for - keep them
+                if keys is not None and not pager.stopped:
+                    pager.observe(p, keys)
+            page = batch.stop
+        if announce_done:
+            await queue.put(pager)
+
+    async def iter_adaptive(self, pagers, known=None, window=2, announce_done=False, buffer=0):
+        """Page through every QueryPager's query concurrently, yielding PageResults as they complete.
+
+        `known` maps already-fetched (query, page) to their item keys (resumed runs);
+        those pages are fed to the pager without being requested again. With
+        announce_done, a query's QueryPager is yielded after its last page.
+        A `buffer` > 0 bounds the pages waiting to be consumed: when the
+        consumer falls behind, fetching pauses (backpressure).
+        """
+        known = known or {}
+        queue = asyncio.Queue(maxsize=buffer)
+        tasks = [asyncio.ensure_future(self._page_query(pager, known, window, queue, announce_done))
+                 for pager in pagers]
+        runner = asyncio.ensure_future(asyncio.gather(*tasks))
+        try:
+            while not (runner.done() and queue.empty()):
+                getter = asyncio.ensure_future(queue.get())
+                await asyncio.wait([getter, runner], return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                else:
+                    getter.cancel()
+            runner.result()  # surface errors from the query tasks
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def iter_pages(self, requests):
+        """Fetch (query, page) pairs concurrently, yielding each PageResult as it completes."""
+        tasks = [asyncio.ensure_future(self.fetch_page(query, page)) for query, page in requests]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
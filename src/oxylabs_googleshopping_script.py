@@ -1,191 +1,198 @@
-import requests
-import pandas as pd
-from datetime import datetime
+import asyncio
+import argparse
 import time
-import json
 import os
+from datetime import datetime
+from pathlib import Path
+
 from dotenv import load_dotenv
 
+from deduplication_manager import DEFAULT_DB, DeduplicationManager
+from oxylabs_client import DEFAULT_BASE_URL, OxylabsClient, QueryPager, item_key, load_scrape_config
+from scrape_checkpoint import ScrapeCheckpoint
+from table_io import default_format
+
 load_dotenv()
 
 # Your credentials
 USERNAME = os.getenv('OXYLABS_USERNAME')
 PASSWORD = os.getenv('OXYLABS_PASSWORD')
 
-# Your search queries
-queries = [
-    'shampoo bar',
-    'conditioner bar',
-    'face serum',
-    'body butter'
-]
-
-all_results = []
-
-# Scrape each query with pagination
-for query_idx, query in enumerate(queries, 1):
+# Search queries and scrape settings
+DEFAULT_CONFIG = 'config/oxylabs_queries.json'
+CHECKPOINT_DIR = 'data/raw/checkpoints'
+
+
+async def scrape(config, args, checkpoint, pagers, dedup=None, on_page=None, on_query_done=None):
+    """Page through every query until it runs dry or repeats, journaling pages as they complete.
+
+    With a DeduplicationManager, each page's items are checked against (and
+    added to) the products seen in earlier runs. `on_page` is called with
+    every completed PageResult; `on_query_done` (a coroutine function) is
+    awaited with a query's QueryPager once the query is finished - paging
+    waits while it runs (backpressure for streaming consumers).
+    """
+    queries, pages = config['queries'], config['pages']
+    print(f"Searching {len(queries)} queries x up to {pages} pages: "
+          f"{len(checkpoint.pages)} already fetched "
+          f"(concurrency {args.concurrency}, {args.rate:g} req/s)")
+
+    failed = 0
+    new_per_query = {}
+    async with OxylabsClient(USERNAME, PASSWORD, base_url=args.base_url,
+                             concurrency=args.concurrency, rate=args.rate,
+                             timeout=args.timeout, geo_location=config['geo_location'],
+                             record_dir=args.record_dir, max_retries=args.max_retries) as client:
+        async for r in client.iter_adaptive(pagers, known=checkpoint.page_keys(item_key),
+                                            window=args.page_window,
+                                            announce_done=on_query_done is not None,
+                                            buffer=args.concurrency * args.page_window):
+            if isinstance(r, QueryPager):
+                await on_query_done(r)
+                continue
+            if r.completed:
+                # Items go to disk straight away - nothing accumulates in memory
+                checkpoint.record(r)
+                if on_page is not None:
+                    on_page(r)
+            else:
+                failed += 1
+            status = f"✓ Got {len(r.items)} results" if r.ok else f"✗ {r.error}"
+            if dedup is not None and r.items:
+                duplicate = dedup.is_duplicate(r.items)
+                dedup.mark_items(r.items)
+                new_items = len(duplicate) - sum(duplicate)
+                new_per_query[r.query] = new_per_query.get(r.query, 0) + new_items
+                status += f", {new_items} new"
+            retries = f", {r.attempts} attempts" if r.attempts > 1 else ""
+            print(f"  [{r.query}] page {r.page}/{pages}... {status} ({r.elapsed:.1f}s{retries})")
+    return failed, new_per_query
+
+
+def report_savings(pagers):
+    """Print where each query stopped paging and how many requests that saved."""
+    print("\n⏭️  Pagination:")
+    saved = 0
+    for pager in pagers:
+        if pager.stopped:
+            print(f"  {pager.query}: stopped after page {pager.stopped_at}/{pager.max_pages} "
+                  f"({pager.stop_reason}) - {pager.pages_saved} API calls saved")
+            saved += pager.pages_saved
+        else:
+            print(f"  {pager.query}: all {pager.max_pages} pages ({pager.api_calls} API calls this run)")
+    total = sum(pager.max_pages for pager in pagers)
+    print(f"  Total: {saved}/{total} page requests saved")
+
+
+def build_parser(description='Scrape Google Shopping results via Oxylabs'):
+    """Scraper command-line options (shared with src/streaming_pipeline.py)."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='JSON file with queries and pages')
+    parser.add_argument('--base-url', default=os.getenv('OXYLABS_BASE_URL', DEFAULT_BASE_URL),
+                        help='Oxylabs endpoint (point at scripts/mock_oxylabs_server.py for testing)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Maximum requests in flight')
+    parser.add_argument('--rate', type=float, default=2.0, help='Maximum requests per second')
+    parser.add_argument('--timeout', type=float, default=60, help='Per-request timeout in seconds')
+    parser.add_argument('--max-retries', type=int, default=4,
+                        help='Retries per page for timeouts, connection errors and HTTP 429/5xx')
+    parser.add_argument('--max-empty-pages', type=int, default=None,
+                        help='Stop a query after this many empty pages in a row (config: max_empty_pages)')
+    parser.add_argument('--max-seen-fraction', type=float, default=None,
+                        help='Stop a query when more than this fraction of a page was already seen '
+                             '(config: max_seen_fraction)')
+    parser.add_argument('--page-window', type=int, default=2,
+                        help='Pages of one query fetched ahead at a time')
+    parser.add_argument('--no-early-stop', action='store_true', help='Always fetch every page')
+    parser.add_argument('--dedup-db', default=DEFAULT_DB,
+                        help='Seen-item store used to flag products seen in earlier runs')
+    parser.add_argument('--no-dedup', action='store_true', help='Skip the seen-item checks')
+    parser.add_argument('--record-dir', default=None, help='Save raw responses here for later replay')
+    parser.add_argument('--output-dir', default='data/raw', help='Where the results file is written')
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR,
+                        help='Journal + scraped items of unfinished runs')
+    parser.add_argument('--run-name', default=None,
+                        help='Checkpoint to resume (default: <config name>_<today>)')
+    return parser
+
+
+def open_checkpoint(args):
+    run_name = args.run_name or f"{Path(args.config).stem}_{datetime.now().strftime('%Y%m%d')}"
+    return ScrapeCheckpoint(args.checkpoint_dir, run_name)
+
+
+def make_pagers(config, args):
+    """One QueryPager per configured query, with the early-stop settings from args/config."""
+    if args.no_early_stop:
+        max_empty, max_seen = 0, None
+    else:
+        max_empty = config['max_empty_pages'] if args.max_empty_pages is None else args.max_empty_pages
+        max_seen = config['max_seen_fraction'] if args.max_seen_fraction is None else args.max_seen_fraction
+    return [QueryPager(q, config['pages'], max_empty, max_seen) for q in config['queries']]
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    config = load_scrape_config(args.config)
+    checkpoint = open_checkpoint(args)
+    pagers = make_pagers(config, args)
+
+    dedup = None if args.no_dedup else DeduplicationManager(args.dedup_db)
+    start = time.perf_counter()
+    try:
+        failed, new_per_query = asyncio.run(scrape(config, args, checkpoint, pagers, dedup))
+    finally:
+        if dedup is not None:
+            dedup.close()
+    elapsed = time.perf_counter() - start
+    finish_run(args, checkpoint, pagers, dedup, failed, new_per_query, elapsed)
+    return 0
+
+
+def finish_run(args, checkpoint, pagers, dedup, failed, new_per_query, elapsed):
+    """Write the results file from the checkpoint and print the run report; returns its path."""
+    filename = None
     print(f"\n{'='*70}")
-    print(f"[{query_idx}/{len(queries)}] Searching for: {query}")
+    print("FINAL RESULTS")
     print('='*70)
 
-    successful_pages = 0
-    failed_pages = 0
-
-    # Request multiple pages (1-10 = 100 results)
-    for page in range(1, 11):  # Pages 1 to 10
-        print(f"  Page {page}/10...", end=' ')
-
-        payload = {
-            'source': 'google_shopping_search',
-            'query': query,
-            'geo_location': 'United Kingdom',
-            'parse': True,
-            'start_page': page,
-            'pages': 1
-        }
-
-        try:
-            response = requests.post(
-                'https://realtime.oxylabs.io/v1/queries',
-                auth=(USERNAME, PASSWORD),
-                json=payload,
-                timeout=60  # Increased timeout
-            )
-
-            # Check HTTP status
-            response.raise_for_status()
-
-            # Check if response has content
-            if not response.text or not response.text.strip():
-                print(f"✗ Empty response")
-                failed_pages += 1
-                time.sleep(3)  # Wait before next request
-                continue
-
-            # Try to parse JSON
-            try:
-                data = response.json()
-            except json.JSONDecodeError as e:
-                print(f"✗ Invalid JSON: {str(e)[:50]}")
-                failed_pages += 1
-                time.sleep(3)
-                continue
-
-            # Check if results exist in expected structure
-            if 'results' not in data:
-                print(f"✗ No 'results' key in response")
-                failed_pages += 1
-                time.sleep(3)
-                continue
-
-            if not data['results'] or len(data['results']) == 0:
-                print(f"✗ Empty results array")
-                failed_pages += 1
-                time.sleep(3)
-                continue
-
-            # Check for content
-            result = data['results'][0]
-            if 'content' not in result:
-                print(f"✗ No 'content' in result")
-                failed_pages += 1
-                time.sleep(3)
-                continue
-
-            # Check for organic results
-            if 'results' not in result['content']:
-                print(f"✗ No 'results' in content")
-                failed_pages += 1
-                time.sleep(3)
-                continue
-
-            if 'organic' not in result['content']['results']:
-                print(f"✗ No 'organic' results")
-                failed_pages += 1
-                time.sleep(3)
-                continue
-
-            # Extract organic results
-            organic = result['content']['results']['organic']
-
-            if not organic or len(organic) == 0:
-                print(f"✗ Empty organic results")
-                failed_pages += 1
-                time.sleep(3)
-                continue
-
-            # Add metadata to each result
-            for item in organic:
-                item['search_query'] = query
-                item['page_number'] = page
-                item['timestamp'] = datetime.now().strftime("%Y%m%d_%H%M%S")
-
-            all_results.extend(organic)
-            successful_pages += 1
-            print(f"✓ Got {len(organic)} results")
-
-        except requests.exceptions.Timeout:
-            print(f"✗ Request timeout")
-            failed_pages += 1
-
-        except requests.exceptions.ConnectionError:
-            print(f"✗ Connection error")
-            failed_pages += 1
-
-        except requests.exceptions.HTTPError as e:
-            print(f"✗ HTTP error: {e.response.status_code}")
-            failed_pages += 1
-
-        except KeyError as e:
-            print(f"✗ Missing key in response: {e}")
-            failed_pages += 1
-
-        except Exception as e:
-            print(f"✗ Unexpected error: {str(e)[:50]}")
-            failed_pages += 1
-
-        # Increased delay between requests
-        time.sleep(3)  # 3 seconds between pages
-
-    # Summary for this query
-    print(f"\n  Summary: {successful_pages} successful, {failed_pages} failed")
-
-    # Longer delay between queries
-    if query_idx < len(queries):
-        print(f"  Waiting 5 seconds before next query...")
-        time.sleep(5)
-
-# Convert to DataFrame and save
-print(f"\n{'='*70}")
-print("FINAL RESULTS")
-print('='*70)
-
-if all_results:
-    df = pd.DataFrame(all_results)
-
-    # Create timestamped filename and save into /data/raw/
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    output_dir = "data/raw"
-    os.makedirs(output_dir, exist_ok=True)  # ensure folder exists
-    filename = f"{output_dir}/all_search_results_{timestamp}.csv"
-
-    df.to_csv(filename, index=False)
-
-    print(f"\n✓ Total results collected: {len(df)}")
-    print(f"✓ Saved to: {filename}")
-
-    # Show breakdown by query
-    print("\n📊 Breakdown by search query:")
-    summary = df.groupby('search_query').size()
-    for query, count in summary.items():
-        print(f"  {query}: {count} results")
-
-    # Show sample
-    print(f"\n📋 Sample of first 5 results:")
-    print(df[['search_query', 'page_number', 'title', 'url']].head())
-
-else:
-    print("\n✗ No results collected!")
-    print("  Check your Oxylabs credentials and account credits.")
-
-print(f"\n{'='*70}")
\ No newline at end of file
+    if checkpoint.item_count:
+        # Create timestamped filename and save into /data/raw/
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        os.makedirs(args.output_dir, exist_ok=True)  # ensure folder exists
+        filename = f"{args.output_dir}/all_search_results_{timestamp}.{default_format()}"
+
+        rows = checkpoint.write_table(filename)
+
+        print(f"\n✓ Total results collected: {rows} in {elapsed:.1f}s")
+        print(f"✓ Saved to: {filename}")
+
+        # Show breakdown by query
+        print("\n📊 Breakdown by search query:")
+        for query, count in sorted(checkpoint.items_per_query().items()):
+            new = f" ({new_per_query.get(query, 0)} new this run)" if dedup is not None else ""
+            print(f"  {query}: {count} results{new}")
+    else:
+        print("\n✗ No results collected!")
+        print("  Check your Oxylabs credentials and account credits.")
+
+    report_savings(pagers)
+
+    if dedup is not None:
+        info = dedup.filter_info()
+        print(f"\n🔍 Seen-item filter: {info['checks']:,} checks, {info['rejected_by_filter']:,} "
+              f"answered in memory, {info['confirmed_duplicates']:,} confirmed duplicates, "
+              f"{info['false_positives']} false positives "
+              f"(observed FP rate {info['observed_fp_rate']:.2%}, "
+              f"configured {info['configured_fp_rate']:.2%})")
+
+    if failed:
+        print(f"\n⚠️  {failed} pages still failing after retries - rerun to resume "
+              f"(checkpoint: {checkpoint.journal_path})")
+    else:
+        checkpoint.clear()
+    return filename
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Pipeline Orchestrator
+---------------------
+Runs pipeline stages in one process through their importable
+`main(argv)` entry points, so libraries and models are loaded once, and
+skips stages whose work is already done.
+
+A manifest (data/processed/pipeline_manifest.json) records per stage the
+content hashes of its inputs and outputs, its arguments and its code
+version: a hash of the stage module plus every local module it imports
+(transitively). A stage is skipped when all of these are unchanged and its
+outputs are still on disk as it wrote them. Stages marked volatile (e.g.
+scraping live data) always run. File hashes are reused while a file's
+size and mtime are unchanged.
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import hashlib
+import logging
+import importlib
+import importlib.util
+from datetime import datetime
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MANIFEST = 'data/processed/pipeline_manifest.json'
+HASH_CHUNK = 1 << 20
+
+
+def file_digest(path):
+    """blake2b content hash of a file (128-bit hex)."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def local_imports(path, search_dirs):
+    """Paths of the modules in `search_dirs` that the module at `path` imports."""
+    tree = ast.parse(Path(path).read_text(encoding='utf-8'))
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split('.')[0])
+    found = []
+    for name in sorted(names):
+        for directory in search_dirs:
+            candidate = Path(directory) / f"{name}.py"
+            if candidate.exists():
+                found.append(candidate)
+                break
+    return found
+
+
+def code_version(path, search_dirs):
+    """Hash of a module's source and of every local module it imports, transitively."""
+    seen, pending = {}, [Path(path)]
+    while pending:
+        module = pending.pop()
+        key = module.resolve()
+        if key in seen:
+            continue
+        seen[key] = module
+        pending.extend(local_imports(module, search_dirs))
+    digest = hashlib.blake2b(digest_size=16)
+    for key in sorted(seen):
+        digest.update(seen[key].name.encode('utf-8'))
+        digest.update(key.read_bytes())
+    return digest.hexdigest()
+
+
+class Stage:
+    """One pipeline step: a module with a main(argv) entry point.
+
+    `inputs` / `outputs` are callables returning the files the stage reads /
+    writes (resolved at run time, e.g. "latest raw file"); missing files
+    (None) are ignored.
+    """
+
+    def __init__(self, name, module, argv=(), inputs=None, outputs=None, volatile=False):
+        self.name = name
+        self.module = module
+        self.argv = list(argv)
+        self.inputs = inputs or (lambda: [])
+        self.outputs = outputs or (lambda: [])
+        self.volatile = volatile
+
+    def input_files(self):
+        return sorted(str(p) for p in self.inputs() if p is not None)
+
+    def output_files(self):
+        return sorted(str(p) for p in self.outputs() if p is not None)
+
+
+class PipelineOrchestrator:
+    """Runs Stages in order, skipping the ones whose manifest entry is still valid."""
+
+    def __init__(self, stages, manifest_path=DEFAULT_MANIFEST, search_dirs=(), force=()):
+        self.stages = stages
+        self.manifest_path = Path(manifest_path)
+        self.search_dirs = [Path(d) for d in search_dirs]
+        # True forces every stage; a collection forces the named ones
+        self.force = force
+        self.manifest = self._load()
+        self.results = []
+
+    def _load(self):
+        if self.manifest_path.exists():
+            try:
+                return json.loads(self.manifest_path.read_text())
+            except json.JSONDecodeError:
+                log.warning(f"⚠️  Ignoring unreadable manifest {self.manifest_path}")
+        return {'stages': {}, 'files': {}}
+
+    def _save(self):
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_name(f".{self.manifest_path.name}.tmp")
+        tmp_path.write_text(json.dumps(self.manifest, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.manifest_path)
+
+    def digest(self, path):
+        """Content hash of `path`, reused from the manifest while size + mtime are unchanged."""
+        stat = os.stat(path)
+        cached = self.manifest['files'].get(path)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        value = file_digest(path)
+        self.manifest['files'][path] = [stat.st_size, stat.st_mtime_ns, value]
+        return value
+
+    def module_path(self, stage):
+        spec = importlib.util.find_spec(stage.module)
+        if spec is None or spec.origin is None:
+            raise ImportError(f"Stage {stage.name}: module {stage.module} not found")
+        return spec.origin
+
+    def fingerprint(self, stage):
+        """What the stage's result depends on: code version, arguments, input contents."""
+        return {
+            'code': code_version(self.module_path(stage), self.search_dirs),
+            'argv': stage.argv,
+            'inputs': {path: self.digest(path) for path in stage.input_files()},
+        }
+
+    def is_fresh(self, stage, fingerprint):
+        """True if the stage last ran with this fingerprint and its outputs are untouched."""
+        entry = self.manifest['stages'].get(stage.name)
+        if entry is None or stage.volatile:
+            return False
+        if any(entry.get(k) != v for k, v in fingerprint.items()):
+            return False
+        outputs = entry.get('outputs', {})
+        if sorted(outputs) != stage.output_files():
+            return False
+        return all(os.path.exists(p) and self.digest(p) == h for p, h in outputs.items())
+
+    def explain(self, stage, fingerprint):
+        """Why a stage has to run (for the log)."""
+        entry = self.manifest['stages'].get(stage.name)
+        if self.force is True or stage.name in self.force:
+            return 'forced'
+        if stage.volatile:
+            return 'always runs'
+        if entry is None:
+            return 'no previous run'
+        for key, label in (('code', 'code changed'), ('argv', 'arguments changed'),
+                           ('inputs', 'inputs changed')):
+            if entry.get(key) != fingerprint[key]:
+                return label
+        return 'outputs missing or modified'
+
+    def run_stage(self, stage):
+        """Import the stage module and call main(argv) in this process; returns the exit code.
+
+        A stage that raises counts as failed (exit code 1), like a crashed subprocess.
+        """
+        try:
+            module = importlib.import_module(stage.module)
+            code = module.main(list(stage.argv))
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception:
+            log.exception(f"❌ {stage.name} raised")
+            code = 1
+        return code or 0
+
+    def run(self, dry_run=False):
+        """Run (or skip) every stage in order; returns False at the first failing stage."""
+        for stage in self.stages:
+            start = time.perf_counter()
+            fingerprint = self.fingerprint(stage)
+            forced = self.force is True or stage.name in self.force
+            if not forced and self.is_fresh(stage, fingerprint):
+                log.info(f"⏭️  {stage.name}: unchanged since {self.manifest['stages'][stage.name]['completed_at']} "
+                         f"- skipped")
+                self.results.append((stage.name, 'skipped', time.perf_counter() - start))
+                self._save()
+                continue
+
+            reason = self.explain(stage, fingerprint)
+            if dry_run:
+                log.info(f"▶️  {stage.name}: would run ({reason})")
+                self.results.append((stage.name, 'would run', 0.0))
+                continue
+
+            log.info(f"\n{'=' * 70}\n🚀 {stage.name} ({reason})\n{'=' * 70}")
+            code = self.run_stage(stage)
+            elapsed = time.perf_counter() - start
+            if code != 0:
+                log.error(f"❌ {stage.name} failed (exit code {code})")
+                self.results.append((stage.name, 'failed', elapsed))
+                self.manifest['stages'].pop(stage.name, None)
+                self._save()
+                return False
+
+            self.manifest['stages'][stage.name] = {
+                **fingerprint,
+                'outputs': {path: self.digest(path) for path in stage.output_files()},
+                'completed_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'seconds': round(elapsed, 2),
+            }
+            self._save()
+            log.info(f"✅ {stage.name} completed in {elapsed:.1f}s")
+            self.results.append((stage.name, 'ran', elapsed))
+        return True
+
+    def summary(self):
+        width = max([28] + [len(name) for name, _, _ in self.results])
+        lines = [f"{'stage':<{width}} {'status':<10} {'seconds':>8}"]
+        lines += [f"{name:<{width}} {status:<10} {seconds:>8.1f}" for name, status, seconds in self.results]
+        return '\n'.join(lines)
+
+
+def add_to_path(*directories):
+    """Make stage modules in `directories` importable."""
+    for directory in directories:
+        directory = str(directory)
+        if directory not in sys.path:
+            sys.path.insert(0, directory)
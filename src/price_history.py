@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Temporal Price Snapshots
+------------------------
+Price history per (product, retailer). A snapshot is only appended when a
+product's price or currency differs from the last one recorded, so repeated
+scrapes of unchanged prices add nothing.
+
+Layout (Parquet, needs pyarrow):
+
+    data/processed/price_history/
+        latest.parquet                      current price per product/retailer
+        snapshots/date=YYYY-MM-DD/*.parquet  change snapshots, sorted by product_key
+
+Products are keyed by their canonical URL fingerprint (src/url_canonical.py),
+falling back to the product ID. "As of" lookups answer from latest.parquet
+when the date is past the last change and otherwise read date partitions
+newest-first; window queries only open the partitions inside the window.
+
+    python src/price_history.py record data/raw/all_search_results_20251125.csv
+    python src/price_history.py as-of <product_key> 2025-11-20
+    python src/price_history.py changes 2025-11-01 2025-11-30
+"""
+
+import os
+import ast
+import logging
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from table_io import pa, pq, read_table, require_pyarrow
+from url_canonical import amazon_host, url_fingerprint
+
+try:
+    import pyarrow.dataset as ds
+except ImportError:  # optional dependency, only needed for Parquet
+    ds = None
+
+log = logging.getLogger(__name__)
+
+DEFAULT_DIR = 'data/processed/price_history'
+KEY_COLUMNS = ['product_key', 'retailer']
+SNAPSHOT_COLUMNS = KEY_COLUMNS + ['price', 'currency', 'observed_at', 'previous_price']
+
+if pa is not None:
+    SNAPSHOT_SCHEMA = pa.schema([
+        ('product_key', pa.string()), ('retailer', pa.string()),
+        ('price', pa.float64()), ('currency', pa.string()),
+        ('observed_at', pa.timestamp('s')), ('previous_price', pa.float64()),
+    ])
+    PARTITIONING = ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+
+def retailer_name(value):
+    """Retailer name from a merchant field (dict, dict-like string or plain name)."""
+    if isinstance(value, dict):
+        return value.get('name')
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    text = str(value)
+    if text.startswith('{') and text.endswith('}'):
+        try:
+            return ast.literal_eval(text).get('name')
+        except (ValueError, SyntaxError, AttributeError):
+            pass
+    return text
+
+
+def _observed_at(frame, default):
+    if 'timestamp' not in frame.columns:
+        return pd.Series(default, index=frame.index)
+    raw = frame['timestamp'].astype(str)
+    parsed = pd.to_datetime(raw, format='%Y%m%d_%H%M%S', errors='coerce')
+    missing = parsed.isna()
+    if missing.any():
+        parsed[missing] = pd.to_datetime(raw[missing], errors='coerce', format='mixed')
+    return parsed.fillna(default)
+
+
+def snapshot_frame(frame, observed_at=None):
+    """Scraped or cleaned rows -> one snapshot row per (product_key, retailer).
+
+    Accepts scraper columns (url, merchant, price, currency, timestamp),
+    matcher columns (retailer_url, retailer_name, product_id) or Amazon
+    export columns (relative url, amazon_domain, asin).
+    """
+    default = pd.Timestamp(observed_at or datetime.now()).floor('s')
+    url_col = next((c for c in ('url', 'retailer_url') if c in frame.columns), None)
+    urls = frame[url_col] if url_col else pd.Series(None, index=frame.index)
+    # Amazon exports have relative URLs plus the marketplace in amazon_domain, and an ASIN
+    hosts = frame['amazon_domain'].map(amazon_host) if 'amazon_domain' in frame.columns \
+        else pd.Series(None, index=frame.index)
+    id_col = next((c for c in ('product_id', 'asin') if c in frame.columns), None)
+    ids = frame[id_col] if id_col else pd.Series(None, index=frame.index)
+    keys = [url_fingerprint(u, default_host=h) or (None if pd.isna(i) else f"id:{i}")
+            for u, h, i in zip(urls, hosts, ids)]
+
+    retailer_col = next((c for c in ('merchant', 'retailer_name') if c in frame.columns), None)
+    snapshots = pd.DataFrame({
+        'product_key': keys,
+        'retailer': frame[retailer_col].map(retailer_name) if retailer_col else None,
+        'price': pd.to_numeric(frame.get('price'), errors='coerce'),
+        'currency': frame['currency'] if 'currency' in frame.columns else None,
+        'observed_at': _observed_at(frame, default).dt.floor('s'),
+    }, index=frame.index)
+    snapshots = snapshots.dropna(subset=['product_key'])
+    snapshots['retailer'] = snapshots['retailer'].fillna('Unknown')
+    # Within one batch the latest observation of a product wins
+    return (snapshots.sort_values('observed_at', kind='stable')
+            .drop_duplicates(KEY_COLUMNS, keep='last').reset_index(drop=True))
+
+
+def _same(a, b):
+    """Element-wise equality treating NaN == NaN."""
+    return (a == b) | (pd.isna(a) & pd.isna(b))
+
+
+class PriceHistory:
+    """Change-only price snapshots in date-partitioned Parquet files."""
+
+    def __init__(self, directory=DEFAULT_DIR):
+        require_pyarrow()
+        self.directory = Path(directory)
+        self.snapshot_dir = self.directory / 'snapshots'
+        self.latest_path = self.directory / 'latest.parquet'
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    def latest(self):
+        """Current price per (product_key, retailer)."""
+        if not self.latest_path.exists():
+            return pd.DataFrame({c: pd.Series(dtype=object) for c in SNAPSHOT_COLUMNS})
+        return pq.read_table(self.latest_path).to_pandas()
+
+    def record(self, frame, observed_at=None):
+        """Append snapshots for rows whose price/currency changed; returns the number written."""
+        snapshots = snapshot_frame(frame, observed_at)
+        latest = self.latest()
+        merged = snapshots.merge(latest[KEY_COLUMNS + ['price', 'currency', 'observed_at']],
+                                 on=KEY_COLUMNS, how='left', suffixes=('', '_last'), indicator=True)
+        is_new = merged['_merge'] == 'left_only'
+        changed = is_new | ~(_same(merged['price'], merged['price_last'])
+                             & _same(merged['currency'], merged['currency_last']))
+        # Never rewrite history with an observation older than the last snapshot
+        changed &= is_new | (merged['observed_at'] > merged['observed_at_last'])
+        changes = merged[changed].assign(previous_price=merged.loc[changed, 'price_last'])
+        changes = changes[SNAPSHOT_COLUMNS]
+
+        if len(changes):
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            for date, part in changes.groupby(changes['observed_at'].dt.strftime('%Y-%m-%d')):
+                part_dir = self.snapshot_dir / f"date={date}"
+                part_dir.mkdir(exist_ok=True)
+                part = part.sort_values('product_key')
+                self._write(part, part_dir / f"part-{stamp}.parquet")
+
+            keep = latest.merge(changes[KEY_COLUMNS], on=KEY_COLUMNS, how='left', indicator=True)
+            latest = pd.concat([latest[(keep['_merge'] == 'left_only').to_numpy()], changes],
+                               ignore_index=True)
+            tmp_path = self.latest_path.with_name(f".{self.latest_path.name}.tmp")
+            self._write(latest.sort_values('product_key'), tmp_path)
+            os.replace(tmp_path, self.latest_path)
+
+        log.info(f"💾 Price history: {len(changes):,} of {len(snapshots):,} prices changed "
+                 f"({int(is_new.sum()):,} new products)")
+        return len(changes)
+
+    @staticmethod
+    def _write(frame, path):
+        table = pa.Table.from_pandas(frame[SNAPSHOT_COLUMNS], schema=SNAPSHOT_SCHEMA, preserve_index=False)
+        pq.write_table(table, path, row_group_size=64_000)
+
+    def _dates(self):
+        return sorted(p.name.split('=', 1)[1] for p in self.snapshot_dir.glob('date=*') if p.is_dir())
+
+    def as_of(self, product_key, date, retailer=None):
+        """Price of a product (per retailer) as of the end of `date`; empty if unknown by then."""
+        date = pd.Timestamp(date).strftime('%Y-%m-%d')
+        end = pd.Timestamp(date) + pd.Timedelta(days=1)
+        latest = self.latest()
+        mine = latest[latest['product_key'] == product_key]
+        if retailer is not None:
+            mine = mine[mine['retailer'] == retailer]
+        if len(mine) and (mine['observed_at'] < end).all():
+            return mine.reset_index(drop=True)  # nothing changed since - no history read
+
+        wanted = None if retailer is None else {retailer}
+        found = []
+        for day in reversed([d for d in self._dates() if d <= date]):
+            expr = ds.field('product_key') == product_key
+            if retailer is not None:
+                expr &= ds.field('retailer') == retailer
+            part = ds.dataset(self.snapshot_dir / f"date={day}", format='parquet',
+                              schema=SNAPSHOT_SCHEMA).to_table(filter=expr).to_pandas()
+            if wanted is not None:
+                part = part[part['retailer'].isin(wanted)]
+            if len(part):
+                found.append(part.sort_values('observed_at').drop_duplicates('retailer', keep='last'))
+                if wanted is not None:
+                    wanted -= set(part['retailer'])
+                    if not wanted:
+                        break
+        if not found:
+            return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+        result = pd.concat(found, ignore_index=True)
+        # Partitions were read newest-first: the first row per retailer is the answer
+        return result.drop_duplicates('retailer', keep='first').reset_index(drop=True)
+
+    def changes(self, start, end, product_key=None):
+        """All snapshots observed between `start` and `end` (inclusive dates)."""
+        start = pd.Timestamp(start).strftime('%Y-%m-%d')
+        end = pd.Timestamp(end).strftime('%Y-%m-%d')
+        if not any(start <= d <= end for d in self._dates()):
+            return pd.DataFrame(columns=SNAPSHOT_COLUMNS + ['date'])
+        dataset = ds.dataset(self.snapshot_dir, format='parquet', partitioning=PARTITIONING)
+        expr = (ds.field('date') >= start) & (ds.field('date') <= end)
+        if product_key is not None:
+            expr &= ds.field('product_key') == product_key
+        frame = dataset.to_table(filter=expr).to_pandas()
+        return frame.sort_values(['observed_at', 'product_key'], kind='stable').reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Temporal price snapshots')
+    parser.add_argument('--dir', default=DEFAULT_DIR, help='Price history directory')
+    sub = parser.add_subparsers(dest='command', required=True)
+    record = sub.add_parser('record', help='Record prices from a raw or cleaned results file')
+    record.add_argument('input')
+    as_of = sub.add_parser('as-of', help='Price of a product as of a date')
+    as_of.add_argument('product_key')
+    as_of.add_argument('date')
+    as_of.add_argument('--retailer', default=None)
+    changes = sub.add_parser('changes', help='Price changes between two dates')
+    changes.add_argument('start')
+    changes.add_argument('end')
+    changes.add_argument('--product-key', default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    history = PriceHistory(args.dir)
+    if args.command == 'record':
+        history.record(read_table(args.input))
+    elif args.command == 'as-of':
+        print(history.as_of(args.product_key, args.date, args.retailer).to_string(index=False))
+    else:
+        result = history.changes(args.start, args.end, args.product_key)
+        print(f"📈 {len(result):,} price changes between {args.start} and {args.end}")
+        if len(result):
+            print(result.to_string(index=False, max_rows=50))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Persistent Product Index for Incremental Matching
+-------------------------------------------------
+Keeps one row per product seen in the previous matcher run (stable product
+key, normalized text hash, content hash, brand, retailer, category) so the
+next run can tell which products are new, changed, unchanged or gone and
+only score pairs that involve a new or changed product.
+"""
+
+import os
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from url_canonical import amazon_host, url_fingerprint
+
+log = logging.getLogger("file_based_matcher")
+
+INDEX_COLUMNS = [
+    'product_key', 'text_hash', 'content_hash',
+    'brand_clean', 'retailer_clean', 'category_clean', 'last_seen'
+]
+
+# Fields copied into match records - a change in any of them invalidates old matches
+CONTENT_COLUMNS = [
+    'product_id', 'product_name', 'brand_name', 'brand_clean',
+    'size_value', 'size_unit', 'price', 'currency'
+]
+
+
+def _hash(*parts):
+    payload = "\x00".join('' if pd.isna(p) else str(p) for p in parts)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def assign_product_keys(df):
+    """Add a stable product_key column.
+
+    Rows with a product URL are keyed by category + URL fingerprint (so a
+    retitled listing keeps its key); others by category + retailer +
+    normalized title. Repeated listings get an occurrence suffix so every
+    row keeps a unique key.
+    """
+    url_col = next((c for c in ('url', 'retailer_url') if c in df.columns), None)
+    urls = df[url_col] if url_col else [None] * len(df)
+    hosts = df['amazon_domain'].map(amazon_host) if 'amazon_domain' in df.columns else [None] * len(df)
+    base = []
+    for c, r, p, url, host in zip(df['category_clean'], df['retailer_clean'], df['product_clean'], urls, hosts):
+        fingerprint = url_fingerprint(url, default_host=host)
+        base.append(_hash(c, 'url', fingerprint) if fingerprint else _hash(c, r, p))
+    occurrence = pd.Series(base, index=df.index).groupby(base).cumcount()
+    df['product_key'] = [f"{b}-{n}" if n else b for b, n in zip(base, occurrence)]
+    return df
+
+
+def content_hashes(df):
+    """Hash of the fields a match record copies from the product row."""
+    columns = [c for c in CONTENT_COLUMNS if c in df.columns]
+    return [_hash(*values) for values in zip(*(df[c] for c in columns))]
+
+
+class ProductIndex:
+    """CSV-backed product index from the previous matcher run."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.previous = {}  # product_key -> content_hash
+
+        if self.path.exists():
+            prev = pd.read_csv(self.path, dtype=str, keep_default_na=False)
+            self.previous = dict(zip(prev['product_key'], prev['content_hash']))
+            log.info(f"Loaded product index: {len(self.previous):,} products ({self.path})")
+
+    def classify(self, df):
+        """Split current product keys into new, changed, unchanged and removed sets."""
+        current = dict(zip(df['product_key'], content_hashes(df)))
+
+        new = {k for k in current if k not in self.previous}
+        changed = {k for k, h in current.items() if k in self.previous and self.previous[k] != h}
+        unchanged = set(current) - new - changed
+        removed = set(self.previous) - set(current)
+        return new, changed, unchanged, removed
+
+    def save(self, df):
+        """Write the index for the products of this run (atomic replace)."""
+        index = pd.DataFrame({
+            'product_key': df['product_key'],
+            'text_hash': [_hash(t) for t in df['product_clean']],
+            'content_hash': content_hashes(df),
+            'brand_clean': df['brand_clean'],
+            'retailer_clean': df['retailer_clean'],
+            'category_clean': df['category_clean'],
+            'last_seen': datetime.now().strftime('%Y-%m-%d'),
+        }, columns=INDEX_COLUMNS)
+
+        tmp_path = self.path.with_suffix('.tmp')
+        index.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+        log.info(f"Saved product index: {len(index):,} products ({self.path})")
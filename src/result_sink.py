@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Streaming Result Sinks
+----------------------
+Chunked CSV/Parquet writers for matcher output. Match records are buffered
+in columnar lists and appended to the archive file in chunks as categories
+finish, summary statistics are accumulated as records arrive, and the
+master file is published from the finished archive by hardlink + atomic
+rename instead of serializing the results a second time.
+"""
+
+import os
+import shutil
+import logging
+from array import array
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from table_io import ParquetChunkWriter, format_of
+
+log = logging.getLogger("file_based_matcher")
+
+
+def publish_file(source, target):
+    """Atomically point `target` at the contents of `source`.
+
+    Uses a hardlink where the filesystem allows it and falls back to a copy;
+    either way the target is swapped in with os.replace so readers never see
+    a partially written master file.
+    """
+    source, target = Path(source), Path(target)
+    tmp_path = target.with_name(f".{target.name}.tmp")
+    if tmp_path.exists():
+        tmp_path.unlink()
+    try:
+        os.link(source, tmp_path)
+    except OSError:
+        shutil.copyfile(source, tmp_path)
+    os.replace(tmp_path, target)
+
+
+class CsvChunkWriter:
+    """Appends DataFrame chunks to one CSV file, writing the header once."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.columns = None
+        self.rows = 0
+        # Start from an empty file so chunks can be appended
+        open(self.path, 'w').close()
+
+    def write(self, frame):
+        if frame is None or len(frame) == 0:
+            return
+        if self.columns is None:
+            self.columns = list(frame.columns)
+            frame.to_csv(self.path, mode='a', index=False, header=True)
+        else:
+            frame.reindex(columns=self.columns).to_csv(self.path, mode='a', index=False, header=False)
+        self.rows += len(frame)
+
+    def close(self):
+        # Match pandas' output for an empty result set
+        if self.columns is None:
+            pd.DataFrame().to_csv(self.path, index=False)
+
+
+def chunk_writer(path, kind=None):
+    """CSV or Parquet chunk writer depending on the path suffix."""
+    if format_of(path) == 'parquet':
+        return ParquetChunkWriter(path, kind)
+    return CsvChunkWriter(path)
+
+
+class MatchStats:
+    """Running summary statistics over match similarities."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.similarities = array('d')
+        self.tiers = Counter()
+        self.perfect = 0
+        self.high_quality = 0
+
+    def add(self, similarity, tier):
+        similarity = float(similarity)
+        self.count += 1
+        self.total += similarity
+        self.similarities.append(similarity)
+        self.tiers[tier] += 1
+        if similarity >= 95:
+            self.perfect += 1
+        if similarity >= 85:
+            self.high_quality += 1
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0
+
+    @property
+    def median(self):
+        if not self.count:
+            return 0
+        return float(np.median(np.frombuffer(self.similarities, dtype=np.float64)))
+
+
+class MatchSink:
+    """Columnar buffer of match records flushed to CSV every `chunk_rows` rows."""
+
+    def __init__(self, path, chunk_rows=5000):
+        self.writer = chunk_writer(path, 'matches')
+        self.chunk_rows = chunk_rows
+        self.columns = None
+        self.buffers = None
+        self.buffered = 0
+        self.stats = MatchStats()
+
+    @property
+    def path(self):
+        return self.writer.path
+
+    def add(self, records):
+        for record in records:
+            if self.columns is None:
+                self.columns = list(record.keys())
+                self.buffers = {c: [] for c in self.columns}
+            for column in self.columns:
+                self.buffers[column].append(record.get(column))
+            self.stats.add(record['similarity'], record.get('confidence_tier'))
+            self.buffered += 1
+            if self.buffered >= self.chunk_rows:
+                self.flush()
+
+    def flush(self):
+        if not self.buffered:
+            return
+        self.writer.write(pd.DataFrame(self.buffers, columns=self.columns))
+        self.buffers = {c: [] for c in self.columns}
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+class UnmatchedSink:
+    """Writes unmatched product rows straight from DataFrame slices."""
+
+    def __init__(self, path):
+        self.writer = chunk_writer(path, 'unmatched')
+
+    @property
+    def path(self):
+        return self.writer.path
+
+    @property
+    def rows(self):
+        return self.writer.rows
+
+    def add(self, frame):
+        self.writer.write(frame)
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Resumable Scrape Checkpoints
+----------------------------
+Each scrape run keeps two append-only files in the checkpoint directory:
+
+- <run>.items.jsonl    one line per scraped result item, appended per page
+- <run>.journal.jsonl  one line per completed (query, page)
+
+A journal line is only written after the page's items are flushed, and it
+records the items file size at that point. A rerun of the same run skips the
+journaled pages and truncates the items file back to the last journaled size,
+so items from a page that was interrupted mid-write are not duplicated.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from result_sink import chunk_writer
+
+log = logging.getLogger(__name__)
+
+
+class ScrapeCheckpoint:
+    """Journal of completed pages plus the items they produced, for one run."""
+
+    def __init__(self, directory, run_name):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.journal_path = self.directory / f"{run_name}.journal.jsonl"
+        self.items_path = self.directory / f"{run_name}.items.jsonl"
+        self.pages = {}  # (query, page) -> journal record
+        self.items_end = 0
+
+        if self.journal_path.exists():
+            journal_end = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # torn last line from an interrupted write
+                    if not line.endswith(b'\n'):
+                        break
+                    journal_end += len(line)
+                    self.pages[(record['query'], record['page'])] = record
+                    self.items_end = max(self.items_end, record['items_end'])
+            if self.journal_path.stat().st_size > journal_end:
+                with open(self.journal_path, 'r+b') as f:
+                    f.truncate(journal_end)
+            log.info(f"Resuming {run_name}: {len(self.pages)} pages already fetched")
+
+        # Drop items written after the last journaled page
+        if self.items_path.exists() and self.items_path.stat().st_size > self.items_end:
+            with open(self.items_path, 'r+b') as f:
+                f.truncate(self.items_end)
+
+    def is_done(self, query, page):
+        return (query, page) in self.pages
+
+    def record(self, result):
+        """Append a completed page's items, then journal it (durably, in that order)."""
+        with open(self.items_path, 'a', encoding='utf-8') as f:
+            for item in result.items:
+                f.write(json.dumps(item, ensure_ascii=False, default=str) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+            self.items_end = f.tell()
+
+        record = {
+            'query': result.query,
+            'page': result.page,
+            'items': len(result.items),
+            'error': result.error,
+            'attempts': result.attempts,
+            'items_end': self.items_end,
+            'completed_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(self.journal_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.pages[(result.query, result.page)] = record
+
+    def page_keys(self, key_fn):
+        """Item keys of every journaled page, {(query, page): [key, ...]}."""
+        keys = {page: [] for page in self.pages}
+        for chunk in self.iter_item_chunks():
+            for item in chunk:
+                page = (item.get('search_query'), item.get('page_number'))
+                if page in keys:
+                    keys[page].append(key_fn(item))
+        return keys
+
+    def items_per_query(self):
+        counts = {}
+        for (query, _), record in self.pages.items():
+            counts[query] = counts.get(query, 0) + record['items']
+        return counts
+
+    @property
+    def item_count(self):
+        return sum(record['items'] for record in self.pages.values())
+
+    def iter_item_chunks(self, chunk_rows=5000):
+        """Scraped items as lists of dicts, `chunk_rows` at a time."""
+        if not self.items_path.exists():
+            return
+        chunk = []
+        with open(self.items_path, encoding='utf-8') as f:
+            for line in f:
+                chunk.append(json.loads(line))
+                if len(chunk) >= chunk_rows:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def write_table(self, path, chunk_rows=5000):
+        """Write all items to a CSV/Parquet results file in chunks (columns in first-seen order)."""
+        columns = {}
+        for chunk in self.iter_item_chunks(chunk_rows):
+            for item in chunk:
+                columns.update(dict.fromkeys(item))
+        writer = chunk_writer(path, 'raw')
+        for chunk in self.iter_item_chunks(chunk_rows):
+            writer.write(pd.DataFrame(chunk, columns=list(columns)))
+        writer.close()
+        return writer.rows
+
+    def clear(self):
+        """Remove the checkpoint files once a run has fully completed."""
+        for path in (self.journal_path, self.items_path):
+            if path.exists():
+                path.unlink()
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Streaming Pipeline
+------------------
+Extract → clean → match with the stages overlapping. Every search query is
+one matching category (category_clean = the normalized search query), so a
+category's input is complete as soon as its queries stop paging. Each
+completed category flows through bounded queues:
+
+    scraper (event loop) --raw queue--> cleaning thread --clean queue--> matching thread
+
+When a queue is full the scraper stops pulling pages until the downstream
+stage catches up (backpressure), so memory stays bounded by the queue sizes.
+The Sentence-BERT model loads while the first pages are fetched. End-to-end
+latency is the extraction time plus cleaning and matching of the last
+category, instead of the sum of the three stages.
+
+Outputs are the same files as the batch stages: the raw results file
+(data/raw), cleaned_data.{csv,parquet} and the processed_matches /
+unmatched_products master files (data/processed), so the warehouse loader
+runs unchanged afterwards.
+
+    python src/streaming_pipeline.py --queue-size 2 --blocking brand,size
+"""
+
+import sys
+import time
+import asyncio
+import logging
+
+import pandas as pd
+
+from cleandata_script import CleaningStats, clean_products, cleaned_output_paths, get_brand_dictionary
+from deduplication_manager import DeduplicationManager
+from file_based_enhanced_matcher import add_matching_arguments, matcher_from_args
+from oxylabs_client import load_scrape_config
+from oxylabs_googleshopping_script import build_parser, finish_run, make_pagers, open_checkpoint, scrape
+from result_sink import chunk_writer, publish_file
+
+log = logging.getLogger(__name__)
+
+
+def items_frame(items):
+    """Scraped items as a frame, nested values stringified as in the raw results file."""
+    frame = pd.DataFrame(items)
+    for column in frame.columns:
+        if frame[column].dtype == object:
+            frame[column] = frame[column].map(lambda v: str(v) if isinstance(v, (dict, list)) else v)
+    return frame
+
+
+class StreamingPipeline:
+    """Runs scraping, cleaning and per-category matching concurrently over bounded queues."""
+
+    def __init__(self, config, args, checkpoint, pagers, matcher, dedup=None, queue_size=2):
+        self.config = config
+        self.args = args
+        self.checkpoint = checkpoint
+        self.pagers = pagers
+        self.matcher = matcher
+        self.dedup = dedup
+        self.queue_size = queue_size
+
+        # category -> queries still being scraped, and the items of its finished pages
+        self.pending = {}
+        for query in config['queries']:
+            self.pending.setdefault(self.category_of(query), set()).add(query)
+        self.items = {category: [] for category in self.pending}
+
+        self.cleaned_path, self.cleaned_master = cleaned_output_paths(args.format)
+        self.cleaning_stats = CleaningStats()
+        self.products = 0
+        self.timeline = {}  # category -> {'scraped': s, 'cleaned': s, 'matched': s}
+        self.start = None
+
+    def category_of(self, query):
+        return self.matcher.normalize_text(str(query).lower())
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def preload_checkpoint(self):
+        """Items of pages fetched by an interrupted earlier run (they are not re-yielded)."""
+        for chunk in self.checkpoint.iter_item_chunks():
+            for item in chunk:
+                category = self.category_of(item.get('search_query'))
+                if category in self.items:
+                    self.items[category].append(item)
+
+    def on_page(self, result):
+        self.items[self.category_of(result.query)].extend(result.items)
+
+    async def on_query_done(self, pager):
+        """Hand a category to cleaning once all of its queries are done (waits when the queue is full)."""
+        category = self.category_of(pager.query)
+        self.pending[category].discard(pager.query)
+        if self.pending[category]:
+            return
+        items = self.items.pop(category)
+        self.timeline[category] = {'scraped': self.elapsed()}
+        log.info(f"📬 Category '{category}' scraped: {len(items)} items")
+        if items:
+            await self.raw_queue.put((category, items_frame(items)))
+
+    # --- cleaning thread ---
+
+    def clean(self, frame):
+        cleaned = clean_products(frame)
+        self.cleaned_writer.write(cleaned)
+        self.cleaning_stats.add(cleaned)
+        return cleaned
+
+    async def clean_worker(self):
+        while True:
+            job = await self.raw_queue.get()
+            if job is None:
+                await self.clean_queue.put(None)
+                return
+            category, frame = job
+            cleaned = await asyncio.to_thread(self.clean, frame)
+            self.timeline[category]['cleaned'] = self.elapsed()
+            await self.clean_queue.put((category, cleaned))
+
+    # --- matching thread ---
+
+    def match(self, cleaned):
+        # Global row positions keep the generated product IDs unique across categories
+        cleaned.index = pd.RangeIndex(self.products, self.products + len(cleaned))
+        products = self.matcher.prepare_products(cleaned)
+        self.matcher.match_products(products, sinks=self.sinks)
+        self.products += len(products)
+
+    async def match_worker(self, model_ready):
+        await model_ready
+        while True:
+            job = await self.clean_queue.get()
+            if job is None:
+                return
+            category, cleaned = job
+            await asyncio.to_thread(self.match, cleaned)
+            self.timeline[category]['matched'] = self.elapsed()
+            log.info(f"🧩 Category '{category}' matched at {self.elapsed():.1f}s")
+
+    async def run(self):
+        """Scrape with cleaning and matching running behind; returns (failed pages, new per query)."""
+        self.start = time.perf_counter()
+        self.raw_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.clean_queue = asyncio.Queue(maxsize=self.queue_size)
+        self.cleaned_writer = chunk_writer(self.cleaned_path, 'cleaned')
+        self.sinks = self.matcher.open_result_sinks()
+        get_brand_dictionary()  # build once before the cleaning thread uses it
+        self.preload_checkpoint()
+
+        model_ready = asyncio.ensure_future(asyncio.to_thread(self.matcher.load_sentence_transformer))
+        tasks = [asyncio.ensure_future(self.produce()),
+                 asyncio.ensure_future(self.clean_worker()),
+                 asyncio.ensure_future(self.match_worker(model_ready))]
+        try:
+            # A failing stage fails the run instead of leaving the others blocked on a full queue
+            results = await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return results[0]
+
+    async def produce(self):
+        result = await scrape(self.config, self.args, self.checkpoint, self.pagers, self.dedup,
+                              on_page=self.on_page, on_query_done=self.on_query_done)
+        self.scrape_seconds = self.elapsed()
+        await self.raw_queue.put(None)
+        return result
+
+    def finish(self, raw_file):
+        """Publish the cleaned and matched outputs like the batch stages do."""
+        self.cleaned_writer.close()
+        publish_file(self.cleaned_path, self.cleaned_master)
+        log.info(f"✅ Cleaned data saved to: {self.cleaned_master}")
+        self.cleaning_stats.log_summary()
+
+        if self.matcher.embedding_store is not None:
+            self.matcher.embedding_store.flush()
+        products = pd.RangeIndex(self.products)  # only its length is used for the summary
+        return self.matcher.finalize_results(self.sinks, products, raw_file)
+
+    def report(self):
+        print("\n⏱️  Streaming timeline (seconds since start):")
+        print(f"  {'category':<28} {'scraped':>8} {'cleaned':>8} {'matched':>8}")
+        for category, times in self.timeline.items():
+            cols = [f"{times[k]:>8.1f}" if k in times else f"{'-':>8}" for k in ('scraped', 'cleaned', 'matched')]
+            print(f"  {category:<28} {' '.join(cols)}")
+        total = self.elapsed()
+        print(f"  Extraction done at {self.scrape_seconds:.1f}s, everything matched at {total:.1f}s "
+              f"({total - self.scrape_seconds:.1f}s after extraction)")
+
+
+def main(argv=None):
+    parser = build_parser('Scrape, clean and match in one streaming pass')
+    add_matching_arguments(parser)
+    parser.add_argument('--processed-dir', default='data/processed',
+                        help='Where the match results are written')
+    parser.add_argument('--queue-size', type=int, default=2,
+                        help='Categories buffered between stages before scraping waits')
+    args = parser.parse_args(argv)
+
+    config = load_scrape_config(args.config)
+    checkpoint = open_checkpoint(args)
+    pagers = make_pagers(config, args)
+    matcher = matcher_from_args(args, args.processed_dir)
+    dedup = None if args.no_dedup else DeduplicationManager(args.dedup_db)
+    pipeline = StreamingPipeline(config, args, checkpoint, pagers, matcher, dedup, args.queue_size)
+    try:
+        failed, new_per_query = asyncio.run(pipeline.run())
+    finally:
+        if dedup is not None:
+            dedup.close()
+
+    raw_file = finish_run(args, checkpoint, pagers, dedup, failed, new_per_query, pipeline.scrape_seconds)
+    results = pipeline.finish(raw_file)
+    pipeline.report()
+
+    print(f"\n✅ Results saved:")
+    print(f"  📊 Matches: {results['matches_file']}")
+    print(f"  ⚠️  Unmatched: {results['unmatched_file']}")
+    print(f"  📋 Summary: {results['summary_file']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Pipeline Table I/O
+------------------
+Reads and writes the tables passed between pipeline stages (raw, cleaned,
+matches, unmatched) as CSV or Parquet, chosen by file suffix. Parquet files
+are written with explicit Arrow schemas for the known columns and read with
+column projection and memory mapping; CSV stays available for Excel users.
+
+The default format for new outputs comes from the PIPELINE_FORMAT
+environment variable ("csv" or "parquet").
+"""
+
+import os
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for Parquet
+    pa = None
+    pq = None
+
+log = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'parquet')
+SUFFIXES = {'csv': '.csv', 'parquet': '.parquet'}
+
+
+def default_format():
+    """Output format from PIPELINE_FORMAT (defaults to csv)."""
+    fmt = os.getenv('PIPELINE_FORMAT', 'csv').strip().lower()
+    return fmt if fmt in FORMATS else 'csv'
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("Parquet support needs pyarrow: pip install pyarrow")
+
+
+def with_format(path, fmt):
+    """Swap a path's suffix for the given format."""
+    return Path(path).with_suffix(SUFFIXES[fmt])
+
+
+def format_of(path):
+    return 'parquet' if Path(path).suffix.lower() == '.parquet' else 'csv'
+
+
+def latest_existing(path):
+    """Newest existing variant of path among its CSV/Parquet siblings (or None)."""
+    candidates = [with_format(path, fmt) for fmt in FORMATS]
+    candidates = [p for p in candidates if p.exists()]
+    return max(candidates, key=lambda p: p.stat().st_mtime) if candidates else None
+
+
+# === SCHEMAS ===
+# Explicit types for the columns each stage produces. Columns not listed are
+# written as strings (object columns) or with their pandas dtype.
+
+def _schema(fields):
+    return dict(fields)
+
+
+if pa is not None:
+    RAW_FIELDS = _schema([
+        ('pos', pa.int64()), ('url', pa.string()), ('title', pa.string()),
+        ('price', pa.float64()), ('currency', pa.string()), ('merchant', pa.string()),
+        ('product_id', pa.string()), ('thumbnail', pa.string()),
+        ('search_query', pa.string()), ('page_number', pa.int64()), ('timestamp', pa.string()),
+    ])
+
+    CLEANED_FIELDS = _schema(list(RAW_FIELDS.items()) + [
+        ('brand_clean', pa.string()), ('pack_qty', pa.float64()), ('size_value', pa.float64()),
+        ('size_unit', pa.string()), ('total_size', pa.float64()),
+        ('product_clean', pa.string()), ('category_clean', pa.string()),
+    ])
+
+    MATCHES_FIELDS = _schema([
+        ('product_1_id', pa.string()), ('product_2_id', pa.string()),
+        ('product_1_name', pa.string()), ('product_2_name', pa.string()),
+        ('brand_1', pa.string()), ('brand_2', pa.string()), ('category', pa.string()),
+        ('size_value_1', pa.float64()), ('size_unit_1', pa.string()),
+        ('size_value_2', pa.float64()), ('size_unit_2', pa.string()),
+        ('price_1', pa.float64()), ('price_2', pa.float64()),
+        ('currency_1', pa.string()), ('currency_2', pa.string()),
+        ('retailer_1', pa.string()), ('retailer_2', pa.string()),
+        ('similarity', pa.float64()), ('hybrid_name_similarity', pa.float64()),
+        ('lexical_similarity', pa.float64()), ('semantic_similarity', pa.float64()),
+        ('brand_similarity', pa.float64()), ('size_similarity', pa.float64()),
+        ('match_source', pa.string()), ('processing_date', pa.date32()),
+        ('engine_version', pa.string()), ('confidence_tier', pa.string()),
+        ('match_rank', pa.int64()),
+        ('product_1_key', pa.string()), ('product_2_key', pa.string()),
+    ])
+
+    UNMATCHED_FIELDS = _schema([
+        ('product_id', pa.string()), ('product_name', pa.string()),
+        ('category_name', pa.string()), ('retailer_name', pa.string()),
+        ('size_value', pa.float64()), ('size_unit', pa.string()),
+        ('price', pa.float64()), ('currency', pa.string()),
+        ('product_clean', pa.string()), ('brand_clean', pa.string()),
+        ('category_clean', pa.string()), ('retailer_clean', pa.string()),
+        ('product_key', pa.string()), ('reason_unmatched', pa.string()),
+    ])
+else:
+    RAW_FIELDS = CLEANED_FIELDS = MATCHES_FIELDS = UNMATCHED_FIELDS = {}
+
+SCHEMAS = {
+    'raw': RAW_FIELDS,
+    'cleaned': CLEANED_FIELDS,
+    'matches': MATCHES_FIELDS,
+    'unmatched': UNMATCHED_FIELDS,
+}
+
+
+def _as_strings(series):
+    return pa.array([None if (v is None or (isinstance(v, float) and np.isnan(v))) else str(v)
+                     for v in series], type=pa.string())
+
+
+def _column_to_arrow(series, arrow_type):
+    if arrow_type is None:
+        if series.dtype == object:
+            return _as_strings(series)
+        return pa.array(series, from_pandas=True)
+    if pa.types.is_string(arrow_type):
+        return _as_strings(series)
+    if pa.types.is_date(arrow_type):
+        dates = pd.to_datetime(series, errors='coerce')
+        return pa.array(dates.dt.date, type=arrow_type, from_pandas=True)
+    if pa.types.is_integer(arrow_type):
+        values = pd.to_numeric(series, errors='coerce')
+        if (values.dropna() % 1 == 0).all():
+            return pa.array(values.astype('Int64'), type=arrow_type, from_pandas=True)
+        return pa.array(values, type=pa.float64(), from_pandas=True)
+    return pa.array(pd.to_numeric(series, errors='coerce'), type=arrow_type, from_pandas=True)
+
+
+def to_arrow(frame, kind=None):
+    """Convert a DataFrame to an Arrow table using the stage schema for known columns."""
+    require_pyarrow()
+    fields = SCHEMAS.get(kind, {})
+    arrays = [_column_to_arrow(frame[c], fields.get(c)) for c in frame.columns]
+    return pa.Table.from_arrays(arrays, names=[str(c) for c in frame.columns])
+
+
+def write_table(frame, path, kind=None):
+    """Write a DataFrame as CSV or Parquet depending on the path suffix."""
+    path = Path(path)
+    if format_of(path) == 'parquet':
+        pq.write_table(to_arrow(frame, kind), path)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def read_table(path, columns=None, **csv_kwargs):
+    """Read a CSV or Parquet table, optionally projecting to `columns`.
+
+    Parquet is read through a memory map and only the requested columns are
+    decoded; for CSV, `columns` becomes `usecols`.
+    """
+    path = Path(path)
+    if format_of(path) == 'parquet':
+        require_pyarrow()
+        table = pq.read_table(path, columns=columns, memory_map=True)
+        return table.to_pandas()
+    if columns is not None:
+        csv_kwargs['usecols'] = columns
+    frame = pd.read_csv(path, **csv_kwargs)
+    return frame[columns] if columns is not None else frame
+
+
+def iter_table(path, chunksize, columns=None):
+    """Yield a CSV or Parquet table as DataFrames of at most `chunksize` rows."""
+    path = Path(path)
+    if format_of(path) == 'parquet':
+        require_pyarrow()
+        parquet = pq.ParquetFile(path, memory_map=True)
+        for batch in parquet.iter_batches(batch_size=chunksize, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunksize, usecols=columns)
+
+
+def read_columns(path):
+    """Column names of a table without reading its rows."""
+    path = Path(path)
+    if format_of(path) == 'parquet':
+        require_pyarrow()
+        return pq.read_schema(path).names
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+class ParquetChunkWriter:
+    """Appends DataFrame chunks to one Parquet file as row groups."""
+
+    def __init__(self, path, kind=None):
+        require_pyarrow()
+        self.path = Path(path)
+        self.kind = kind
+        self.columns = None
+        self.rows = 0
+        self._writer = None
+
+    def write(self, frame):
+        if frame is None or len(frame) == 0:
+            return
+        if self.columns is None:
+            self.columns = list(frame.columns)
+        table = to_arrow(frame.reindex(columns=self.columns), self.kind)
+        if self._writer is None:
+            self._writer = pq.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self._writer.schema)
+        self._writer.write_table(table)
+        self.rows += len(frame)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        elif not self.path.exists():
+            pq.write_table(pa.table({}), self.path)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+URL Canonicalization
+--------------------
+Reduces product URLs to one canonical form so the same listing reached
+through different tracking links gets the same key:
+
+- scheme and host are normalized (https, no www., no default port,
+  lowercase), fragments and trailing slashes dropped
+- tracking parameters (utm_*, gclid, srsltid, ref=, ...) are removed
+  everywhere; anything else is kept, sorted
+- Amazon URLs collapse to amazon.<tld>/dp/<ASIN>; other Amazon pages also
+  lose their search-context parameters (sr, keywords, qid, th, ...)
+- Shopify /collections/x/products/<slug> URLs collapse to /products/<slug>
+  without the ?variant= selection
+- eBay /itm/<id>, Etsy /listing/<id> and Google Shopping
+  /shopping/product/<id> keep only the ID
+
+Paths and query values are only lowercased on retailers whose URLs are
+case-insensitive (Amazon, eBay, Etsy, Google, Shopify product slugs); other
+sites may key products on case or on generic parameters, so those are kept.
+
+url_fingerprint() hashes the canonical form to a compact 64- or 128-bit key.
+"""
+
+import re
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = {
+    # analytics / ad click IDs
+    'gclid', 'gclsrc', 'dclid', 'fbclid', 'msclkid', 'srsltid', 'mc_cid', 'mc_eid',
+    '_ga', '_gl', 'igshid', 'yclid',
+    # referrers and shopping-ad context
+    'ref', 'ref_', 'sei', 'spartner', 'channable', 'stkn', 'affil', 'gpla', 'gao', 'exta', 'extac',
+    # eBay tracking
+    'chn', '_ul', 'mkevt', 'mkcid', 'mkrid', 'campid', 'customid', 'toolid',
+    'google_free_listing_action',
+    # localisation that doesn't change the product
+    'country', 'currency', 'language', 'switchcurrency', 'shippingcountry', 'hl', 'gl',
+}
+# Search context on Amazon pages - generic names other sites may use as product keys
+AMAZON_PARAMS = {'source', 'dib', 'dib_tag', 'qid', 'sr', 'keywords', 'crid', 'sprefix', 'psc', 'smid',
+                 'th', 'ac', 'number'}
+# Shopify variant selection - the listing is the product page
+SHOPIFY_PARAMS = {'variant'}
+TRACKING_PREFIXES = ('utm_', 'pk_', 'mtm_')
+
+AMAZON_ASIN = re.compile(r'/(?:dp|gp/product|gp/aw/d|exec/obidos/asin|o/asin)/([a-z0-9]{10})(?:[/?]|$)',
+                         re.IGNORECASE)
+AMAZON_HOST = re.compile(r'(?:^|\.)amazon\.([a-z.]+)$')
+SHOPIFY_PRODUCT = re.compile(r'^(?:/[a-z]{2}(?:-[a-z]{2})?)?(?:/collections/[^/]+)?(/products/[^/]+)',
+                             re.IGNORECASE)
+EBAY_ITEM = re.compile(r'/itm/(?:[^/]+/)?(\d+)')
+ETSY_LISTING = re.compile(r'^(?:/[a-z]{2}(?:-[a-z]{2})?)?/listing/(\d+)')
+GOOGLE_PRODUCT = re.compile(r'^/shopping/product/(\d+)')
+AMAZON_REF = re.compile(r'/ref=[^/]*$')
+CASE_INSENSITIVE_HOST = re.compile(r'(?:^|\.)(?:amazon|ebay|etsy|google)\.[a-z.]+$')
+
+
+def _host(netloc):
+    host = netloc.lower().rsplit('@', 1)[-1]
+    for port in (':80', ':443'):
+        if host.endswith(port):
+            host = host[:-len(port)]
+    return host[4:] if host.startswith('www.') else host
+
+
+def amazon_host(domain):
+    """Host for an Amazon export's `amazon_domain` ('co.uk', 'amazon.co.uk', ...), or None."""
+    if not isinstance(domain, str) or not domain.strip():
+        return None
+    host = _host(domain.strip())
+    return host if host.startswith('amazon.') else f"amazon.{host}"
+
+
+def canonicalize_url(url, default_host=None):
+    """Canonical form of a product URL, or None for missing/empty values.
+
+    Relative URLs (e.g. '/Some-Product/dp/B08285QVPD/ref=...') are resolved
+    against `default_host` when given.
+    """
+    if url is None or not isinstance(url, str) or not url.strip():
+        return None
+    url = url.strip()
+    if url.startswith('//'):
+        url = 'https:' + url
+    elif url.startswith('/') and default_host:
+        url = f"https://{default_host}{url}"
+    elif '://' not in url:
+        if url.startswith('/') or '.' not in url.split('/', 1)[0]:
+            return None  # relative without a host, or not a URL at all ('nan')
+        url = 'https://' + url
+
+    parts = urlsplit(url)
+    host = _host(parts.netloc)
+    path = re.sub(r'/{2,}', '/', parts.path)
+    fold_case = bool(CASE_INSENSITIVE_HOST.search(host))
+    if fold_case:
+        path = path.lower()
+    dropped = set(TRACKING_PARAMS)
+
+    amazon = AMAZON_HOST.search(host)
+    if amazon:
+        asin = AMAZON_ASIN.search(path + '/')
+        if asin:
+            return f"https://amazon.{amazon.group(1)}/dp/{asin.group(1)}"
+        path = AMAZON_REF.sub('', path)
+        dropped |= AMAZON_PARAMS
+
+    google = GOOGLE_PRODUCT.match(path)
+    if google and host.startswith('google.'):
+        return f"https://{host}/shopping/product/{google.group(1)}"
+
+    ebay = EBAY_ITEM.search(path)
+    if ebay and host.startswith('ebay.'):
+        return f"https://{host}/itm/{ebay.group(1)}"
+
+    etsy = ETSY_LISTING.match(path)
+    if etsy and host.startswith('etsy.'):
+        return f"https://{host}/listing/{etsy.group(1)}"
+
+    shopify = SHOPIFY_PRODUCT.match(path)
+    if shopify:
+        path = shopify.group(1).lower()  # Shopify product handles are lowercase
+        dropped |= SHOPIFY_PARAMS
+
+    path = path.rstrip('/')
+    query = sorted((k, v.lower() if fold_case else v)
+                   for k, v in parse_qsl(parts.query, keep_blank_values=False)
+                   if k.lower() not in dropped and not k.lower().startswith(TRACKING_PREFIXES))
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+
+def url_fingerprint(url, bits=64, default_host=None):
+    """Hex fingerprint (16 or 32 chars) of a URL's canonical form, or None."""
+    if bits not in (64, 128):
+        raise ValueError("bits must be 64 or 128")
+    canonical = canonicalize_url(url, default_host)
+    if canonical is None:
+        return None
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=bits // 8).hexdigest()
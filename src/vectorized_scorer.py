@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Vectorized Category Scoring
+---------------------------
+Matrix-based scoring engine for one category block. The hybrid score of
+every upper-triangle pair is computed at once per row tile:
+
+- semantic: one product of the L2-normalized embedding matrix
+- Jaccard: sparse token-incidence matrix product (intersection / union)
+- RapidFuzz: process.cdist(token_set_ratio) over all workers
+- brand bonus/penalty and same-retailer exclusion as NumPy boolean masks
+
+Cells that clear MIN_SIMILARITY (minus a float32 rounding margin) are then
+turned into match records by FileBasedMatcher.score_pair, so the output is
+identical to the pairwise engine.
+"""
+
+import logging
+
+import numpy as np
+from rapidfuzz import fuzz, process
+from scipy import sparse
+
+log = logging.getLogger("file_based_matcher")
+
+
+class VectorizedScorer:
+    """Computes hybrid-score matrices for a category group in row tiles."""
+
+    def __init__(self, matcher, row_block=512, margin=1e-3, workers=-1):
+        self.matcher = matcher
+        self.row_block = row_block
+        self.margin = margin
+        self.workers = workers
+
+    @staticmethod
+    def _token_incidence(texts):
+        """Binary CSR matrix of (text, token) presence plus per-text token counts."""
+        vocab = {}
+        indptr, indices = [0], []
+        for text in texts:
+            for token in set(text.split()):
+                indices.append(vocab.setdefault(token, len(vocab)))
+            indptr.append(len(indices))
+        data = np.ones(len(indices), dtype=np.int32)
+        incidence = sparse.csr_matrix((data, indices, indptr), shape=(len(texts), max(len(vocab), 1)))
+        sizes = np.diff(incidence.indptr)
+        return incidence, sizes
+
+    def score_block(self, texts, embeddings, incidence, sizes, brands, retailers, start, stop):
+        """Final similarity for rows [start, stop) against columns [start, n).
+
+        Cells outside the upper triangle or within the same retailer are -1;
+        returns None when the tile has no comparable cell at all.
+        """
+        m = self.matcher
+        n = len(texts)
+
+        # Only the upper triangle (i < j) across different retailers is a candidate
+        valid = retailers[start:stop, None] != retailers[None, start:]
+        valid &= np.arange(start, stop)[:, None] < np.arange(start, n)[None, :]
+        if not valid.any():
+            return None
+
+        fuzz_scores = process.cdist(texts[start:stop], texts[start:], scorer=fuzz.token_set_ratio,
+                                    dtype=np.float64, workers=self.workers)
+
+        intersection = (incidence[start:stop] @ incidence[start:].T).toarray().astype(np.float64)
+        union = sizes[start:stop, None] + sizes[None, start:] - intersection
+        both_nonempty = (sizes[start:stop, None] > 0) & (sizes[None, start:] > 0)
+        jaccard = np.zeros_like(intersection)
+        np.divide(intersection, union, out=jaccard, where=both_nonempty & (union > 0))
+        jaccard *= 100
+
+        lexical = (fuzz_scores + jaccard) / 2
+        semantic = (embeddings[start:stop] @ embeddings[start:].T).astype(np.float64) * 100
+        hybrid = m.LEXICAL_WEIGHT * lexical + m.SEMANTIC_WEIGHT * semantic
+
+        brand_rows = brands[start:stop, None]
+        brand_cols = brands[None, start:]
+        same_brand = brand_rows == brand_cols
+        has_brand_row = brand_rows != ''
+        has_brand_col = brand_cols != ''
+        bonus = np.where(same_brand & has_brand_row, 15,
+                         np.where(~same_brand & has_brand_row & has_brand_col, -10, 0))
+
+        final = np.clip(hybrid + bonus, 0, 100)
+        final[~valid] = -1
+        return final
+
+    def passing_pairs(self, group, row_start=0, row_stop=None):
+        """Row-major (i, j) pairs whose vectorized score is within margin of the threshold.
+
+        Only rows i in [row_start, row_stop) are scored.
+        """
+        n = len(group)
+        row_stop = n if row_stop is None else min(row_stop, n)
+        if n < 2 or row_stop <= row_start:
+            return []
+
+        texts = [t if isinstance(t, str) else '' for t in group['product_clean'].tolist()]
+        embeddings = self.matcher.embed_texts(texts)
+        incidence, sizes = self._token_incidence(texts)
+        brands = np.array([b if isinstance(b, str) else '' for b in group['brand_clean']], dtype=object)
+        retailers = np.array(group['retailer_clean'].tolist(), dtype=object)
+
+        threshold = self.matcher.MIN_SIMILARITY - self.margin
+        pairs = []
+        for start in range(row_start, row_stop, self.row_block):
+            stop = min(start + self.row_block, row_stop)
+            final = self.score_block(texts, embeddings, incidence, sizes, brands, retailers, start, stop)
+            if final is None:
+                continue
+            rows, cols = np.nonzero(final >= threshold)
+            pairs.extend(zip((rows + start).tolist(), (cols + start).tolist()))
+        return pairs
@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Warehouse Bulk I/O
+------------------
+Bulk loading of pipeline tables into PostgreSQL. Rows are streamed through
+`COPY ... FROM STDIN` as CSV in chunks (one round-trip per chunk instead of
+per row); when COPY isn't available the rows go in as multi-row INSERTs via
+psycopg2's execute_values. Each load logs its throughput in rows/sec.
+
+upsert_frame() loads incrementally: the file is staged in a per-transaction
+temporary table and merged into the target by natural key in the caller's
+transaction. upsert_versions() does the same for tables that keep history:
+changed rows get a new version and the old one is retired, not deleted.
+
+Range-partitioned tables get monthly partitions on demand
+(ensure_month_partitions) and old months are detached for archival
+(detach_partitions_before).
+
+Connection settings come from the DB_* environment variables (see
+env.example).
+"""
+
+import io
+import os
+import re
+import time
+import hashlib
+import logging
+
+import numpy as np
+import pandas as pd
+import psycopg2
+from psycopg2 import extras, sql
+
+log = logging.getLogger(__name__)
+
+COPY_CHUNK_ROWS = 50_000
+VALUES_PAGE_SIZE = 1_000
+METHODS = ('copy', 'values')
+# pg_get_expr() of a range partition bound
+_RANGE_BOUND = re.compile(r"FOR VALUES FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+def db_config():
+    """psycopg2 connection kwargs from DB_HOST / DB_PORT / DB_NAME / DB_USER / DB_PASSWORD."""
+    config = {
+        'dbname': os.getenv('DB_NAME', 'aue_warehouse'),
+        'user': os.getenv('DB_USER', 'mahnoorbhatti'),
+        'host': os.getenv('DB_HOST', 'localhost'),
+        'port': int(os.getenv('DB_PORT', '5432')),
+    }
+    if os.getenv('DB_PASSWORD'):
+        config['password'] = os.getenv('DB_PASSWORD')
+    return config
+
+
+def connect(config=None):
+    return psycopg2.connect(**(config or db_config()))
+
+
+def qualified(table):
+    """sql.Identifier for 'schema.table' or 'table'."""
+    return sql.Identifier(*table.split('.'))
+
+
+def _prepare(frame, columns):
+    """Project to `columns`, turning integral float columns (NaN-widened ints) back into ints."""
+    frame = frame.reindex(columns=columns)
+    for column in frame.columns:
+        values = frame[column]
+        if values.dtype.kind == 'f':
+            finite = values.dropna()
+            if len(finite) and np.all(np.mod(finite, 1) == 0):
+                frame[column] = values.astype('Int64')
+    return frame
+
+
+def copy_frame(cursor, frame, table, columns, chunk_rows=COPY_CHUNK_ROWS):
+    """Stream a DataFrame into `table` with COPY FROM STDIN (CSV, empty = NULL)."""
+    statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+        qualified(table), sql.SQL(', ').join(map(sql.Identifier, columns)))
+    statement = statement.as_string(cursor)
+    frame = _prepare(frame, columns)
+    for start in range(0, len(frame), chunk_rows):
+        buffer = io.StringIO()
+        frame.iloc[start:start + chunk_rows].to_csv(buffer, header=False, index=False)
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+
+
+def insert_values(cursor, frame, table, columns, page_size=VALUES_PAGE_SIZE):
+    """Insert a DataFrame with multi-row INSERT pages (execute_values)."""
+    statement = sql.SQL("INSERT INTO {} ({}) VALUES %s").format(
+        qualified(table), sql.SQL(', ').join(map(sql.Identifier, columns)))
+    frame = _prepare(frame, columns).astype(object)
+    records = frame.where(pd.notna(frame), None).values.tolist()
+    extras.execute_values(cursor, statement.as_string(cursor), records, page_size=page_size)
+
+
+def bulk_insert(conn, frame, table, columns, method='copy'):
+    """Load rows into `table` (COPY, falling back to execute_values); returns rows loaded.
+
+    Runs inside the caller's transaction; a failed COPY is rolled back to a
+    savepoint before the fallback so the transaction stays usable.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}")
+    start = time.perf_counter()
+    with conn.cursor() as cursor:
+        if method == 'copy':
+            cursor.execute("SAVEPOINT bulk_copy")
+            try:
+                copy_frame(cursor, frame, table, columns)
+                cursor.execute("RELEASE SAVEPOINT bulk_copy")
+            except (psycopg2.NotSupportedError, psycopg2.ProgrammingError) as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_copy")
+                log.warning(f"  ⚠️  COPY failed ({str(e).strip()[:80]}), falling back to execute_values")
+                method = 'values'
+        if method == 'values':
+            insert_values(cursor, frame, table, columns)
+    elapsed = time.perf_counter() - start
+    rate = len(frame) / elapsed if elapsed > 0 else float('inf')
+    log.info(f"  ⚡ {table}: {len(frame):,} rows via {method} in {elapsed:.2f}s ({rate:,.0f} rows/sec)")
+    return len(frame)
+
+
+def natural_keys(frame, columns):
+    """128-bit hex key per row from the values of `columns` (NULLs included)."""
+    rows = zip(*(frame[c] for c in columns))
+    return [hashlib.md5("\x00".join('' if pd.isna(v) else str(v) for v in row).encode('utf-8')).hexdigest()
+            for row in rows]
+
+
+def _stage_frame(conn, frame, table, columns, method):
+    """Bulk-copy `frame` into a temporary table shaped like `table`'s `columns`.
+
+    The table is private to this session and dropped at commit, so
+    concurrent loads never share it. Returns its sql.Identifier.
+    """
+    stage = f"{table.split('.')[-1]}_stage"
+    staging = sql.Identifier(stage)
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA")
+                       .format(staging, sql.SQL(', ').join(map(sql.Identifier, columns)), qualified(table)))
+    bulk_insert(conn, frame, stage, columns, method=method)
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL("ANALYZE {}").format(staging))
+    return staging
+
+
+def _row(alias, columns):
+    """ROW(alias.c1, alias.c2, ...) for comparing a set of columns at once."""
+    return sql.SQL("ROW({})").format(sql.SQL(', ').join(
+        sql.SQL("{}.{}").format(sql.Identifier(alias), sql.Identifier(c)) for c in columns))
+
+
+def upsert_frame(conn, frame, table, columns, key, method='copy', touch_column='import_ts', ignore=()):
+    """Make `table` match `frame` by its natural `key`, touching only the delta.
+
+    `key` is a column or a list of columns. The frame is bulk-copied into a
+    temporary staging table, then rows whose key disappeared are deleted and
+    new or changed rows are applied with INSERT ... ON CONFLICT (key) DO
+    UPDATE. Unchanged rows are not written; columns in `ignore` (run metadata
+    such as a processing date) don't count as a change, but are written along
+    with one. Runs in the caller's transaction; returns (inserted, updated,
+    deleted).
+    """
+    keys = [key] if isinstance(key, str) else list(key)
+    values = [c for c in columns if c not in keys]
+    compared = [c for c in values if c not in ignore and c != touch_column]
+    all_columns = [k for k in keys if k not in columns] + columns
+    target = qualified(table)
+    column_list = sql.SQL(', ').join(map(sql.Identifier, all_columns))
+    key_list = sql.SQL(', ').join(map(sql.Identifier, keys))
+    staging = _stage_frame(conn, frame, table, all_columns, method)
+
+    assignments = [sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in values]
+    if touch_column:
+        assignments.append(sql.SQL("{} = NOW()").format(sql.Identifier(touch_column)))
+    null_key = sql.SQL(' OR ').join(sql.SQL("t.{} IS NULL").format(sql.Identifier(k)) for k in keys)
+    not_null = sql.SQL(' AND ').join(sql.SQL("{} IS NOT NULL").format(sql.Identifier(k)) for k in keys)
+    same_key = sql.SQL(' AND ').join(sql.SQL("s.{0} = t.{0}").format(sql.Identifier(k)) for k in keys)
+
+    with conn.cursor() as cursor:
+        cursor.execute(sql.SQL(
+            "DELETE FROM {target} t WHERE {null_key} "
+            "OR NOT EXISTS (SELECT 1 FROM {staging} s WHERE {same_key})"
+        ).format(target=target, staging=staging, null_key=null_key, same_key=same_key))
+        deleted = cursor.rowcount
+        cursor.execute(sql.SQL(
+            "INSERT INTO {target} AS t ({columns}) "
+            "SELECT DISTINCT ON ({keys}) {columns} FROM {staging} WHERE {not_null} ORDER BY {keys} "
+            "ON CONFLICT ({keys}) DO UPDATE SET {assignments} "
+            "WHERE {current} IS DISTINCT FROM {incoming} "
+            "RETURNING (xmax = 0)"
+        ).format(target=target, columns=column_list, keys=key_list, staging=staging, not_null=not_null,
+                 assignments=sql.SQL(', ').join(assignments),
+                 current=_row('t', compared), incoming=_row('excluded', compared)))
+        flags = [inserted for (inserted,) in cursor.fetchall()]
+        cursor.execute(sql.SQL("DROP TABLE {}").format(staging))
+    inserted = sum(flags)
+    return inserted, len(flags) - inserted, deleted
+
+
+def upsert_versions(conn, frame, table, columns, key, version_column, current_column='is_current',
+                    method='copy', touch_column='import_ts', ignore=()):
+    """Keep a change-only history of `frame` in `table`, one row per version of each `key`.
+
+    The latest version of every key still in the frame is flagged
+    `current_column`. A key whose values are unchanged (ignoring `ignore`,
+    the version and the touch column) keeps its current row untouched; a
+    changed key gets a new row dated by its `version_column` and the old one
+    is retired; keys missing from the frame are retired. Retired rows stay
+    as history. The table's unique key is (key, version_column), so a
+    reload with the same version overwrites it. Works on partitioned tables
+    (no system columns needed). Runs in the caller's transaction; returns
+    (written, retired): new or overwritten versions, and current rows that
+    were superseded or disappeared.
+    """
+    values = [c for c in columns if c not in (key, version_column)]
+    compared = [c for c in values if c not in ignore and c != touch_column]
+    all_columns = [key] + [c for c in columns if c != key]
+    if version_column not in all_columns:
+        all_columns.append(version_column)
+    target = qualified(table)
+    column_list = sql.SQL(', ').join(map(sql.Identifier, all_columns))
+    staging = _stage_frame(conn, frame, table, all_columns, method)
+    ids = {'key': sql.Identifier(key), 'current': sql.Identifier(current_column),
+           'version': sql.Identifier(version_column)}
+
+    assignments = [sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(c)) for c in values]
+    assignments.append(sql.SQL("{} = TRUE").format(ids['current']))
+    touch = sql.SQL('')
+    if touch_column:
+        assignments.append(sql.SQL("{} = NOW()").format(sql.Identifier(touch_column)))
+        touch = sql.SQL(", {} = NOW()").format(sql.Identifier(touch_column))
+
+    with conn.cursor() as cursor:
+        # Retire current rows that vanished or changed; unchanged ones are not touched
+        cursor.execute(sql.SQL(
+            "UPDATE {target} t SET {current} = FALSE{touch} WHERE t.{current} AND NOT EXISTS ("
+            "SELECT 1 FROM {staging} s WHERE s.{key} = t.{key} AND {incoming} IS NOT DISTINCT FROM {existing})"
+        ).format(target=target, staging=staging, touch=touch, incoming=_row('s', compared),
+                 existing=_row('t', compared), **ids))
+        retired = cursor.rowcount
+        # Every staged key without a current row now needs a new version
+        cursor.execute(sql.SQL(
+            "INSERT INTO {target} AS t ({columns}) "
+            "SELECT DISTINCT ON ({key}) {columns} FROM {staging} s WHERE s.{key} IS NOT NULL "
+            "AND NOT EXISTS (SELECT 1 FROM {target} c WHERE c.{key} = s.{key} AND c.{current}) "
+            "ORDER BY {key}, {version} DESC "
+            "ON CONFLICT ({key}, {version}) DO UPDATE SET {assignments}"
+        ).format(target=target, columns=column_list, staging=staging,
+                 assignments=sql.SQL(', ').join(assignments), **ids))
+        written = cursor.rowcount
+        cursor.execute(sql.SQL("DROP TABLE {}").format(staging))
+    return written, retired
+
+
+def month_start(value):
+    """First instant of the month containing `value`."""
+    return pd.Timestamp(value).normalize().replace(day=1)
+
+
+def is_partitioned(conn, table):
+    """True if `table` ('schema.table') is a declaratively partitioned table."""
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+        row = cursor.fetchone()
+    return bool(row and row[0])
+
+
+def list_partitions(conn, table):
+    """[(partition, lower, upper)] of a range-partitioned table, oldest first.
+
+    The DEFAULT partition comes last with None bounds.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT n.nspname || '.' || c.relname, pg_get_expr(c.relpartbound, c.oid) "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE i.inhparent = to_regclass(%s)", (table,))
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _RANGE_BOUND.match(bound or '')
+        lower, upper = (pd.Timestamp(match[1]), pd.Timestamp(match[2])) if match else (None, None)
+        partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda p: (p[1] is None, p[1] or pd.Timestamp.min))
+
+
+def ensure_month_partitions(conn, table, column, months):
+    """Create the monthly partitions of `table` covering `months` that don't exist yet.
+
+    Partitions are named <table>_YYYY_MM. Rows of a new month that already
+    sit in the <table>_default partition are moved into it before it is
+    attached. Runs in the caller's transaction; returns the partitions created.
+    """
+    schema, name = table.split('.')
+    partitions = list_partitions(conn, table)
+    existing = {lower for _, lower, _ in partitions if lower is not None}
+    default = f"{table}_default"
+    has_default = any(p == default for p, _, _ in partitions)
+    created = []
+    for start in sorted({month_start(m) for m in months} - existing):
+        end = start + pd.DateOffset(months=1)
+        partition = f"{schema}.{name}_{start:%Y_%m}"
+        bounds = (start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d'))
+        with conn.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+                           .format(qualified(partition), qualified(table)))
+            if has_default:
+                cursor.execute(sql.SQL(
+                    "WITH moved AS (DELETE FROM {default} WHERE {column} >= %s AND {column} < %s RETURNING *) "
+                    "INSERT INTO {partition} SELECT * FROM moved"
+                ).format(default=qualified(default), column=sql.Identifier(column),
+                         partition=qualified(partition)), bounds)
+                if cursor.rowcount:
+                    log.info(f"  📦 Moved {cursor.rowcount:,} rows from {default} into {partition}")
+            cursor.execute(sql.SQL("ALTER TABLE {} ATTACH PARTITION {} FOR VALUES FROM (%s) TO (%s)")
+                           .format(qualified(table), qualified(partition)), bounds)
+        log.info(f"  🗓️  Created partition {partition} [{bounds[0]}, {bounds[1]})")
+        created.append(partition)
+    return created
+
+
+def detach_partitions_before(conn, table, cutoff, archive_schema=None, drop=False):
+    """Detach the partitions of `table` whose range ends on or before `cutoff`.
+
+    Detached partitions become standalone tables; they are moved to
+    `archive_schema` when given, or dropped with `drop=True`. The DEFAULT
+    partition is never detached. Runs in the caller's transaction; returns
+    the detached partition names.
+    """
+    cutoff = pd.Timestamp(cutoff)
+    detached = []
+    with conn.cursor() as cursor:
+        if archive_schema and not drop:
+            cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(archive_schema)))
+        for partition, _, upper in list_partitions(conn, table):
+            if upper is None or upper > cutoff:
+                continue
+            cursor.execute(sql.SQL("ALTER TABLE {} DETACH PARTITION {}")
+                           .format(qualified(table), qualified(partition)))
+            if drop:
+                cursor.execute(sql.SQL("DROP TABLE {}").format(qualified(partition)))
+            elif archive_schema:
+                cursor.execute(sql.SQL("ALTER TABLE {} SET SCHEMA {}")
+                               .format(qualified(partition), sql.Identifier(archive_schema)))
+            detached.append(partition)
+    return detached